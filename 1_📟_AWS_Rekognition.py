@@ -1,17 +1,38 @@
 # Import package
 import streamlit as st
-import boto3
-from PIL import Image, ImageDraw, ImageFont
-import io
-import json
+from thumbnails import asset, show_image, thumbnail
+import aws_clients
+from collections import deque
+from annotate import draw_rekognition_boxes, rekognition_overlay_html
+from annotation_cache import annotation_id, encode_jpeg, get_annotated_image, remember_annotation, render_annotation
+from artifact_store import (
+    EXPIRED, HISTORY_ROWS, check_in_session, get_configured_store, hold_upload, hold_video, render_memory_stats, session_id,
+)
+from batch_pipeline import Stage, run_pipeline
+from s3_upload import get_configured_uploader
+from s3_direct_upload import direct_upload, get_configured_direct_uploads, object_cache_key, render_direct_stats
+from image_preprocess import DEFAULT_JPEG_QUALITY, DEFAULT_MAX_SIDE, prepare_image, preprocess_tag, sent_file_name
+from job_queue import PAGE_POLL, get_configured_pool, render_job_status, render_queue_stats
+from lambda_engine import get_configured_engine
+from model_lifecycle import describe_model, get_lifecycle
+from status_cache import get_status_cache
+from rekognition_backends import (
+    BACKENDS, detect_from_bytes, detect_from_s3, get_latency_tracker, resolve_backend, sync_inference_circuits,
+)
+from result_cache import cache_key, get_configured_cache, render_cache_stats
+import resilience
+from video_ingest import DEDUP_DISTANCE, DEFAULT_MAX_FRAMES, DEFAULT_SAMPLE_FPS, VIDEO_TYPES, VideoAnalysis, render_timeline
+import tracing
 import time
-import pandas as pd
-from botocore.exceptions import ClientError
+from warmup import LazyModule
+
+# Only the result tables need pandas: it is imported when the first one is shown
+pd = LazyModule("pandas")
 
 #######################################################
 # --- Side Bar Config ---
 st.set_page_config(layout='wide', page_title="AWS Image Classification", page_icon="💻")
-st.sidebar.image('logo.png') 
+st.sidebar.image(asset('logo.png')) 
 st.markdown("""
 <style>
     div[data-testid="stSidebarUserContent"] img {
@@ -49,7 +70,7 @@ st.sidebar.markdown(
 - [Boto3 Documentation](https://boto3.amazonaws.com/v1/documentation/api/latest/guide/quickstart.html)
 """
 )
-st.sidebar.image('AWS-Logo.png') 
+st.sidebar.image(asset('AWS-Logo.png')) 
 #######################################################
 # --- AWS Configuration ---
 
@@ -64,242 +85,368 @@ MODEL_ARN = st.secrets["MODEL_ARN"]
 VERSION_NAME = st.secrets["VERSION_NAME"]
 MIN_INFERENCE_UNITS = st.secrets["MIN_INFERENCE_UNITS"]
 
+# Model status: seconds between automatic refreshes while the model starts/stops
+STATUS_REFRESH_SECONDS = int(st.secrets.get("STATUS_REFRESH_SECONDS", 5))
+
+# Batch mode: number of worker threads per pipeline stage
+BATCH_UPLOAD_WORKERS = int(st.secrets.get("BATCH_UPLOAD_WORKERS", 4))
+BATCH_INVOKE_WORKERS = int(st.secrets.get("BATCH_INVOKE_WORKERS", 4))
+BATCH_ANNOTATE_WORKERS = int(st.secrets.get("BATCH_ANNOTATE_WORKERS", 2))
+
+# Single analyses give up after this many seconds, retries and S3 upload included
+ANALYSIS_DEADLINE = float(st.secrets.get("ANALYSIS_DEADLINE_SECONDS", 90))
+
+# Out-of-process analyses: JOB_WORKERS worker processes (JOB_QUEUE_DB) run single-image
+# analyses and this page polls for the result, see job_queue.py. 0 = run them in the script thread
+JOB_POLL_SECONDS = float(st.secrets.get("JOB_POLL_SECONDS", PAGE_POLL))
+
+# Video mode: frames sampled per second, cap per video, and how close two frames may be to count as one
+VIDEO_SAMPLE_FPS = float(st.secrets.get("VIDEO_SAMPLE_FPS", DEFAULT_SAMPLE_FPS))
+VIDEO_MAX_FRAMES = int(st.secrets.get("VIDEO_MAX_FRAMES", DEFAULT_MAX_FRAMES))
+VIDEO_DEDUP_DISTANCE = int(st.secrets.get("VIDEO_DEDUP_DISTANCE", DEDUP_DISTANCE))
+
+# Preprocessing: longest side (px) and JPEG quality of the image we actually upload
+PREPROCESS_MAX_SIDE = int(st.secrets.get("PREPROCESS_MAX_SIDE", DEFAULT_MAX_SIDE))
+PREPROCESS_JPEG_QUALITY = int(st.secrets.get("PREPROCESS_JPEG_QUALITY", DEFAULT_JPEG_QUALITY))
+DOWNSCALE_ENABLED = st.sidebar.toggle(
+    "Downscale before upload", value=True,
+    help="Send a smaller JPEG instead of the full-resolution file. Flip it to compare payload and latency."
+)
+
+# Direct uploads: the browser POSTs the image to S3 with a pre-signed policy and the server
+# only gets the key (see s3_direct_upload.py; the bucket needs a CORS rule for the app's origin)
+DIRECT_UPLOAD = st.sidebar.toggle(
+    "Upload straight to S3", value=aws_clients.as_bool(st.secrets.get("DIRECT_UPLOAD", False)),
+    help="The image goes from your browser to S3 (downscaled there) instead of through this server."
+)
+
+# Inference backend: Lambda (original), or call DetectCustomLabels directly
+MIN_CONFIDENCE = st.secrets.get("MIN_CONFIDENCE", None)
+default_backend = st.secrets.get("INFERENCE_BACKEND", "lambda")
+INFERENCE_BACKEND = st.sidebar.selectbox(
+    "Inference backend", BACKENDS, index=BACKENDS.index(default_backend) if default_backend in BACKENDS else 0,
+    help="lambda: S3 + Lambda + Rekognition. direct-s3: S3 + Rekognition. direct-bytes: image bytes straight to Rekognition (<= 5 MB)."
+)
+
 #######################################################
 # --- Helper Functions ---
 def start_model(project_arn, model_arn, version_name, min_inference_units):
-    """Starts the model and waits for it to be running."""
-    try:
-        print('Starting model: ' + model_arn)
-        rekog_client.start_project_version(ProjectVersionArn=model_arn, MinInferenceUnits=min_inference_units)
-        
-        # Wait for the model to be in the running state (this is a blocking call)
-        project_version_running_waiter = rekog_client.get_waiter('project_version_running')
-        project_version_running_waiter.wait(ProjectArn=project_arn, VersionNames=[version_name])
-        
-        return True, "Model started successfully."
-    except Exception as e:
-        print(e)
-        return False, str(e)
+    """
+    Starts the model in the background and returns (operation, is_new) right away.
+    If someone already started or stopped it, their in-flight operation is shared.
+    """
+    return model_lifecycle.request(
+        'start', rekog_client, project_arn, model_arn, version_name, min_inference_units
+    )
     
 def stop_model(project_arn, model_arn, version_name):
-    """Stops the model and waits for it to be stopped."""
-    try:
-        print('Stopping model:' + model_arn)
-        rekog_client.stop_project_version(ProjectVersionArn=model_arn)
-        
-        # Wait for the model to be in the stopped state (this is a blocking call)
-        project_version_stopped_waiter = rekog_client.get_waiter('project_version_stopped')
-        project_version_stopped_waiter.wait(ProjectArn=project_arn, VersionNames=[version_name])
-        
-        return True, "Model stopped successfully."
-    except Exception as e:
-        print(e)
-        return False, str(e)
+    """Stops the model in the background and returns (operation, is_new) right away."""
+    return model_lifecycle.request('stop', rekog_client, project_arn, model_arn, version_name)
     
-@st.cache_data(ttl=15) # Cache the status for 15 seconds
 def get_model_status(project_arn, version_name):
-    """Fetches the current status of the model from AWS."""
-    try:
-        describe_response = rekog_client.describe_project_versions(
-            ProjectArn=project_arn,
-            VersionNames=[version_name]
-        )
-        if not describe_response['ProjectVersionDescriptions']:
-            return 'NOT_FOUND', 'Model version not found.'
-        
-        model = describe_response['ProjectVersionDescriptions'][0]
-        return model['Status'], model.get('StatusMessage', 'No status message.')
-    except ClientError as e:
-        st.error(f"Error fetching status: {e}")
-        return 'ERROR', str(e)
-    except Exception as e:
-        st.error(f"An unexpected error occurred: {e}")
-        return 'ERROR', str(e)
-def upload_to_s3(file_obj, bucket, object_name):
-    """Uploads a file to a specific subfolder in an S3 bucket."""
-    # 1. Define the full path including the subfolder
-    full_s3_path = f"img_input_test/{object_name}"
-    
+    """
+    Fetches the current status of the model from the shared status cache.
+    Only one describe call per model runs at a time, however many sessions ask.
+    """
+    status, message = status_cache.get(
+        (project_arn, version_name),
+        lambda: resilience.call("model-status", describe_model, rekog_client, project_arn, version_name),
+    )
+    sync_inference_circuits(status)
+    return status, message
+
+def put_to_s3(file_bytes, object_name):
+    """
+    Uploads the image under a content-hash key and returns (s3_uri, uploaded).
+    Identical images are only uploaded once. Raises on failure and never
+    touches st.*, so it is safe to call from worker threads.
+    """
+    return resilience.call("s3", s3_uploader.upload, file_bytes, object_name)
+
+def upload_to_s3(file_bytes, object_name):
+    """Uploads an image to the input subfolder in the S3 bucket."""
     try:
-        # 2. Use the full path for the upload
-        s3_client.upload_fileobj(file_obj, bucket, full_s3_path)
-        
-        # 3. Return the correctly formatted S3 URI using the same full path
-        st.success(f"Successfully uploaded to s3://{bucket}/{full_s3_path}")
-        return f"s3://{bucket}/{full_s3_path}"
+        s3_uri, uploaded = put_to_s3(file_bytes, object_name)
+        tracing.annotate(bytes_sent=len(file_bytes) if uploaded else 0, cache_hits=int(not uploaded))
+        if uploaded:
+            st.success(f"Successfully uploaded to {s3_uri}")
+        else:
+            st.success(f"Already in S3, skipped upload: {s3_uri}")
+        return s3_uri
     
     except Exception as e:
         st.error(f"Error uploading to S3: {e}")
         return None
 
+def invoke_lambda(bucket, key):
+    """
+    Invokes the Lambda function and returns the list of labels (possibly empty).
+    Goes through the shared engine, so in-flight calls are capped per process and
+    throttling is retried. Raises RuntimeError when Lambda reports an error.
+    Thread safe, no st.* calls.
+    """
+    # Throttling retries happen on the engine thread: count them on the caller's span.
+    # The engine runs on its own loop, so the deadline is passed along explicitly
+    span = tracing.current_span()
+    return resilience.call(
+        "lambda", lambda_engine.invoke, bucket, key,
+        timeout=resilience.clamp_timeout(lambda_engine.timeout),
+        on_retry=(lambda: span.add(retries=1)) if span else None,
+        deadline=resilience.deadline_at(),
+    )
+
+def detect_direct(image_bytes=None, bucket=None, key=None):
+    """
+    DetectCustomLabels with the image bytes or an S3 object, through the
+    'rekognition' circuit breaker. Thread safe, no st.* calls.
+    """
+    if image_bytes is not None:
+        return resilience.call("rekognition", detect_from_bytes, rekog_client, MODEL_ARN, image_bytes, MIN_CONFIDENCE)
+    return resilience.call("rekognition", detect_from_s3, rekog_client, MODEL_ARN, bucket, key, MIN_CONFIDENCE)
+
+def detect_labels(image_bytes, object_name, backend):
+    """
+    Runs one image through the chosen backend and returns the CustomLabels list.
+    Thread safe, no st.* calls (used by batch mode).
+    """
+    backend = resolve_backend(backend, len(image_bytes))
+    if backend == "direct-bytes":
+        return detect_direct(image_bytes=image_bytes)
+    s3_uri, _ = put_to_s3(image_bytes, object_name)
+    bucket, key = s3_uri.replace("s3://", "").split("/", 1)
+    if backend == "direct-s3":
+        return detect_direct(bucket=bucket, key=key)
+    return invoke_lambda(bucket, key)
+
+def analyze_image_direct(image_bytes=None, bucket=None, key=None):
+    """Calls DetectCustomLabels directly, with the image bytes or with an S3 object."""
+    try:
+        return detect_direct(image_bytes, bucket, key)
+    except Exception as e:
+        st.error(f"Error calling Rekognition: {e}")
+        return None
+
 def analyze_image_with_lambda(bucket, key):
     """
     Invokes the Lambda function and correctly handles all valid responses,
     including an empty list of labels.
     """
     try:
-        payload = {
-            "S3Object": {
-                "Bucket": bucket,
-                "Name": key
-            }
-        }
-        response = lambda_client.invoke(
-            FunctionName=LAMBDA_FUNCTION_NAME,
-            InvocationType="RequestResponse",
-            Payload=json.dumps(payload),
-        )
-        # 1. Read the entire response from Lambda
-        response_payload = json.loads(response["Payload"].read().decode("utf-8"))
-
-        # 2. Check for a successful status code
-        if response_payload.get("statusCode") == 200:
-            # 3. Get the body, which is a STRING
-            body_content = response_payload.get("body", "[]")
-            
-            # 4. Try to parse the string body into a Python list
-            if isinstance(body_content, str):
-                try:
-                    # This correctly turns "[]" into []
-                    return json.loads(body_content)
-                except json.JSONDecodeError:
-                    # If parsing fails, it was an unexpected message. Return empty.
-                    print(f"Lambda returned a non-JSON body: {body_content}")
-                    return [] 
-            
-            # If body_content is somehow already a list/dict, return it
-            return body_content
-        else:
-            # Handle cases where Lambda itself reports an error
-            st.error(f"Lambda function returned an error: {response_payload.get('body')}")
-            return None
-
+        return invoke_lambda(bucket, key)
+    except RuntimeError as e:
+        st.error(str(e))
+        return None
+    except TimeoutError as e:
+        st.error(f"Lambda function did not answer in time: {e}")
+        return None
     except Exception as e:
         st.error(f"Error invoking Lambda function: {e}")
         return None
 
-def draw_bounding_boxes(image_bytes, detections):
+def analyze_uploaded_object(key):
+    """
+    Inference on an image the browser already put in S3. Returns (backend, results).
+    The server has no bytes to send, so direct-bytes reads the object instead.
+    Raises like detect_direct / invoke_lambda.
+    """
+    backend = "direct-s3" if INFERENCE_BACKEND == "direct-bytes" else INFERENCE_BACKEND
+    if backend == "direct-s3":
+        return backend, detect_direct(bucket=S3_BUCKET_NAME, key=key)
+    return backend, invoke_lambda(S3_BUCKET_NAME, key)
+
+def current_presign():
+    """This session's signed POST, renewed a minute before it expires (which re-mounts the component)."""
+    presigned = st.session_state.direct_presign
+    if presigned is None or presigned["expires_at"] - time.time() < 60:
+        presigned = direct_uploads.presign()
+        st.session_state.direct_presign = presigned
+    return presigned
+
+def draw_bounding_boxes(image, detections):
     """
     Draws bounding boxes on the image using detection data.
     This is the Python equivalent of `renderAnnotatedImageTransformer.js`.
+    Rendering is shared with the Roboflow page, see annotate.py.
     """
-    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    draw = ImageDraw.Draw(image)
-    img_width, img_height = image.size
-    
-    # --- 2. Dynamic Scaling Setup (from Function 1) ---
-    # Calculate scaling factors based on image diagonal for a consistent look
-    image_diagonal = (img_width**2 + img_height**2) ** 0.5
-    BOX_THICKNESS_FACTOR = 0.006
-    FONT_SIZE_FACTOR = 0.03
-    
-    # Calculate the dynamic size for box lines and fonts
-    dynamic_thickness = max(1, int(image_diagonal * BOX_THICKNESS_FACTOR))
-    dynamic_font_size = max(12, int(image_diagonal * FONT_SIZE_FACTOR))
-    text_padding = max(2, int(dynamic_font_size * 0.1))
-    
-    try:
-        font = ImageFont.load_default(size=dynamic_font_size)
-    except AttributeError: # Fallback for older Pillow versions
-        font = ImageFont.load_default()
-    except IOError:
-        print("Warning: Default font not found.")
-        font = ImageFont.load_default()
-        
-    occupied_regions = []
-    def overlaps(rect1, rect2):
-        """Checks if two rectangles (x1, y1, x2, y2) overlap."""
-        return not (rect1[2] < rect2[0] or rect1[0] > rect2[2] or
-                    rect1[3] < rect2[1] or rect1[1] > rect2[3])
-
-    # --- 4. Main Drawing Loop ---
-    # Use the color cycling from your target function
-    colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A', '#98D8C8', '#F7DC6F']
-
-    for i, det in enumerate(detections):
-        color = colors[i % len(colors)]
-        
-        # Parse the bounding box data (from Function 2's format)
-        box = det.get("Geometry", {}).get("BoundingBox", {})
-        if not box:
-            box = det.get("BoundingBox", {}) # Fallback for different structures
-        
-        # Proceed only if box data is valid
-        if box and all(k in box for k in ["Left", "Top", "Width", "Height"]):
-            # Convert relative coordinates to absolute pixel values
-            left = img_width * box["Left"]
-            top = img_height * box["Top"]
-            width = img_width * box["Width"]
-            height = img_height * box["Height"]
-            
-            # Define box corners for clarity
-            x1, y1 = left, top
-            x2, y2 = left + width, top + height
-            
-            # Draw the bounding box with dynamic thickness
-            draw.rectangle(((x1, y1), (x2, y2)), outline=color, width=dynamic_thickness)
-            
-            # Prepare the label text
-            label = det.get("Name", "Unknown")
-            confidence = det.get("Confidence", 0)
-            label_text = f"{label} ({confidence:.1f}%)"
-            
-            # --- 5. Smart Label Placement Logic (from Function 1) ---
-            # Calculate the size needed for the text and its background
-            text_bbox_raw = draw.textbbox((0, 0), label_text, font=font)
-            text_width = text_bbox_raw[2] - text_bbox_raw[0]
-            text_height = text_bbox_raw[3] - text_bbox_raw[1]
-            bg_width = text_width + (text_padding * 2)
-            bg_height = text_height + (text_padding * 2)
-
-            # Define potential positions for the label to be placed
-            potential_positions = [
-                (x1, y1 - bg_height),      # Above the box
-                (x1, y1),                  # Inside top-left
-                (x2 - bg_width, y1),       # Inside top-right
-                (x1, y2 - bg_height),      # Inside bottom-left
-                (x2 - bg_width, y2 - bg_height) # Inside bottom-right
-            ]
-            
-            # Clamp positions to stay within image bounds
-            for j, (px, py) in enumerate(potential_positions):
-                px = max(0, min(px, img_width - bg_width))
-                py = max(0, min(py, img_height - bg_height))
-                potential_positions[j] = (px, py)
-                
-            # Find the first position that doesn't overlap with others
-            final_pos = None
-            for px, py in potential_positions:
-                current_rect = (px, py, px + bg_width, py + bg_height)
-                if not any(overlaps(current_rect, r) for r in occupied_regions):
-                    final_pos = (px, py)
-                    break
-            
-            # Fallback to the first choice if all positions overlap
-            if final_pos is None:
-                final_pos = potential_positions[0]
-
-            # Draw the text background and the text itself
-            bg_x, bg_y = final_pos
-            draw.rectangle(
-                [(bg_x, bg_y), (bg_x + bg_width, bg_y + bg_height)],
-                fill=color
-            )
-            draw.text(
-                (bg_x + text_padding, bg_y + text_padding),
-                label_text,
-                fill="black", # Black text is more readable on colorful backgrounds
-                font=font
-            )
-            
-            # Add the final label's region to our list to check against for the next loop
-            occupied_regions.append((bg_x, bg_y, bg_x + bg_width, bg_y + bg_height))
-        else:
-            print(f"Skipping a detection due to missing BoundingBox data: {det}")
+    return draw_rekognition_boxes(image, detections)
+
+def preprocess_settings():
+    """(max_side, quality) currently in effect; max_side 0 means send the original bytes."""
+    return (PREPROCESS_MAX_SIDE if DOWNSCALE_ENABLED else 0), PREPROCESS_JPEG_QUALITY
+
+def model_cache_id():
+    """
+    Model identifier for result caching: the backend and MIN_CONFIDENCE (only the
+    direct backends filter by it) give different results, so do the preprocessing settings.
+    """
+    return f"{MODEL_ARN}|{INFERENCE_BACKEND}|conf={MIN_CONFIDENCE}|{preprocess_tag(*preprocess_settings())}"
+
+def annotation_kind():
+    """Annotations are drawn at the resolution that was sent, so the settings are part of the key."""
+    return f"rekognition|{preprocess_tag(*preprocess_settings())}"
+
+def draw_annotation(image_bytes, detections):
+    """
+    Draws on the same (possibly downscaled) image that is sent for inference.
+    Boxes are relative, so they need no mapping.
+    """
+    return draw_bounding_boxes(prepare_image(image_bytes, *preprocess_settings()).image, detections)
+
+def draw_full_annotation(image_bytes, detections):
+    """The zoom rendition: the same boxes on the original image instead of the one that was sent."""
+    return draw_bounding_boxes(prepare_image(image_bytes, 0).image, detections)
+
+def run_batch_analysis(files, upload_workers, invoke_workers, annotate_workers):
+    """
+    Streams many images through upload -> invoke -> annotate.
+    Yields one finished BatchItem at a time, in completion order.
+    """
+    backend = INFERENCE_BACKEND
+    owner = session_id()        # stages run on pool threads, outside this session's context
+
+    def upload_stage(job):
+        job["bytes"] = artifact_store.get(job.pop("ref"))
+        if job["bytes"] is None:
+            raise ValueError(EXPIRED)
+        # A cache hit skips the upload and the inference call
+        job["cache_key"] = cache_key(job["bytes"], model_cache_id())
+        found, cached = result_cache.lookup(job["cache_key"])
+        if found:
+            job["results"] = cached
+            return job
+        prepared = prepare_image(job["bytes"], *preprocess_settings())
+        job["prepared"] = prepared
+        job["payload"] = prepared.data
+        job["object_name"] = sent_file_name(job["name"], prepared)
+        job["upload_s"] = 0.0
+        if resolve_backend(backend, len(prepared.data)) != "direct-bytes":
+            # Upload now so it overlaps the previous image's inference call
+            start = time.perf_counter()
+            put_to_s3(prepared.data, job["object_name"])
+            job["upload_s"] = time.perf_counter() - start
+        return job
+
+    def invoke_stage(job):
+        if "results" in job:
+            return job
+        payload = job.pop("payload")
+        start = time.perf_counter()
+        # put_to_s3 inside detect_labels is a no-op here: the key is already known
+        job["results"] = detect_labels(payload, job["object_name"], backend)
+        # Upload + inference, the same interval the single image and job paths record
+        latency_tracker.record(
+            resolve_backend(backend, len(payload)), len(payload), job.pop("upload_s") + time.perf_counter() - start
+        )
+        result_cache.store(job["cache_key"], job["results"])
+        return job
+
+    def annotate_stage(job):
+        job["annotated"] = None
+        prepared = job.pop("prepared", None)
+        if job["results"]:
+            # Reuse the decode from the upload stage; cache hits never decoded anything
+            image = prepared.image if prepared is not None else prepare_image(job["bytes"], *preprocess_settings()).image
+            # Keep the encoded JPEG in the shared store, not the decoded frame: the session only holds its ref
+            job["annotated"] = artifact_store.put(encode_jpeg(draw_bounding_boxes(image, job["results"]), quality=85), owner)
+        job.pop("bytes")
+        return job
+
+    stages = [
+        Stage("upload", upload_stage, upload_workers),
+        Stage("invoke", invoke_stage, invoke_workers),
+        Stage("annotate", annotate_stage, annotate_workers),
+    ]
+    inputs = ((f["name"], {"name": f["name"], "ref": f["ref"]}) for f in files)
+    yield from run_pipeline(inputs, stages)
+
+def analyze_frame(frame_bytes):
+    """
+    One video frame through the chosen backend (cached like single images).
+    Returns [(label, confidence), ...]. Thread safe, no st.* calls.
+    """
+    key = cache_key(frame_bytes, model_cache_id())
+    found, results = result_cache.lookup(key)
+    if not found:
+        results = detect_labels(frame_bytes, "frame.jpg", INFERENCE_BACKEND)
+        result_cache.store(key, results)
+    return [(r['Name'], r['Confidence']) for r in results]
+
+def submit_analysis_job(file_name, file_bytes, image_cache_key):
+    """
+    Queues preprocess -> upload -> inference -> annotate for a worker process.
+    Returns (job id, coalesced): the same image with the same settings shares one job.
+    """
+    max_side, quality = preprocess_settings()
+    params = {
+        "file_name": file_name, "backend": INFERENCE_BACKEND, "model_arn": MODEL_ARN, "min_confidence": MIN_CONFIDENCE,
+        "max_side": max_side, "quality": quality, "deadline_s": ANALYSIS_DEADLINE,
+        # Workers have their own breakers: they learn the model status from the job
+        "model_status": get_model_status(PROJECT_ARN, VERSION_NAME)[0],
+    }
+    return job_pool.submit("job_handlers:analyze_rekognition", image_cache_key, params, file_bytes)
+
+def analysis_job_panel(file_bytes, image_hash):
+    """Polls the queued analysis (as a fragment). Once the worker is done the whole page reruns."""
+    pending = st.session_state.analysis_job
+    job = job_pool.get(pending["id"])
+    if job is not None and job["status"] in ("queued", "running"):
+        render_job_status(job)
+        return
+
+    st.session_state.analysis_job = None
+    if job is None or job["status"] == "failed":
+        st.session_state.analysis_error = job["error"] if job else "The job was lost, please try again."
+        st.session_state.button_analyze = False
+        st.rerun()
+
+    results, report = job["result"], job["report"]
+    result_cache.store(pending["cache_key"], results)
+    # The worker already drew the boxes: the results view shows its JPEG
+    if results and job["artifact"] is not None:
+        remember_annotation(file_bytes, results, annotation_kind(), job["artifact"], image_hash=image_hash)
+    timings = report["timings"]
+    latency_tracker.record(report["backend"], report["sent_bytes"], timings.get("upload", 0.0) + timings["inference"])
+    trace_recorder.record_timings("rekognition-job", timings)
+    st.session_state.preprocess_history.append(report["history"])
+    st.session_state.analysis_results = results
+    st.session_state.workflow_state = "analysis"
+    st.rerun()
+
+def summarize_batch_item(item):
+    """Turns a BatchItem into a small dict we can keep in session state."""
+    job = item.value or {}
+    return {
+        "name": item.name,
+        "ok": item.ok,
+        "error": f"{item.error[0]}: {resilience.describe(item.error[1])}" if item.error else None,
+        "results": job.get("results") or [],
+        "annotated": job.get("annotated"),     # ArtifactRef
+        "timings": item.timings,
+    }
 
-    return image
+def render_batch_item(summary):
+    """Shows one finished batch image in its own expander."""
+    icon = "✅" if summary["ok"] else "❌"
+    with st.expander(f"{icon} {summary['name']}"):
+        if not summary["ok"]:
+            st.error(summary["error"])
+            return
+        col1, col2 = st.columns(2)
+        with col1:
+            annotated = artifact_store.get(summary["annotated"]) if summary["annotated"] else None
+            if annotated:
+                show_image(annotated, 400, caption="Annotated Image", image_hash=summary["annotated"])
+            elif summary["annotated"]:
+                st.info(EXPIRED)
+            else:
+                st.info("No Label")
+        with col2:
+            if summary["results"]:
+                st.dataframe(pd.DataFrame(summary["results"])[['Name', 'Confidence']])
+            st.caption(" | ".join(f"{k}: {v:.2f}s" for k, v in summary["timings"].items()))
 
 def click_button():
+    st.session_state.analysis_error = None
     st.session_state.button_analyze = not st.session_state.button_analyze
     st.session_state.button_analyze_disabled = not st.session_state.button_analyze_disabled
 
@@ -311,43 +458,87 @@ def reset_workflow():
     st.session_state.annotated_image = None
     st.session_state.button_analyze = False
     st.session_state.button_analyze_disabled = False
-    st.session_state.processing_action = None
     st.session_state.model_status = None
+    st.session_state.batch_files = None
+    st.session_state.batch_results = None
+    st.session_state.video_file = None
+    st.session_state.video_results = None
+    st.session_state.analysis_job = None
+    st.session_state.analysis_error = None
+    st.session_state.direct_presign = None
+    st.session_state.direct_object = None
+    st.session_state.last_trace = None
 
-def overlay(title: str, subtitle: str):
-    st.markdown(
-        f"""
-        <style>
-          ._overlay {{
-            position: fixed;
-            inset: 0;
-            z-index: 99999;
-            background: rgb(13,17,23);     /* match dark theme */
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            flex-direction: column;
-            gap: 16px;
-          }}
-          ._spinner {{
-            width: 22px; height: 22px;
-            border: 3px solid rgba(255,255,255,0.25);
-            border-top-color: white;
-            border-radius: 50%;
-            animation: spin 0.8s linear infinite;
-          }}
-          @keyframes spin {{ to {{ transform: rotate(360deg); }} }}
-          ._title {{ color: #f2a602; font-size: 2.2rem; font-weight: 800; }}
-          ._sub {{ color: #fff; opacity: .9; font-size: 0.95rem; text-align:center; max-width: 760px; }}
-        </style>
-        <div class="_overlay" id="transition-root">
-          <div class="_title">{title}</div>
-          <div class="_spinner"></div>
-          <div class="_sub">{subtitle}</div>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
+def request_model_action(action):
+    """Submits start/stop without blocking and tells the user if they joined an existing one."""
+    if action == 'start':
+        op, is_new = start_model(PROJECT_ARN, MODEL_ARN, VERSION_NAME, MIN_INFERENCE_UNITS)
+    else:
+        op, is_new = stop_model(PROJECT_ARN, MODEL_ARN, VERSION_NAME)
+    if not is_new:
+        st.toast(f"A '{op.action}' operation is already in progress, following it instead.")
+    st.rerun()
+
+def model_status_panel(was_transitioning):
+    """Model status and controls. While transitioning it re-runs on its own as a fragment."""
+    op = model_lifecycle.current(MODEL_ARN)
+    status, message = get_model_status(PROJECT_ARN, VERSION_NAME)
+    st.session_state.model_status = status
+    is_transitioning_api = status in ['STARTING', 'STOPPING'] or (op is not None and not op.done)
+
+    # Transition finished: do one full rerun so the page stops auto-refreshing
+    if was_transitioning and not is_transitioning_api:
+        status_cache.invalidate((PROJECT_ARN, VERSION_NAME))
+        st.rerun()
+
+    if st.button("Refresh Status 🔄", disabled=is_transitioning_api):
+        # Only drop this model's status, not every cached function for every user
+        status_cache.invalidate((PROJECT_ARN, VERSION_NAME))
+        st.rerun()
+
+    if status == 'RUNNING':
+        st.success(f"**Status:** {status} 🟢")
+        if st.button("Proceed to Image Analysis ➡️", type="primary", disabled=is_transitioning_api):
+            st.session_state.workflow_state = "upload"
+            st.rerun()
+    elif status == 'STOPPED' and not is_transitioning_api:
+        st.info(f"**Status:** {status} 🔴")
+    elif is_transitioning_api:
+        st.warning(f"**Status:** {status} 🟡")
+        st.info(f"Model is {status.lower()}... This may take several minutes. This panel refreshes automatically.")
+    else:
+        st.error(f"**Status:** {status} ⚠️")
+        st.error(f"**Message:** {message}")
+
+    if op is not None:
+        elapsed = f"{int(op.elapsed // 60)}m {int(op.elapsed % 60)}s"
+        if not op.done:
+            st.caption(f"⏳ {op.action.capitalize()} in progress for {elapsed}: {op.message}")
+        elif time.time() - op.finished_at < 120:
+            st.caption(("✅ " if op.state == "succeeded" else "❌ ") + f"{op.message} ({elapsed})")
+
+    st.subheader("Model Controls", divider="blue")
+    current_status = st.session_state.model_status
+
+    if is_transitioning_api:
+        st.info("Model is currently in a transition state. Please wait for the operation to complete.")
+    elif current_status == 'RUNNING':
+        st.info('The Model is still running. You can stop it to prevent unexpected costs.')
+        if st.button("Stop Model", type="primary"):
+            request_model_action('stop')
+    elif current_status == 'STOPPED':
+        st.info('You need to Press Start Model first, before proceed into Main Function')
+        if st.button("Start Model", type="primary"):
+            request_model_action('start')
+    else:
+        st.error("Model is in an unknown or failed state. Please check the AWS console for more details.")
+
+def render_model_status():
+    """Runs the status panel as a fragment that auto-refreshes only while the model is transitioning."""
+    status, _ = get_model_status(PROJECT_ARN, VERSION_NAME)
+    transitioning = status in ['STARTING', 'STOPPING'] or model_lifecycle.in_flight(MODEL_ARN) is not None
+    run_every = STATUS_REFRESH_SECONDS if transitioning else None
+    st.fragment(run_every=run_every)(model_status_panel)(transitioning)
 
 
 #######################################################
@@ -367,89 +558,44 @@ def main():
         st.session_state.button_analyze = False
     if 'button_analyze_disabled' not in st.session_state:
         st.session_state.button_analyze_disabled = False
-    if 'processing_action' not in st.session_state:
-        st.session_state.processing_action = None
     if 'model_status' not in st.session_state:
         st.session_state.model_status = None
+    if 'batch_files' not in st.session_state:
+        st.session_state.batch_files = None
+    if 'batch_results' not in st.session_state:
+        st.session_state.batch_results = None
+    if 'video_file' not in st.session_state:
+        st.session_state.video_file = None
+    if 'video_results' not in st.session_state:
+        st.session_state.video_results = None
+    if 'preprocess_history' not in st.session_state:
+        st.session_state.preprocess_history = deque(maxlen=HISTORY_ROWS)
+    if 'analysis_job' not in st.session_state:
+        st.session_state.analysis_job = None
+    if 'analysis_error' not in st.session_state:
+        st.session_state.analysis_error = None
+    if 'direct_presign' not in st.session_state:
+        st.session_state.direct_presign = None
+    if 'direct_object' not in st.session_state:
+        st.session_state.direct_object = None
     # --- End of init ---
 
-    root = st.empty()
+    # Images live in the shared store (session state only has refs): a tab that sat idle
+    # long enough to lose them starts over
+    if check_in_session(artifact_store):
+        reset_workflow()
+        st.toast("This session was idle, so its images were released.")
 
-    # 2) Router — transition state
-    if st.session_state.processing_action:
-        # Draw overlay immediately so old UI is fully hidden
-        if st.session_state.processing_action == 'start':
-            overlay("Starting AWS Model...", "Starting model... It might take up to 30 minutes to start running.")
-            # Do your long start call here
-            # time.sleep(5)  # simulate
-            # success, msg = True, "Mock start complete"
-            success, msg = start_model(PROJECT_ARN, MODEL_ARN, VERSION_NAME,MIN_INFERENCE_UNITS)
-            st.session_state.mock_status = "RUNNING"  # mock transition
-        else:  # 'stop'
-            overlay("Stopping AWS Model...", "Stopping model... This may take a few minutes.")
-            success, msg = stop_model(PROJECT_ARN, MODEL_ARN, VERSION_NAME)
-
-        # Optional brief confirmation overlay
-        overlay(
-            "Starting AWS Model..." if st.session_state.processing_action == 'start' else "Stopping AWS Model...",
-            ("✅ " if success else "❌ ") + f"{msg}. Refreshing page..."
-        )
-        st.cache_data.clear()
-        time.sleep(1.2)
-
-        # Common transition logic
-        st.session_state.processing_action = None
-        st.rerun()
-        return
-
-    # 3) Router — MAIN UI
-    else:
-        with root.container():
-            # *** header only on main page ***
-            st.header(":streamlit: :orange[AWS] Image Analysis with Rekognition", divider='orange')
-
-            if st.session_state.workflow_state == "model_status":
-                st.subheader("AWS Rekognition :green[Model Status]", divider="green")
-
-                status, message = get_model_status(PROJECT_ARN, VERSION_NAME)
-                st.session_state.model_status = status
-                is_transitioning_api = status in ['STARTING', 'STOPPING']
-
-                if st.button("Refresh Status 🔄", disabled=is_transitioning_api):
-                    st.cache_data.clear()
-                    st.rerun()
-
-                if status == 'RUNNING':
-                    st.success(f"**Status:** {status} 🟢")
-                    if st.button("Proceed to Image Analysis ➡️", type="primary", disabled=is_transitioning_api):
-                        st.session_state.workflow_state = "upload"
-                        st.rerun()
-                elif status == 'STOPPED':
-                    st.info(f"**Status:** {status} 🔴")
-                elif is_transitioning_api:
-                    st.warning(f"**Status:** {status} 🟡")
-                    st.info(f"Model is {status.lower()}... This may take several minutes. Please click 'Refresh Status' periodically.")
-                else:
-                    st.error(f"**Status:** {status} ⚠️")
-                    st.error(f"**Message:** {message}")
+    root = st.empty()
 
-                st.subheader("Model Controls", divider="blue")
-                current_status = st.session_state.model_status
+    # Router — MAIN UI
+    with root.container():
+        # *** header only on main page ***
+        st.header(":streamlit: :orange[AWS] Image Analysis with Rekognition", divider='orange')
 
-                if current_status == 'RUNNING':
-                    st.info('The Model is still running. You can stop it to prevent unexpected costs.')
-                    if st.button("Stop Model", type="primary", disabled=is_transitioning_api):
-                        st.session_state.processing_action = 'stop'
-                        st.rerun()
-                elif current_status == 'STOPPED':
-                    st.info('You need to Press Start Model first, before proceed into Main Function')
-                    if st.button("Start Model", type="primary", disabled=is_transitioning_api):
-                        st.session_state.processing_action = 'start'
-                        st.rerun()
-                elif is_transitioning_api:
-                    st.info("Model is currently in a transition state. Please wait for the operation to complete and then click 'Refresh Status'.")
-                else:
-                    st.error("Model is in an unknown or failed state. Please check the AWS console for more details.")
+        if st.session_state.workflow_state == "model_status":
+            st.subheader("AWS Rekognition :green[Model Status]", divider="green")
+            render_model_status()
     if st.session_state.workflow_state == "upload":
         st.subheader("Welcome to :green[Driver Behavior Analysis] App", divider="green")
         st.markdown('This application leverages a powerful AI model to analyze images of drivers and classify their behavior.')
@@ -463,7 +609,7 @@ def main():
         st.markdown("<span style='font-size: 24px;'>**<u>Example Output**<u> </span>", unsafe_allow_html=True)
         # Assuming your image path is correct for your local run
         try:
-            st.image('tutorial.png', width=1000)
+            st.image(asset('tutorial.png', width=1000), width=1000)
         except FileNotFoundError:
             st.warning("Warning: Tutorial image not found at the specified path.")
         
@@ -490,42 +636,313 @@ def main():
         
         st.header(":orange[!! Try Me] ⬇️⬇️⬇️")
         st.subheader("Upload an Image", divider="green")
-        uploaded_file = st.file_uploader(
-            "Choose an image file", type=["jpg", "jpeg", "png"]
+        if DIRECT_UPLOAD:
+            # Only the S3 key comes back to the server, see s3_direct_upload.py
+            presigned = current_presign()
+            uploaded = direct_upload(
+                presigned, *preprocess_settings(), max_bytes=direct_uploads.max_bytes, key=f"direct_{presigned['key']}"
+            )
+            if uploaded and uploaded["key"] == presigned["key"]:
+                uploaded["url"] = direct_uploads.view_url(uploaded["key"])
+                st.session_state.direct_object = uploaded
+                st.session_state.direct_presign = None
+                st.session_state.analysis_results = None
+                st.session_state.workflow_state = "direct"
+                st.rerun()
+        else:
+            uploaded_file = st.file_uploader(
+                "Choose an image file", type=["jpg", "jpeg", "png"]
+            )
+        
+            if uploaded_file is not None:
+                # Keep a reference, not the UploadedFile buffer
+                st.session_state.uploaded_file = hold_upload(artifact_store, uploaded_file)
+                st.session_state.workflow_state = "preview"
+                st.rerun() # Rerun the script to move to the next state
+
+        st.subheader("Batch Analysis", divider="green")
+        st.markdown('*Reviewing many frames? Upload them together and they will be analyzed in parallel.*')
+        batch_files = st.file_uploader(
+            "Choose multiple image files", type=["jpg", "jpeg", "png"],
+            accept_multiple_files=True, key="batch_uploader"
         )
+        if batch_files and st.button(f"Analyze {len(batch_files)} Images ➡️", type="primary"):
+            st.session_state.batch_files = [hold_upload(artifact_store, f) for f in batch_files]
+            st.session_state.batch_results = None
+            st.session_state.workflow_state = "batch"
+            st.rerun()
+
+        st.subheader("Video Analysis", divider="green")
+        st.markdown('*Dashcam footage? Frames are sampled, near-duplicates skipped, and the rest analyzed in parallel.*')
+        video_file = st.file_uploader("Choose a video file", type=VIDEO_TYPES, key="video_uploader")
+        if video_file is not None and st.button("Analyze Video ➡️", type="primary"):
+            # Spooled to a file of the shared store: the session keeps a ref, released when idle like images
+            st.session_state.video_file = hold_video(artifact_store, video_file)
+            st.session_state.video_results = None
+            st.session_state.workflow_state = "video"
+            st.rerun()
+
+    if st.session_state.workflow_state == "batch":
+        st.subheader("Batch Analysis", divider="green")
+        files = st.session_state.batch_files or []
+
+        with st.expander("Pipeline Settings"):
+            c1, c2, c3 = st.columns(3)
+            upload_workers = c1.number_input("Upload workers", 1, 32, BATCH_UPLOAD_WORKERS)
+            invoke_workers = c2.number_input("Lambda workers", 1, 32, BATCH_INVOKE_WORKERS)
+            annotate_workers = c3.number_input("Annotate workers", 1, 16, BATCH_ANNOTATE_WORKERS)
+
+        if st.session_state.batch_results is None:
+            st.info(f"{len(files)} images ready for analysis.")
+            if st.button("Run Batch Analysis", type="primary"):
+                progress = st.progress(0.0, text="Starting...")
+                batch_results = []
+                # Results are rendered as soon as each image finishes
+                for item in run_batch_analysis(files, upload_workers, invoke_workers, annotate_workers):
+                    summary = summarize_batch_item(item)
+                    trace_recorder.record_timings("rekognition-batch", item.timings)
+                    batch_results.append(summary)
+                    progress.progress(len(batch_results) / len(files), text=f"{len(batch_results)}/{len(files)} done")
+                    render_batch_item(summary)
+                st.session_state.batch_results = batch_results
+        else:
+            batch_results = st.session_state.batch_results
+            failed = sum(1 for r in batch_results if not r["ok"])
+            st.success(f"Analyzed {len(batch_results) - failed}/{len(batch_results)} images.")
+            for summary in batch_results:
+                render_batch_item(summary)
+
+        if st.button("Start Over", key="batch_start_over"):
+            reset_workflow()
+            st.rerun()
+
+    if st.session_state.workflow_state == "video":
+        st.subheader("Video Analysis", divider="green")
+        video = st.session_state.video_file
+        video_path = artifact_store.path(video["ref"]) if video is not None else None
+        if video is not None and video_path is None:
+            st.toast(EXPIRED)
+            reset_workflow()
+            st.rerun()
+
+        with st.expander("Sampling Settings"):
+            c1, c2, c3, c4 = st.columns(4)
+            sample_fps = c1.number_input("Frames per second", 0.1, 30.0, VIDEO_SAMPLE_FPS, step=0.5)
+            max_frames = c2.number_input("Max frames", 1, 5000, VIDEO_MAX_FRAMES)
+            max_distance = c3.number_input(
+                "Duplicate distance", 0, 32, VIDEO_DEDUP_DISTANCE,
+                help="How many of the 64 hash bits may differ for a frame to count as a repeat. 0 only skips identical frames."
+            )
+            workers = c4.number_input("Parallel calls", 1, 32, BATCH_INVOKE_WORKERS)
+
+        if st.session_state.analysis_error:
+            st.error(f"Could not read this video: {st.session_state.analysis_error}")
+        elif st.session_state.video_results is None:
+            st.info(f"{video['name']} ({video['size'] / 1024 ** 2:.1f} MB) ready for analysis.")
+            if st.button("Run Video Analysis", type="primary"):
+                progress = st.progress(0.0, text="Decoding...")
+                max_side, quality = preprocess_settings()
+                try:
+                    run = VideoAnalysis(video_path, analyze_frame, workers, sample_fps, max_frames, max_distance, max_side, quality)
+                    expected = run.expected_frames()
+                    for item in run.run():
+                        trace_recorder.record_timings("rekognition-video", item.timings)
+                        progress.progress(min(1.0, run.done_count / expected), text=f"{run.done_count}/{expected} frames")
+                    st.session_state.video_results = {"timeline": run.timeline(), "stats": run.stats()}
+                except ValueError as e:
+                    st.session_state.analysis_error = str(e)
+                # Only the results (or the error) are shown from now on: let the file go
+                st.session_state.video_file = None
+                st.rerun()
+
+        if st.session_state.video_results is not None:
+            render_timeline(st.session_state.video_results)
+
+        if st.button("Start Over", key="video_start_over"):
+            reset_workflow()
+            st.rerun()
     
-        if uploaded_file is not None:
-            st.session_state.uploaded_file = uploaded_file
-            st.session_state.workflow_state = "preview"
-            st.rerun() # Rerun the script to move to the next state
-    
+    if st.session_state.workflow_state == "direct":
+        st.subheader("Preview and Analyze", divider="green")
+        uploaded = st.session_state.direct_object
+        caption = f"{uploaded['name']} ({uploaded['size'] / 1024:.0f} KB in S3" + (", downscaled in your browser)" if uploaded["resized"] else ")")
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.subheader(":camera_flash: Original Image", divider='blue')
+            # The browser loads it from S3 with a signed URL; the server never downloads it
+            st.image(uploaded["url"], width=400, caption=caption)
+        st.button("Analyze Image", disabled=st.session_state.button_analyze, on_click=click_button, key="direct_analyze")
+        if st.session_state.button_analyze_disabled:
+            with tracing.trace("rekognition-direct", recorder=trace_recorder, session_key="last_trace", backend=INFERENCE_BACKEND), \
+                    resilience.deadline(ANALYSIS_DEADLINE):
+                try:
+                    # 0. Is the object there, and is it an image we accept? Its ETag keys the result cache
+                    with tracing.span("verify", bytes_sent=0):
+                        obj = resilience.call("s3", direct_uploads.verify, uploaded["key"])
+                    with tracing.span("cache_lookup") as span:
+                        image_cache_key = object_cache_key(model_cache_id(), obj["etag"])
+                        found, results = result_cache.lookup(image_cache_key)
+                        span.set(cache_hits=int(found))
+                    inference_ms, backend = 0.0, "cache"
+                    if found:
+                        st.toast("Loaded result from cache ⚡")
+                    else:
+                        # 1. Inference with the key only
+                        with st.spinner("Analyzing with AWS Rekognition..."), tracing.span("inference") as span:
+                            inference_start = time.perf_counter()
+                            backend, results = analyze_uploaded_object(obj["key"])
+                            inference_ms = (time.perf_counter() - inference_start) * 1000
+                            span.set(backend=backend)
+                        # Not added to latency_tracker: the upload ran in the browser, so
+                        # there is no upload + inference time to compare with the other paths
+                        result_cache.store(image_cache_key, results)
+                    st.session_state.preprocess_history.append({
+                        "mode": "browser-downscaled" if uploaded["resized"] else "browser-original",
+                        "backend": backend,
+                        "original_size": "", "sent_size": f"{uploaded['width']}x{uploaded['height']}",
+                        "original_kb": round(uploaded["original_size"] / 1024, 1),
+                        "sent_kb": round(obj["size"] / 1024, 1),
+                        # Preprocessing and the upload ran in the browser
+                        "preprocess_ms": 0.0, "cpu_ms": 0.0, "decoded_mb": 0.0, "upload_ms": 0.0,
+                        "inference_ms": round(inference_ms, 1),
+                    })
+                    st.session_state.analysis_results = results
+                except Exception as e:
+                    st.session_state.analysis_error = str(e)
+            st.session_state.button_analyze_disabled = False
+            st.session_state.button_analyze = False
+            st.rerun()
+
+        if st.session_state.analysis_error:
+            st.error(f"Analysis failed: {st.session_state.analysis_error}")
+
+        results = st.session_state.analysis_results
+        if results is not None:
+            with col2:
+                st.subheader(":mag_right: Analysis Results", divider='blue')
+                if results:
+                    # Boxes are relative, so the browser draws them over the S3 image
+                    st.html(rekognition_overlay_html(uploaded["url"], results, 400))
+                else:
+                    st.image(uploaded["url"], width=400, caption="No Label")
+            with col3:
+                st.subheader(":brain: Label Result", divider='red')
+                if results:
+                    st.badge("Success", icon=":material/check:", color="green")
+                    st.info("Result from Rekognition")
+                    st.dataframe(pd.DataFrame(results)[['Name', 'Confidence']])
+                else:
+                    st.warning("No analysis results to display.")
+                tracing.render_trace(st.session_state.get("last_trace"))
+
+        if st.button("Start Over", key="direct_start_over"):
+            reset_workflow()
+            st.rerun()
+
     if st.session_state.workflow_state in ["preview", "analysis"]:
         st.subheader("Preview and Analyze", divider="green")
         file = st.session_state.uploaded_file
-        file_bytes = file.getvalue()
+        file_bytes = artifact_store.get(file["ref"])
+        if file_bytes is None:
+            st.toast(EXPIRED)
+            reset_workflow()
+            st.rerun()
     
         col1,col2,col3 = st.columns(3)
         with col1:
             st.subheader(":camera_flash: Original Image",divider='blue')
-            st.image(file_bytes, caption=file.name, width=400)
+            show_image(
+                file_bytes, 400, caption=file["name"], zoom_key="zoom_original", image_hash=file["ref"], file_name=file["name"]
+            )
         st.button("Analyze Image",disabled= st.session_state.button_analyze,on_click=click_button)
         if st.session_state.button_analyze_disabled:
-            with st.spinner("Uploading to S3..."):
-                # 1. Upload to S3
-                s3_uri = upload_to_s3(io.BytesIO(file_bytes), S3_BUCKET_NAME, file.name)
-
-            if s3_uri:
-                
-                # 2. Invoke Lambda for analysis
-                bucket, key = s3_uri.replace("s3://", "").split("/", 1)
-                with st.spinner("Analyzing with AWS Rekognition..."):
-                    results = analyze_image_with_lambda(bucket, key)
-                    st.session_state.analysis_results = results
+            # Every stage below is timed; the breakdown is shown next to the results
+            with tracing.trace("rekognition", recorder=trace_recorder, session_key="last_trace", backend=INFERENCE_BACKEND), \
+                    resilience.deadline(ANALYSIS_DEADLINE):
+                # 0. Same image + same model already analyzed? Skip S3 and Lambda entirely
+                with tracing.span("cache_lookup") as span:
+                    image_cache_key = cache_key(file_bytes, model_cache_id())
+                    found, cached = result_cache.lookup(image_cache_key)
+                    span.set(cache_hits=int(found))
+                if found:
+                    st.toast("Loaded result from cache ⚡")
+                    st.session_state.analysis_results = cached
                     st.session_state.workflow_state = "analysis"
                     st.session_state.button_analyze_disabled = False
-                    
                     st.rerun()
+
+                if job_pool is not None:
+                    # A worker process does steps 1-4; the fragment below polls for the result
+                    with tracing.span("enqueue") as span:
+                        job_id, coalesced = submit_analysis_job(file["name"], file_bytes, image_cache_key)
+                        span.set(cache_hits=int(coalesced))
+                    st.session_state.analysis_job = {"id": job_id, "cache_key": image_cache_key}
+                    st.session_state.button_analyze_disabled = False
+                    st.rerun()
+
+                # 1. Downscale/re-encode
+                with tracing.span("preprocess", original_bytes=len(file_bytes)) as span:
+                    prepared = prepare_image(file_bytes, *preprocess_settings())
+                    span.set(sent_bytes=len(prepared.data), resized=prepared.resized)
+                backend = resolve_backend(INFERENCE_BACKEND, len(prepared.data))
+                if backend != INFERENCE_BACKEND:
+                    st.info("Image is larger than 5 MB, sending it through S3 instead.")
+
+                # 2. Upload to S3, unless the bytes go straight to Rekognition
+                s3_uri, upload_ms = None, 0.0
+                if backend != "direct-bytes":
+                    with st.spinner("Uploading to S3..."), tracing.span("upload"):
+                        upload_start = time.perf_counter()
+                        s3_uri = upload_to_s3(prepared.data, sent_file_name(file["name"], prepared))
+                        upload_ms = (time.perf_counter() - upload_start) * 1000
+
+                if s3_uri or backend == "direct-bytes":
+                
+                    # 3. Run inference on the chosen backend
+                    with st.spinner("Analyzing with AWS Rekognition..."):
+                        with tracing.span("inference", backend=backend):
+                            inference_start = time.perf_counter()
+                            if backend == "direct-bytes":
+                                results = analyze_image_direct(image_bytes=prepared.data)
+                            else:
+                                bucket, key = s3_uri.replace("s3://", "").split("/", 1)
+                                if backend == "direct-s3":
+                                    results = analyze_image_direct(bucket=bucket, key=key)
+                                else:
+                                    results = analyze_image_with_lambda(bucket, key)
+                            inference_ms = (time.perf_counter() - inference_start) * 1000
+                        if results is not None:
+                            result_cache.store(image_cache_key, results)
+                            latency_tracker.record(backend, len(prepared.data), (upload_ms + inference_ms) / 1000)
+                            if results:
+                                # Annotate now, on the image we already decoded for inference
+                                with tracing.span("annotate", detections=len(results)):
+                                    annotated_image = get_annotated_image(
+                                        file_bytes, results, annotation_kind(),
+                                        lambda _bytes, detections: draw_bounding_boxes(prepared.image, detections),
+                                        image_hash=file["ref"],
+                                    )
+                                # Encode the display rendition too, so the next rerun only sends it
+                                with tracing.span("display"):
+                                    thumbnail(annotated_image, 400, annotation_id(file["ref"], results, annotation_kind()))
+                        # Boxes are relative (0-1), so they map onto the original image unchanged
+                        st.session_state.preprocess_history.append({
+                            "mode": "downscaled" if prepared.resized else "original",
+                            "backend": backend,
+                            **prepared.report(),
+                            "upload_ms": round(upload_ms, 1),
+                            "inference_ms": round(inference_ms, 1),
+                        })
+                        st.session_state.analysis_results = results
+                        st.session_state.workflow_state = "analysis"
+                        st.session_state.button_analyze_disabled = False
                     
+                        st.rerun()
+        if st.session_state.analysis_job is not None:
+            st.fragment(run_every=JOB_POLL_SECONDS)(analysis_job_panel)(file_bytes, file["ref"])
+        if st.session_state.analysis_error:
+            st.error(f"Analysis failed: {st.session_state.analysis_error}")
     
         if st.session_state.workflow_state == "analysis":
             with col2:
@@ -533,10 +950,20 @@ def main():
                 results = st.session_state.analysis_results
                 if results:
                     # Draw boxes and display the new image
-                    annotated_image = draw_bounding_boxes(file_bytes, results)
-                    st.image(annotated_image, caption="Annotated Image", width=400)
+                    # Memoized: reruns reuse the encoded image instead of redrawing it
+                    annotated_image = get_annotated_image(
+                        file_bytes, results, annotation_kind(), draw_annotation, image_hash=file["ref"]
+                    )
+                    show_image(
+                        annotated_image, 400, caption="Annotated Image", zoom_key="zoom_annotated",
+                        image_hash=annotation_id(file["ref"], results, annotation_kind()),
+                        full_resolution=lambda: render_annotation(
+                            file_bytes, results, "rekognition|original", draw_full_annotation, image_hash=file["ref"]
+                        ),
+                        file_name=f"annotated_{file['name'].rsplit('.', 1)[0]}.jpg",
+                    )
                 else:
-                    st.image(file_bytes, caption="No Label", width=400)
+                    show_image(file_bytes, 400, caption="No Label", image_hash=file["ref"])
                     # st.warning("No analysis results to display.")
             with col3:
                 st.subheader(":brain: Label Result",divider='red')
@@ -548,6 +975,22 @@ def main():
                     st.dataframe(df[['Name','Confidence']])
                 else:
                     st.warning("No analysis results to display.")
+                if st.session_state.preprocess_history:
+                    with st.expander("Payload & Latency"):
+                        history = pd.DataFrame(st.session_state.preprocess_history)
+                        st.dataframe(history)
+                        st.caption("Mean per mode")
+                        st.dataframe(history.groupby("mode")[["sent_kb", "preprocess_ms", "cpu_ms", "decoded_mb", "upload_ms", "inference_ms"]].mean().round(1))
+                tracing.render_trace(st.session_state.get("last_trace"))
+                latency_rows = latency_tracker.table()
+                if latency_rows:
+                    with st.expander("Backend Latency Comparison"):
+                        st.caption("End-to-end (upload + inference) latency of recent analyses, all users.")
+                        st.dataframe(pd.DataFrame(latency_rows), hide_index=True)
+                        sent_size = int(st.session_state.preprocess_history[-1]["sent_kb"] * 1024) if st.session_state.preprocess_history else len(file_bytes)
+                        fastest = latency_tracker.fastest(sent_size)
+                        if fastest:
+                            st.info(f"Fastest backend for images of this size so far: **{fastest}**")
     
         if st.button("Start Over"):
             reset_workflow()
@@ -559,24 +1002,50 @@ try:
          st.error("AWS credentials or configuration are missing. Please configure them.")
          st.stop()
 
-    s3_client = boto3.client(
-        "s3",
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        region_name=AWS_REGION,
-    )
-
+    # Clients are shared per process (see aws_clients.py), not rebuilt on every rerun.
+    # On a cold start the pre-warm thread is usually building them already (see warmup.py)
     try:
-        rekog_client = boto3.client('rekognition',region_name=AWS_REGION)
+        rekog_client = aws_clients.get_configured_client("rekognition", use_keys=False)
     except Exception as e:
         st.error(f"Error initializing Rekognition client: {e}")
         st.stop()
-    lambda_client = boto3.client(
-        "lambda",
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        region_name=AWS_REGION,
-    )
+
+    # S3 and Lambda clients come from the same pool; LAMBDA_MAX_IN_FLIGHT and LAMBDA_CALL_TIMEOUT are read in lambda_engine.py
+    s3_uploader = get_configured_uploader()
+    direct_uploads = get_configured_direct_uploads()
+    lambda_engine = get_configured_engine()
+    status_cache = get_status_cache()
+    model_lifecycle = get_lifecycle(status_cache)
+    latency_tracker = get_latency_tracker()
+    result_cache = get_configured_cache()
+    render_cache_stats(result_cache)
+
+    # Uploaded images and annotations, shared by every session and bounded in size (see artifact_store.py)
+    artifact_store = get_configured_store()
+    render_memory_stats(artifact_store)
+
+    # Worker processes for single-image analyses, shared with the Roboflow page (None = run in the script thread)
+    job_pool = get_configured_pool()
+    if job_pool is not None:
+        render_queue_stats(job_pool)
+
+    # Per-stage latency of every analysis in this process (TRACE_EXPORT_PATH writes spans to disk)
+    trace_recorder = tracing.get_configured_recorder()
+    tracing.render_trace_stats(trace_recorder)
+    resilience.render_resilience_stats()
+    if DIRECT_UPLOAD:
+        render_direct_stats(direct_uploads)
+
+    with st.sidebar.expander("AWS Client Pool"):
+        pool_stats = aws_clients.client_stats()
+        st.caption(f"Created: {pool_stats['created']} | Reused: {pool_stats['reused']}")
+        st.json(pool_stats['by_service'], expanded=False)
+        engine_stats = lambda_engine.stats()
+        st.caption(f"Lambda in flight: {engine_stats['in_flight']}/{engine_stats['max_in_flight']} | Throttle retries: {engine_stats['throttle_retries']} | Timeouts: {engine_stats['timeouts']}")
+        status_stats = status_cache.stats()
+        st.caption(f"Status describes: {status_stats['fetches']} | Hits: {status_stats['hits']} | Stale: {status_stats['stale_served']} | Coalesced: {status_stats['coalesced']}")
+        upload_stats = s3_uploader.stats()
+        st.caption(f"S3 uploads: {upload_stats['uploaded']} | Skipped: {upload_stats['skipped_index'] + upload_stats['skipped_head']}")
     
     
 except Exception as e:
@@ -1,14 +1,27 @@
 # Import package
 import streamlit as st
-from PIL import Image, ImageDraw, ImageFont
-import io
-import pandas as pd
-from inference_sdk import InferenceHTTPClient
-import numpy as np
+from thumbnails import asset, show_image, thumbnail
+import time
+from collections import deque
+from annotate import draw_roboflow_boxes
+from artifact_store import EXPIRED, HISTORY_ROWS, check_in_session, get_configured_store, hold_upload, hold_video, render_memory_stats
+from annotation_cache import annotation_id, get_annotated_image, remember_annotation, render_annotation
+from image_preprocess import DEFAULT_JPEG_QUALITY, DEFAULT_MAX_SIDE, prepare_image, preprocess_tag, scale_pixel_predictions, to_sent_pixels
+from result_cache import cache_key, get_configured_cache, render_cache_stats
+from roboflow_client import MAX_CONCURRENT, get_configured_client
+from onnx_backend import load_configured_model
+from job_queue import PAGE_POLL, get_configured_pool, render_job_status, render_queue_stats
+import resilience
+from video_ingest import DEDUP_DISTANCE, DEFAULT_MAX_FRAMES, DEFAULT_SAMPLE_FPS, VIDEO_TYPES, VideoAnalysis, render_timeline
+import tracing
+from warmup import LazyModule
+
+# Only the result tables need pandas: it is imported when the first one is shown
+pd = LazyModule("pandas")
 #######################################################
 # --- Side Bar Config ---
 st.set_page_config(layout='wide', page_title="Roboflow Image Classification", page_icon="🤖")
-st.sidebar.image('logo.png') 
+st.sidebar.image(asset('logo.png')) 
 st.markdown("""
 <style>
     div[data-testid="stSidebarUserContent"] img {
@@ -47,161 +60,196 @@ st.sidebar.markdown(
 """
 )
 
-st.sidebar.image('roboflow_logo.png') 
+st.sidebar.image(asset('roboflow_logo.png')) 
 #######################################################
 # --- Roboflow Configuration ---
 
 ROBOFLOW_API = st.secrets["ROBOFLOW_API"]
 ROBOFLOW_MODEL = st.secrets["ROBOFLOW_MODEL"]
+# ROBOFLOW_API_URL points the client at a local stub (benchmarks/stub_roboflow_server.py), see roboflow_client.py
+
+# Server side filtering: the model skips low-confidence boxes and caps the count
+ROBOFLOW_CONFIDENCE = st.secrets.get("ROBOFLOW_CONFIDENCE")            # 0-1, None = server default
+ROBOFLOW_MAX_DETECTIONS = st.secrets.get("ROBOFLOW_MAX_DETECTIONS")    # None = server default
+ROBOFLOW_MAX_CONCURRENT = int(st.secrets.get("ROBOFLOW_MAX_CONCURRENT", MAX_CONCURRENT))
+
+# Optional local backend: an ONNX export of ROBOFLOW_MODEL run with onnxruntime on CPU
+# (ONNX_CLASS_NAMES and ONNX_INTRA_OP_THREADS are read in onnx_backend.py)
+ONNX_MODEL_PATH = st.secrets.get("ONNX_MODEL_PATH")
+BACKENDS = ("roboflow-api", "local-onnx") if ONNX_MODEL_PATH else ("roboflow-api",)
+default_backend = st.secrets.get("ROBOFLOW_BACKEND", "roboflow-api")
+INFERENCE_BACKEND = st.sidebar.selectbox(
+    "Inference backend", BACKENDS, index=BACKENDS.index(default_backend) if default_backend in BACKENDS else 0,
+    disabled=len(BACKENDS) == 1,
+    help="roboflow-api: hosted model on serverless.roboflow.com. local-onnx: the exported model on this server's CPU (set ONNX_MODEL_PATH)."
+)
+
+# Single analyses give up after this many seconds, retries included
+ANALYSIS_DEADLINE = float(st.secrets.get("ANALYSIS_DEADLINE_SECONDS", 90))
+
+# Out-of-process analyses: JOB_WORKERS worker processes (JOB_QUEUE_DB) run single-image
+# analyses and this page polls for the result, see job_queue.py. 0 = run them in the script thread
+JOB_POLL_SECONDS = float(st.secrets.get("JOB_POLL_SECONDS", PAGE_POLL))
+
+# Video mode: frames sampled per second, cap per video, and how close two frames may be to count as one
+VIDEO_SAMPLE_FPS = float(st.secrets.get("VIDEO_SAMPLE_FPS", DEFAULT_SAMPLE_FPS))
+VIDEO_MAX_FRAMES = int(st.secrets.get("VIDEO_MAX_FRAMES", DEFAULT_MAX_FRAMES))
+VIDEO_DEDUP_DISTANCE = int(st.secrets.get("VIDEO_DEDUP_DISTANCE", DEDUP_DISTANCE))
+
+# Preprocessing: longest side (px) and JPEG quality of the image sent for inference
+PREPROCESS_MAX_SIDE = int(st.secrets.get("PREPROCESS_MAX_SIDE", DEFAULT_MAX_SIDE))
+PREPROCESS_JPEG_QUALITY = int(st.secrets.get("PREPROCESS_JPEG_QUALITY", DEFAULT_JPEG_QUALITY))
+DOWNSCALE_ENABLED = st.sidebar.toggle(
+    "Downscale before inference", value=True,
+    help="Send a smaller image instead of the full-resolution file. Flip it to compare payload and latency."
+)
 
 #######################################################
 # --- Helper Functions ---
 
-def draw_bounding_boxes(image_bytes, detections):
+def draw_bounding_boxes(image, detections):
     """
     Draws bounding boxes on an image with thickness and font size
     dynamically scaled to the image dimensions, and attempts to
-    prevent text label overlaps.
+    prevent text label overlaps. Rendering is shared with the AWS page, see annotate.py.
     """
     try:
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        draw = ImageDraw.Draw(image)
+        return draw_roboflow_boxes(image, detections)
     except IOError:
-        print("Error: Could not open image from bytes.")
+        print("Error: Could not open image.")
         return None
 
-    img_width, img_height = image.size
-    image_diagonal = (img_width**2 + img_height**2) ** 0.5
+def preprocess_settings():
+    """(max_side, quality) currently in effect; max_side 0 means send the original bytes."""
+    return (PREPROCESS_MAX_SIDE if DOWNSCALE_ENABLED else 0), PREPROCESS_JPEG_QUALITY
 
-    BOX_THICKNESS_FACTOR = 0.006
-    FONT_SIZE_FACTOR = 0.04
+def model_cache_id():
+    """Model identifier for result caching, including inference and preprocessing settings."""
+    return f"{ROBOFLOW_MODEL}|{INFERENCE_BACKEND}|conf={ROBOFLOW_CONFIDENCE}|max={ROBOFLOW_MAX_DETECTIONS}|{preprocess_tag(*preprocess_settings())}"
 
-    dynamic_thickness = max(1, int(image_diagonal * BOX_THICKNESS_FACTOR))
-    dynamic_font_size = max(12, int(image_diagonal * FONT_SIZE_FACTOR))
-    text_padding = max(2, int(dynamic_font_size * 0.15)) # Slightly more padding
+def annotation_kind():
+    """Annotations are drawn at the resolution that was sent, so the settings are part of the key."""
+    return f"roboflow|{preprocess_tag(*preprocess_settings())}"
 
-    try:
-        font = ImageFont.load_default(size=dynamic_font_size)
-    except AttributeError:
-        font = ImageFont.load_default()
-    except IOError:
-        print("Warning: Default font not found.")
-        font = ImageFont.load_default()
-
-    colors = {"mild": "#FFFF00", "moderate": "#FFA500", "severe": "#FF0000"}
+def draw_annotation(image_bytes, detections):
+    """
+    Draws on the same (possibly downscaled) image that is sent for inference.
+    Used when the annotation was not primed right after inference (cached result, evicted image).
+    """
+    prepared = prepare_image(image_bytes, *preprocess_settings())
+    return draw_bounding_boxes(prepared.image, to_sent_pixels(detections, prepared))
 
-    # --- NEW: Keep track of occupied label regions ---
-    occupied_regions = []
+def draw_full_annotation(image_bytes, detections):
+    """The zoom rendition: detections are kept in original pixels, so they go on the original as they are."""
+    return draw_bounding_boxes(prepare_image(image_bytes, 0).image, detections)
 
-    for det in detections:
-        center_x = det.get('x')
-        center_y = det.get('y')
-        width = det.get('width')
-        height = det.get('height')
-        label = det.get('class')
-        
-        if not all([center_x, center_y, width, height, label]):
-            print(f"Skipping a detection due to missing data: {det}")
+def run_batch_analysis(files):
+    """
+    Analyzes many images with bounded concurrent requests on the shared client.
+    Cached images are answered right away. Yields (file name, results, error) in completion order.
+    """
+    pending = []
+    for f in files:
+        file_bytes = artifact_store.get(f["ref"])
+        if file_bytes is None:
+            yield f["name"], None, ValueError(EXPIRED)
             continue
-
-        color = colors.get(label, "#CCCCCC")
-
-        x1 = center_x - width / 2
-        y1 = center_y - height / 2
-        x2 = center_x + width / 2
-        y2 = center_y + height / 2
-
-        points = ((x1, y1), (x2, y2))
-        draw.rectangle(points, outline=color, width=dynamic_thickness)
-
-        confidence = det.get("confidence", 0) * 100
-        label_text = f"{label} ({confidence:.1f}%)"
-
-        text_bbox_raw = draw.textbbox((0, 0), label_text, font=font)
-        text_width = text_bbox_raw[2] - text_bbox_raw[0]
-        text_height = text_bbox_raw[3] - text_bbox_raw[1]
-
-        # Calculate text background dimensions
-        bg_width = text_width + (text_padding * 2)
-        bg_height = text_height + (text_padding * 2)
-
-        # --- NEW: Smart placement logic ---
-        # Function to check for overlap
-        def overlaps(rect1, rect2):
-            return not (rect1[2] < rect2[0] or rect1[0] > rect2[2] or
-                        rect1[3] < rect2[1] or rect1[1] > rect2[3])
-
-        # Attempt to place above, then inside top-left, then inside bottom-left
-        potential_positions = [
-            # 1. Above the box
-            (x1, y1 - bg_height),
-            # 2. Inside top-left corner
-            (x1, y1),
-            # 3. Inside top-right corner (if above is too crowded or goes off-screen)
-            (x2 - bg_width, y1),
-            # 4. Inside bottom-left corner
-            (x1, y2 - bg_height),
-            # 5. Inside bottom-right corner
-            (x2 - bg_width, y2 - bg_height)
-        ]
-        
-        # Adjust potential positions to be within image bounds if possible
-        for i, (px, py) in enumerate(potential_positions):
-            px = max(0, min(px, img_width - bg_width))
-            py = max(0, min(py, img_height - bg_height))
-            potential_positions[i] = (px, py)
-
-        final_pos = None
-        for px, py in potential_positions:
-            current_label_rect = (px, py, px + bg_width, py + bg_height)
-            
-            # Check if this position causes overlap with previously placed labels
-            is_overlapping = False
-            for existing_rect in occupied_regions:
-                if overlaps(current_label_rect, existing_rect):
-                    is_overlapping = True
-                    break
-            
-            if not is_overlapping:
-                final_pos = (px, py)
-                break # Found a suitable spot, move on
-
-        # If no non-overlapping spot is found, just place it above the box (or inside if necessary)
-        # This is a fallback to ensure the label is always drawn, even if it overlaps.
-        if final_pos is None:
-            final_pos = potential_positions[0] # Default to first option
-            # print(f"Warning: Overlapping label for '{label_text}' at {final_pos}")
-
-
-        text_bg_x, text_bg_y = final_pos
-
-        # Ensure text is slightly offset within its background for padding
-        text_draw_x = text_bg_x + text_padding
-        text_draw_y = text_bg_y + text_padding
-
-        text_bg_coords = [
-            (text_bg_x, text_bg_y),
-            (text_bg_x + bg_width, text_bg_y + bg_height)
-        ]
-        draw.rectangle(text_bg_coords, fill=color)
-        draw.text((text_draw_x, text_draw_y), label_text, fill="black", font=font)
-        
-        # Add the final placed label's bounding box to occupied regions
-        occupied_regions.append(text_bg_coords[0] + text_bg_coords[1]) # Store as (x1, y1, x2, y2)
-
-    return image
+        key = cache_key(file_bytes, model_cache_id())
+        found, cached = result_cache.lookup(key)
+        if found:
+            yield f["name"], cached, None
+        else:
+            pending.append((f["name"], key, prepare_image(file_bytes, *preprocess_settings())))
+
+    for index, results, error in CLIENT.infer_batch([p.data for _, _, p in pending], model_id=ROBOFLOW_MODEL):
+        name, key, prepared = pending[index]
+        if error is None:
+            results = scale_pixel_predictions(results, prepared)
+            result_cache.store(key, results)
+        yield name, results, error
+
+def analyze_frame(frame_bytes):
+    """
+    One video frame through the shared client (cached like single images).
+    Returns [(class, confidence), ...]. Thread safe, no st.* calls.
+    """
+    key = cache_key(frame_bytes, model_cache_id())
+    found, results = result_cache.lookup(key)
+    if not found:
+        results = CLIENT.infer(frame_bytes, model_id=ROBOFLOW_MODEL)
+        result_cache.store(key, results)
+    return [(p['class'], p['confidence']) for p in results.get('predictions', [])]
+
+def submit_analysis_job(file_bytes, image_cache_key):
+    """
+    Queues preprocess -> inference -> annotate for a worker process. Returns
+    (job id, coalesced): the same image with the same settings shares one job.
+    """
+    max_side, quality = preprocess_settings()
+    params = {
+        "model_id": ROBOFLOW_MODEL, "backend": INFERENCE_BACKEND,
+        "max_side": max_side, "quality": quality, "deadline_s": ANALYSIS_DEADLINE,
+    }
+    return job_pool.submit("job_handlers:analyze_roboflow", image_cache_key, params, file_bytes)
+
+def analysis_job_panel(file_bytes, image_hash):
+    """Polls the queued analysis (as a fragment). Once the worker is done the whole page reruns."""
+    pending = st.session_state.analysis_job
+    job = job_pool.get(pending["id"])
+    if job is not None and job["status"] in ("queued", "running"):
+        render_job_status(job)
+        return
+
+    st.session_state.analysis_job = None
+    if job is None or job["status"] == "failed":
+        st.session_state.analysis_error = job["error"] if job else "The job was lost, please try again."
+        st.session_state.button_analyze = False
+        st.rerun()
+
+    results = job["result"]
+    result_cache.store(pending["cache_key"], results)
+    # The worker already drew the boxes: the results view shows its JPEG
+    if job["artifact"] is not None:
+        remember_annotation(file_bytes, results['predictions'], annotation_kind(), job["artifact"], image_hash=image_hash)
+    trace_recorder.record_timings("roboflow-job", job["report"]["timings"])
+    st.session_state.preprocess_history.append(job["report"]["history"])
+    st.session_state.analysis_results = results
+    st.session_state.workflow_state_2 = "analysis"
+    st.rerun()
+
+def render_batch_item(summary):
+    """Shows one finished batch image in its own expander."""
+    icon = "✅" if summary["ok"] else "❌"
+    with st.expander(f"{icon} {summary['name']}"):
+        if not summary["ok"]:
+            st.error(summary["error"])
+            return
+        df = pd.DataFrame(summary["predictions"])
+        if 'class' not in df.columns:
+            st.info("No Accident")
+        else:
+            st.dataframe(df[['class','confidence']])
 
 def click_button():
+    st.session_state.analysis_error = None
     st.session_state.button_analyze = not st.session_state.button_analyze
     st.session_state.button_analyze_disabled = not st.session_state.button_analyze_disabled
 
 def reset_workflow():
     """Resets the app to its initial state"""
     st.session_state.workflow_state_2 = "select"
+    st.session_state.uploaded_file = None
     st.session_state.analysis_results = None
     st.session_state.annotated_image = None
     st.session_state.button_analyze = False
     st.session_state.button_analyze_disabled = False
+    st.session_state.batch_files = None
+    st.session_state.batch_results = None
+    st.session_state.video_file = None
+    st.session_state.video_results = None
+    st.session_state.analysis_job = None
+    st.session_state.analysis_error = None
+    st.session_state.last_trace = None
 
 #######################################################
 # --- Main App Logic ---
@@ -217,8 +265,27 @@ def main():
         st.session_state.annotated_image = None
         st.session_state.button_analyze = False
         st.session_state.button_analyze_disabled = False
-    
-    
+    if 'uploaded_file' not in st.session_state:
+        st.session_state.uploaded_file = None
+    if 'preprocess_history' not in st.session_state:
+        st.session_state.preprocess_history = deque(maxlen=HISTORY_ROWS)
+    if 'batch_files' not in st.session_state:
+        st.session_state.batch_files = None
+    if 'batch_results' not in st.session_state:
+        st.session_state.batch_results = None
+    if 'video_file' not in st.session_state:
+        st.session_state.video_file = None
+    if 'video_results' not in st.session_state:
+        st.session_state.video_results = None
+    if 'analysis_job' not in st.session_state:
+        st.session_state.analysis_job = None
+        st.session_state.analysis_error = None
+
+    # Images live in the shared store (session state only has refs): a tab that sat idle
+    # long enough to lose them starts over
+    if check_in_session(artifact_store):
+        reset_workflow()
+        st.toast("This session was idle, so its images were released.")
     
     if st.session_state.workflow_state_2 == "select":
         st.subheader("Welcome to :orange[Accident Severity] App", divider="green")
@@ -233,7 +300,7 @@ def main():
         st.markdown("<span style='font-size: 24px;'>**<u>Example Output**<u> </span>", unsafe_allow_html=True)
         # Assuming your image path is correct for your local run
         try:
-            st.image('tutorial_robo.png', width=1000)
+            st.image(asset('tutorial_robo.png', width=1000), width=1000)
         except FileNotFoundError:
             st.warning("Warning: Tutorial image not found at the specified path.")
         
@@ -259,25 +326,185 @@ def main():
         )
     
         if uploaded_file is not None:
-            st.session_state.uploaded_file = uploaded_file
+            # Keep a reference, not the UploadedFile buffer
+            st.session_state.uploaded_file = hold_upload(artifact_store, uploaded_file)
             st.session_state.workflow_state_2 = "preview"
             st.rerun() # Rerun the script to move to the next state
+
+        st.subheader("Batch Analysis", divider="green")
+        st.markdown('*Several photos of the same accident? Upload them together and they will be analyzed in parallel.*')
+        batch_files = st.file_uploader(
+            "Choose multiple image files", type=["jpg", "jpeg", "png"],
+            accept_multiple_files=True, key="batch_uploader"
+        )
+        if batch_files and st.button(f"Analyze {len(batch_files)} Images ➡️", type="primary"):
+            st.session_state.batch_files = [hold_upload(artifact_store, f) for f in batch_files]
+            st.session_state.batch_results = None
+            st.session_state.workflow_state_2 = "batch"
+            st.rerun()
+
+        st.subheader("Video Analysis", divider="green")
+        st.markdown('*Dashcam footage of the accident? Frames are sampled, near-duplicates skipped, and the rest analyzed in parallel.*')
+        video_file = st.file_uploader("Choose a video file", type=VIDEO_TYPES, key="video_uploader")
+        if video_file is not None and st.button("Analyze Video ➡️", type="primary"):
+            # Spooled to a file of the shared store: the session keeps a ref, released when idle like images
+            st.session_state.video_file = hold_video(artifact_store, video_file)
+            st.session_state.video_results = None
+            st.session_state.workflow_state_2 = "video"
+            st.rerun()
+
+    if st.session_state.workflow_state_2 == "batch":
+        st.subheader("Batch Analysis", divider="green")
+        files = st.session_state.batch_files or []
+
+        if st.session_state.batch_results is None:
+            parallel = f"{ROBOFLOW_MAX_CONCURRENT} at a time" if INFERENCE_BACKEND == "roboflow-api" else "on the local model"
+            st.info(f"{len(files)} images ready for analysis, {parallel}.")
+            if st.button("Run Batch Analysis", type="primary"):
+                progress = st.progress(0.0, text="Starting...")
+                batch_results = []
+                # Results are rendered as soon as each image finishes
+                for name, results, error in run_batch_analysis(files):
+                    summary = {
+                        "name": name,
+                        "ok": error is None,
+                        "error": resilience.describe(error) if error else None,
+                        "predictions": (results or {}).get("predictions", []),
+                    }
+                    batch_results.append(summary)
+                    progress.progress(len(batch_results) / len(files), text=f"{len(batch_results)}/{len(files)} done")
+                    render_batch_item(summary)
+                st.session_state.batch_results = batch_results
+        else:
+            batch_results = st.session_state.batch_results
+            failed = sum(1 for r in batch_results if not r["ok"])
+            st.success(f"Analyzed {len(batch_results) - failed}/{len(batch_results)} images.")
+            for summary in batch_results:
+                render_batch_item(summary)
+
+        if st.button("Start Over", key="batch_start_over"):
+            reset_workflow()
+            st.rerun()
+
+    if st.session_state.workflow_state_2 == "video":
+        st.subheader("Video Analysis", divider="green")
+        video = st.session_state.video_file
+        video_path = artifact_store.path(video["ref"]) if video is not None else None
+        if video is not None and video_path is None:
+            st.toast(EXPIRED)
+            reset_workflow()
+            st.rerun()
+
+        with st.expander("Sampling Settings"):
+            c1, c2, c3, c4 = st.columns(4)
+            sample_fps = c1.number_input("Frames per second", 0.1, 30.0, VIDEO_SAMPLE_FPS, step=0.5)
+            max_frames = c2.number_input("Max frames", 1, 5000, VIDEO_MAX_FRAMES)
+            max_distance = c3.number_input(
+                "Duplicate distance", 0, 32, VIDEO_DEDUP_DISTANCE,
+                help="How many of the 64 hash bits may differ for a frame to count as a repeat. 0 only skips identical frames."
+            )
+            # The local model already uses every core per call
+            workers = c4.number_input("Parallel calls", 1, 32, ROBOFLOW_MAX_CONCURRENT if INFERENCE_BACKEND == "roboflow-api" else 1)
+
+        if st.session_state.analysis_error:
+            st.error(f"Could not read this video: {st.session_state.analysis_error}")
+        elif st.session_state.video_results is None:
+            st.info(f"{video['name']} ({video['size'] / 1024 ** 2:.1f} MB) ready for analysis.")
+            if st.button("Run Video Analysis", type="primary"):
+                progress = st.progress(0.0, text="Decoding...")
+                max_side, quality = preprocess_settings()
+                try:
+                    run = VideoAnalysis(video_path, analyze_frame, workers, sample_fps, max_frames, max_distance, max_side, quality)
+                    expected = run.expected_frames()
+                    for item in run.run():
+                        trace_recorder.record_timings("roboflow-video", item.timings)
+                        progress.progress(min(1.0, run.done_count / expected), text=f"{run.done_count}/{expected} frames")
+                    st.session_state.video_results = {"timeline": run.timeline(), "stats": run.stats()}
+                except ValueError as e:
+                    st.session_state.analysis_error = str(e)
+                # Only the results (or the error) are shown from now on: let the file go
+                st.session_state.video_file = None
+                st.rerun()
+
+        if st.session_state.video_results is not None:
+            render_timeline(st.session_state.video_results)
+
+        if st.button("Start Over", key="video_start_over"):
+            reset_workflow()
+            st.rerun()
     
     if st.session_state.workflow_state_2 in ["preview", "analysis"]:
         st.subheader("Preview and Analyze", divider="green")
         file = st.session_state.uploaded_file
-        file_bytes = file.getvalue()
+        file_bytes = artifact_store.get(file["ref"])
+        if file_bytes is None:
+            st.toast(EXPIRED)
+            reset_workflow()
+            st.rerun()
     
         col1,col2,col3 = st.columns(3)
         with col1:
             st.subheader(":camera_flash: Original Image",divider='blue')
-            st.image(file_bytes, caption=file.name, width=400)
+            show_image(
+                file_bytes, 400, caption=file["name"], zoom_key="zoom_original", image_hash=file["ref"], file_name=file["name"]
+            )
         st.button("Analyze Image",disabled= st.session_state.button_analyze,on_click=click_button)
         if st.session_state.button_analyze_disabled:
-            with st.spinner("Analyzing..."):
-                image = Image.open(io.BytesIO(file_bytes)).convert("RGB")
-                image_np = np.array(image)
-                results = CLIENT.infer(image_np, model_id=ROBOFLOW_MODEL)
+            # Every stage below is timed; the breakdown is shown next to the results
+            with st.spinner("Analyzing..."), tracing.trace("roboflow", recorder=trace_recorder, session_key="last_trace", backend=INFERENCE_BACKEND), \
+                    resilience.deadline(ANALYSIS_DEADLINE):
+                inference_error = None
+                # Same image + same model already analyzed? Skip the remote call
+                with tracing.span("cache_lookup") as span:
+                    image_cache_key = cache_key(file_bytes, model_cache_id())
+                    found, results = result_cache.lookup(image_cache_key)
+                    span.set(cache_hits=int(found))
+                if found:
+                    st.toast("Loaded result from cache ⚡")
+                elif job_pool is not None:
+                    # A worker process does the rest; the fragment below polls for the result
+                    with tracing.span("enqueue") as span:
+                        job_id, coalesced = submit_analysis_job(file_bytes, image_cache_key)
+                        span.set(cache_hits=int(coalesced))
+                    st.session_state.analysis_job = {"id": job_id, "cache_key": image_cache_key}
+                    st.session_state.button_analyze_disabled = False
+                    st.rerun()
+                else:
+                    with tracing.span("preprocess", original_bytes=len(file_bytes)) as span:
+                        prepared = prepare_image(file_bytes, *preprocess_settings())
+                        span.set(sent_bytes=len(prepared.data), resized=prepared.resized)
+                    infer_start = time.perf_counter()
+                    with tracing.span("inference", backend=INFERENCE_BACKEND):
+                        try:
+                            # The prepared bytes are sent as they are: no decode to numpy and re-encode
+                            results = CLIENT.infer(prepared.data, model_id=ROBOFLOW_MODEL)
+                        except Exception as e:
+                            print(f"Roboflow inference failed: {resilience.describe(e)}")
+                            tracing.annotate(error=type(e).__name__)
+                            inference_error = e
+                            results = None
+                    infer_ms = (time.perf_counter() - infer_start) * 1000
+                    sent_predictions = (results or {}).get("predictions", [])
+                    # Predictions are in pixels of the sent image: map them back to the original
+                    results = scale_pixel_predictions(results, prepared)
+                    if results:
+                        result_cache.store(image_cache_key, results)
+                        # Annotate now, on the image we already decoded for inference
+                        with tracing.span("annotate", detections=len(sent_predictions)):
+                            annotated_image = get_annotated_image(
+                                file_bytes, results['predictions'], annotation_kind(),
+                                lambda _bytes, _detections: draw_bounding_boxes(prepared.image, sent_predictions),
+                                image_hash=file["ref"],
+                            )
+                        # Encode the display rendition too, so the next rerun only sends it
+                        if annotated_image is not None:
+                            with tracing.span("display"):
+                                thumbnail(annotated_image, 400, annotation_id(file["ref"], results['predictions'], annotation_kind()))
+                    st.session_state.preprocess_history.append({
+                        "mode": "downscaled" if prepared.resized else "original",
+                        **prepared.report(),
+                        "infer_ms": round(infer_ms, 1),
+                    })
                 
                 if results:
                     st.session_state.analysis_results = results
@@ -286,7 +513,11 @@ def main():
                     
                     st.rerun()
                 else:
-                    st.error("Analysis failed. Check the logs for details.")
+                    st.error(f"Analysis failed: {resilience.describe(inference_error)}" if inference_error else "Analysis failed. Check the logs for details.")
+        if st.session_state.analysis_job is not None:
+            st.fragment(run_every=JOB_POLL_SECONDS)(analysis_job_panel)(file_bytes, file["ref"])
+        if st.session_state.analysis_error:
+            st.error(f"Analysis failed: {st.session_state.analysis_error}")
     
         if st.session_state.workflow_state_2 == "analysis":
             with col2:
@@ -294,8 +525,18 @@ def main():
                 results = st.session_state.analysis_results
                 if results:
                     # Draw boxes and display the new image
-                    annotated_image = draw_bounding_boxes(file_bytes, results['predictions'])
-                    st.image(annotated_image, caption="Annotated Image", width=400)
+                    # Memoized: reruns reuse the encoded image instead of redrawing it
+                    annotated_image = get_annotated_image(
+                        file_bytes, results['predictions'], annotation_kind(), draw_annotation, image_hash=file["ref"]
+                    )
+                    show_image(
+                        annotated_image, 400, caption="Annotated Image", zoom_key="zoom_annotated",
+                        image_hash=annotation_id(file["ref"], results['predictions'], annotation_kind()),
+                        full_resolution=lambda: render_annotation(
+                            file_bytes, results['predictions'], "roboflow|original", draw_full_annotation, image_hash=file["ref"]
+                        ),
+                        file_name=f"annotated_{file['name'].rsplit('.', 1)[0]}.jpg",
+                    )
                 else:
                     st.warning("No analysis results to display.")
             with col3:
@@ -312,6 +553,13 @@ def main():
                         st.dataframe(df[['class','confidence']])
                 else:
                     st.warning("No analysis results to display.")
+                if st.session_state.preprocess_history:
+                    with st.expander("Payload & Latency"):
+                        history = pd.DataFrame(st.session_state.preprocess_history)
+                        st.dataframe(history)
+                        st.caption("Mean per mode")
+                        st.dataframe(history.groupby("mode")[["sent_kb", "preprocess_ms", "cpu_ms", "decoded_mb", "infer_ms"]].mean().round(1))
+                tracing.render_trace(st.session_state.get("last_trace"))
     
         if st.button("Start Over"):
             reset_workflow()
@@ -323,11 +571,39 @@ try:
          st.error("Credentials or configuration are missing. Please configure them.")
          st.stop()
 
-    # initialize the client
-    CLIENT = InferenceHTTPClient(
-        api_url="https://serverless.roboflow.com",
-        api_key=ROBOFLOW_API
-    )
+    # The welcome screen needs no model: on a cold start the client (and inference_sdk,
+    # numpy...) is built by the pre-warm thread, or here once an image was picked
+    if st.session_state.get("workflow_state_2", "select") != "select":
+        if INFERENCE_BACKEND == "local-onnx":
+            # One onnxruntime session per process, shared by every session and rerun
+            try:
+                CLIENT = load_configured_model()
+            except Exception as e:
+                st.sidebar.warning(f"Local model unavailable, using the Roboflow API: {e}")
+                INFERENCE_BACKEND = "roboflow-api"
+
+        if INFERENCE_BACKEND == "roboflow-api":
+            # Shared across sessions and reruns: connections to the API stay open
+            CLIENT = get_configured_client()
+        with st.sidebar.expander("Roboflow Client" if INFERENCE_BACKEND == "roboflow-api" else "Local ONNX Model"):
+            st.json(CLIENT.stats())
+
+    result_cache = get_configured_cache()
+    render_cache_stats(result_cache)
+
+    # Uploaded images and annotations, shared by every session and bounded in size (see artifact_store.py)
+    artifact_store = get_configured_store()
+    render_memory_stats(artifact_store)
+
+    # Worker processes for single-image analyses, shared with the AWS page (None = run in the script thread)
+    job_pool = get_configured_pool()
+    if job_pool is not None:
+        render_queue_stats(job_pool)
+
+    # Per-stage latency of every analysis in this process (TRACE_EXPORT_PATH writes spans to disk)
+    trace_recorder = tracing.get_configured_recorder()
+    tracing.render_trace_stats(trace_recorder)
+    resilience.render_resilience_stats()
     
     
 except Exception as e:
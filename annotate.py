@@ -0,0 +1,265 @@
+# Import package
+import html
+import io
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+from warmup import LazyModule
+
+# Imported on the first drawing, not when a page loads
+np = LazyModule("numpy")
+
+#######################################################
+# --- Shared bounding-box renderer for both pages ---
+# Both detection formats are normalized into one (n, 4) float array of pixel
+# corners (x1, y1, x2, y2). Conversion, clamping and label candidate positions
+# are computed for all detections at once; drawing is a single pass.
+
+# Rekognition: colors cycle per detection
+REKOGNITION_COLORS = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A', '#98D8C8', '#F7DC6F']
+# Roboflow: colors by severity class
+SEVERITY_COLORS = {"mild": "#FFFF00", "moderate": "#FFA500", "severe": "#FF0000"}
+DEFAULT_COLOR = "#CCCCCC"
+
+class Style:
+    """Per-page look, scaled by the image diagonal."""
+    def __init__(self, font_size_factor, padding_factor, box_thickness_factor=0.006):
+        self.font_size_factor = font_size_factor
+        self.padding_factor = padding_factor
+        self.box_thickness_factor = box_thickness_factor
+
+    def sizes(self, img_width, img_height):
+        """(box thickness, font size, text padding) for this image size."""
+        image_diagonal = (img_width**2 + img_height**2) ** 0.5
+        thickness = max(1, int(image_diagonal * self.box_thickness_factor))
+        font_size = max(12, int(image_diagonal * self.font_size_factor))
+        padding = max(2, int(font_size * self.padding_factor))
+        return thickness, font_size, padding
+
+REKOGNITION_STYLE = Style(font_size_factor=0.03, padding_factor=0.1)
+ROBOFLOW_STYLE = Style(font_size_factor=0.04, padding_factor=0.15)
+
+#######################################################
+# --- Fonts and text metrics (cached per process) ---
+
+@lru_cache(maxsize=32)
+def get_font(font_size):
+    try:
+        return ImageFont.load_default(size=font_size)
+    except AttributeError: # Fallback for older Pillow versions
+        return ImageFont.load_default()
+    except IOError:
+        print("Warning: Default font not found.")
+        return ImageFont.load_default()
+
+@lru_cache(maxsize=4096)
+def text_size(label_text, font_size):
+    """(width, height) of the rendered text; same box draw.textbbox((0, 0), ...) returns."""
+    left, top, right, bottom = get_font(font_size).getbbox(label_text)
+    return right - left, bottom - top
+
+#######################################################
+# --- Normalization: detections -> numpy boxes ---
+
+def rekognition_labels(detections):
+    """(relative (left, top, width, height), label text, color) per detection that has a box."""
+    labels = []
+    for i, det in enumerate(detections):
+        box = det.get("Geometry", {}).get("BoundingBox", {})
+        if not box:
+            box = det.get("BoundingBox", {}) # Fallback for different structures
+        if not (box and all(k in box for k in ["Left", "Top", "Width", "Height"])):
+            print(f"Skipping a detection due to missing BoundingBox data: {det}")
+            continue
+        labels.append((
+            (box["Left"], box["Top"], box["Width"], box["Height"]),
+            f"{det.get('Name', 'Unknown')} ({det.get('Confidence', 0):.1f}%)",
+            REKOGNITION_COLORS[i % len(REKOGNITION_COLORS)],
+        ))
+    return labels
+
+def normalize_rekognition(detections, img_width, img_height):
+    """
+    Rekognition relative Left/Top/Width/Height -> pixel corners.
+    Returns (boxes, label texts, colors); detections without a box are skipped.
+    """
+    rel, texts, colors = [], [], []
+    for box, text, color in rekognition_labels(detections):
+        rel.append(box)
+        texts.append(text)
+        colors.append(color)
+
+    rel = np.asarray(rel, dtype=np.float64).reshape(-1, 4)
+    boxes = np.empty_like(rel)
+    boxes[:, 0] = rel[:, 0] * img_width
+    boxes[:, 1] = rel[:, 1] * img_height
+    boxes[:, 2] = boxes[:, 0] + rel[:, 2] * img_width
+    boxes[:, 3] = boxes[:, 1] + rel[:, 3] * img_height
+    return boxes, texts, colors
+
+def normalize_roboflow(detections):
+    """
+    Roboflow center x/y + width/height (pixels) -> pixel corners.
+    Returns (boxes, label texts, colors); incomplete detections are skipped.
+    """
+    centers, texts, colors = [], [], []
+    for det in detections:
+        values = [det.get(k) for k in ("x", "y", "width", "height")]
+        label = det.get("class")
+        if any(v is None for v in values) or not label:
+            print(f"Skipping a detection due to missing data: {det}")
+            continue
+        centers.append(values)
+        texts.append(f"{label} ({det.get('confidence', 0) * 100:.1f}%)")
+        colors.append(SEVERITY_COLORS.get(label, DEFAULT_COLOR))
+
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 4)
+    half = centers[:, 2:] / 2
+    boxes = np.hstack([centers[:, :2] - half, centers[:, :2] + half])
+    return boxes, texts, colors
+
+#######################################################
+# --- Label placement ---
+
+def label_candidates(boxes, label_sizes, img_width, img_height):
+    """
+    Candidate label origins for every box at once, clamped to the image, in order
+    of preference: above, inside top-left, inside top-right, inside bottom-left,
+    inside bottom-right, below, above right-aligned, left of the box, right of the box.
+    Returns an (n, 9, 2) array.
+    """
+    x1, y1, x2, y2 = boxes.T
+    bw, bh = label_sizes.T
+    cx = np.stack([x1, x1, x2 - bw, x1, x2 - bw, x1, x2 - bw, x1 - bw, x2], axis=1)
+    cy = np.stack([y1 - bh, y1, y1, y2 - bh, y2 - bh, y2, y1 - bh, y1, y1], axis=1)
+    cx = np.clip(cx, 0, np.maximum(img_width - bw, 0)[:, None])
+    cy = np.clip(cy, 0, np.maximum(img_height - bh, 0)[:, None])
+    return np.stack([cx, cy], axis=2)
+
+class LabelGrid:
+    """
+    Coarse occupancy grid of placed labels: each cell counts how many labels
+    cover it. Checking a candidate only reads the cells under it, so the cost
+    of a query depends on the label size, not on how many labels are already
+    placed, and n labels are placed in roughly linear time. Cell edges are
+    rounded, so overlaps smaller than half a cell are ignored.
+    """
+    def __init__(self, img_width, img_height, cell_size):
+        self.cell_size = max(1.0, float(cell_size))
+        rows = int(np.ceil(img_height / self.cell_size)) + 1
+        cols = int(np.ceil(img_width / self.cell_size)) + 1
+        self.counts = np.zeros((rows, cols), dtype=np.int32)
+
+    def windows(self, rects):
+        """Cell windows (x0, y0, x1, y1) for an (..., 4) array of rects, in one vectorized step."""
+        cells = np.rint(np.asarray(rects) / self.cell_size).astype(np.int64)
+        cells[..., 2] = np.maximum(cells[..., 2], cells[..., 0] + 1)
+        cells[..., 3] = np.maximum(cells[..., 3], cells[..., 1] + 1)
+        return cells
+
+    def cost(self, window):
+        """Covered cells under the window, weighted by how many labels cover them."""
+        x0, y0, x1, y1 = window
+        return int(self.counts[y0:y1, x0:x1].sum())
+
+    def add(self, window):
+        x0, y0, x1, y1 = window
+        self.counts[y0:y1, x0:x1] += 1
+
+def place_labels(candidates, label_sizes, img_width, img_height):
+    """
+    First candidate that overlaps no already placed label. If every candidate
+    overlaps, the one with the least overlap wins instead of always falling
+    back to "above the box".
+    """
+    placed = np.empty((len(candidates), 2))
+    if len(candidates) == 0:
+        return placed
+    # A quarter of the typical label height keeps rounding errors small
+    grid = LabelGrid(img_width, img_height, cell_size=float(np.median(label_sizes[:, 1])) / 4)
+    sizes = np.broadcast_to(label_sizes[:, None, :], candidates.shape)
+    windows = grid.windows(np.concatenate([candidates, candidates + sizes], axis=2)).tolist()
+
+    for i, options in enumerate(windows):
+        choice, best_cost = 0, None
+        for j, window in enumerate(options):
+            cost = grid.cost(window)
+            if best_cost is None or cost < best_cost:
+                choice, best_cost = j, cost
+                if cost == 0:
+                    break
+        placed[i] = candidates[i, choice]
+        grid.add(options[choice])
+    return placed
+
+#######################################################
+# --- Rendering ---
+
+def render(image, boxes, texts, colors, style):
+    """Draws all boxes, then all labels, on `image` in place and returns it."""
+    if len(boxes) == 0:
+        return image
+    img_width, img_height = image.size
+    thickness, font_size, padding = style.sizes(img_width, img_height)
+    font = get_font(font_size)
+
+    boxes = boxes.copy()
+    boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, img_width)
+    boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, img_height)
+
+    label_sizes = np.array([text_size(t, font_size) for t in texts], dtype=np.float64) + padding * 2
+    positions = place_labels(
+        label_candidates(boxes, label_sizes, img_width, img_height), label_sizes, img_width, img_height
+    )
+
+    draw = ImageDraw.Draw(image)
+    for (x1, y1, x2, y2), color in zip(boxes.tolist(), colors):
+        draw.rectangle(((x1, y1), (x2, y2)), outline=color, width=thickness)
+    for (px, py), (bw, bh), text, color in zip(positions.tolist(), label_sizes.tolist(), texts, colors):
+        draw.rectangle([(px, py), (px + bw, py + bh)], fill=color)
+        # Black text is more readable on colorful backgrounds
+        draw.text((px + padding, py + padding), text, fill="black", font=font)
+    return image
+
+def open_rgb(image):
+    """Encoded bytes or an already decoded PIL image -> RGB copy we can draw on."""
+    if isinstance(image, Image.Image):
+        return image.convert("RGB") if image.mode != "RGB" else image.copy()
+    return Image.open(io.BytesIO(image)).convert("RGB")
+
+def draw_rekognition_boxes(image, detections):
+    """Annotated PIL image for Rekognition custom-label results."""
+    image = open_rgb(image)
+    boxes, texts, colors = normalize_rekognition(detections, *image.size)
+    return render(image, boxes, texts, colors, REKOGNITION_STYLE)
+
+def draw_roboflow_boxes(image, detections):
+    """Annotated PIL image for Roboflow predictions."""
+    image = open_rgb(image)
+    boxes, texts, colors = normalize_roboflow(detections)
+    return render(image, boxes, texts, colors, ROBOFLOW_STYLE)
+
+
+#######################################################
+# --- HTML overlay ---
+# For images the server never downloads (browser uploads straight to S3): the
+# browser loads the image from its URL and the boxes are positioned on top in
+# percent, which works because Rekognition boxes are relative.
+
+def rekognition_overlay_html(image_url, detections, width):
+    """<div> with the image and one absolutely positioned box + label per detection (for st.html)."""
+    parts = [
+        f'<div style="position: relative; display: inline-block; width: {int(width)}px; line-height: 0;">',
+        f'<img src="{html.escape(image_url)}" style="width: 100%; display: block;">',
+    ]
+    for (left, top, box_width, box_height), text, color in rekognition_labels(detections):
+        # Above the box, or inside it when the box touches the top edge
+        anchor = "bottom: 100%" if top > 0.05 else "top: 0"
+        parts.append(
+            f'<div style="position: absolute; left: {left * 100:.3f}%; top: {top * 100:.3f}%; '
+            f'width: {box_width * 100:.3f}%; height: {box_height * 100:.3f}%; '
+            f'border: 2px solid {color}; box-sizing: border-box;">'
+            f'<span style="position: absolute; left: -2px; {anchor}; background: {color}; color: black; '
+            f'font-size: 12px; line-height: 1.4; padding: 0 4px; white-space: nowrap;">{html.escape(text)}</span></div>'
+        )
+    parts.append("</div>")
+    return "".join(parts)
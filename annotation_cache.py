@@ -0,0 +1,79 @@
+# Import package
+import hashlib
+import io
+import json
+import streamlit as st
+from artifact_store import get_configured_store, session_id
+from result_cache import content_hash
+
+#######################################################
+# --- Memoized annotated images ---
+# Drawing means decode + draw + re-encode for st.image, which used to happen on
+# every rerun (any widget click). The encoded result is cached process-wide in
+# a bounded st.cache_data, and each session only keeps a reference to its
+# latest annotation (an ArtifactRef into the shared store, see artifact_store.py).
+
+MAX_ENTRIES = 64        # process-wide LRU bound on encoded annotations
+TTL = 60 * 60           # seconds
+JPEG_QUALITY = 90
+
+def detections_key(detections):
+    """Stable hash of the detection list (order and values)."""
+    encoded = json.dumps(detections, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+def annotation_id(image_hash, detections, kind):
+    """Names an annotated image by what it is drawn from, e.g. as show_image's image_hash: no need to hash its bytes."""
+    return f"{image_hash}|{detections_key(detections)}|{kind}"
+
+def encode_jpeg(image, quality=JPEG_QUALITY):
+    """PIL image -> JPEG bytes, ready for st.image without another encode."""
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+@st.cache_data(max_entries=MAX_ENTRIES, ttl=TTL, show_spinner=False)
+def _render_encoded(image_hash, det_key, kind, _image_bytes, _detections, _draw):
+    """
+    Keyed only by (image hash, detections hash, kind): the underscore arguments
+    are not hashed by Streamlit, so a cache hit never re-hashes the image.
+    """
+    image = _draw(_image_bytes, _detections)
+    return encode_jpeg(image) if image is not None else None
+
+def get_annotated_image(image_bytes, detections, kind, draw, image_hash=None):
+    """
+    Returns encoded annotated image bytes for st.image.
+    The session keeps only its latest annotation; everything else lives in the
+    bounded process-wide cache.
+    """
+    image_hash = image_hash or content_hash(image_bytes)
+    key = (image_hash, detections_key(detections), kind)
+
+    store = get_configured_store()
+    memo = st.session_state.get("annotated_image")
+    if isinstance(memo, dict) and memo.get("key") == key:
+        data = store.get(memo["ref"]) if memo["ref"] is not None else None
+        if data is not None or memo["ref"] is None:
+            return data
+
+    data = _render_encoded(*key, image_bytes, detections, draw)
+    st.session_state.annotated_image = {"key": key, "ref": store.put(data, session_id()) if data is not None else None}
+    return data
+
+def render_annotation(image_bytes, detections, kind, draw, image_hash=None):
+    """
+    Encoded annotated image from the process-wide cache only, without replacing
+    the session's latest annotation (one-off renditions such as the zoom).
+    """
+    image_hash = image_hash or content_hash(image_bytes)
+    return _render_encoded(image_hash, detections_key(detections), kind, image_bytes, detections, draw)
+
+def remember_annotation(image_bytes, detections, kind, data, image_hash=None):
+    """
+    Makes an annotation encoded elsewhere (a job worker) this session's latest one,
+    so get_annotated_image returns it without drawing again.
+    """
+    image_hash = image_hash or content_hash(image_bytes)
+    key = (image_hash, detections_key(detections), kind)
+    st.session_state.annotated_image = {"key": key, "ref": get_configured_store().put(data, session_id())}
@@ -0,0 +1,380 @@
+# Import package
+import atexit
+import hashlib
+import os
+import resource
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from result_cache import content_hash
+
+#######################################################
+# --- Shared artifact store ---
+# Uploaded images and encoded annotations used to live in st.session_state
+# (UploadedFile buffers, JPEG bytes) for as long as the tab stayed open, so
+# memory grew with every abandoned session. Now the bytes live once per process,
+# keyed by content hash, in an LRU bounded by size; what does not fit spills to
+# disk. Videos never enter memory: they are copied to a file owned by the
+# store. Session state only holds ArtifactRefs. Storing with a session id holds
+# the artifact for that session at once; each run then checks the session in
+# with the refs it holds: an artifact no session holds any more is dropped, and
+# sessions idle for longer than idle_timeout are evicted with everything only
+# they held.
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_SPILL_BYTES = 1024 * 1024 * 1024
+DEFAULT_IDLE_TIMEOUT = 30 * 60      # seconds
+EVICTED_MEMORY = 1000               # idle session ids remembered, to tell them why their state is gone
+HISTORY_ROWS = 50                   # payload & latency rows kept per session
+FILE_CHUNK = 1024 * 1024            # bytes copied at a time by put_file
+EXPIRED = "This image is no longer held (idle session or memory limit), please upload it again."
+
+class ArtifactRef(str):
+    """Content hash of a stored artifact; a str, so it pickles and compares like one."""
+    __slots__ = ()
+
+def collect_refs(value, depth=4):
+    """Every ArtifactRef in a (nested) session state value: dicts, lists, tuples and deques, `depth` levels down."""
+    if isinstance(value, ArtifactRef):
+        return {value}
+    refs = set()
+    if depth > 0:
+        if isinstance(value, dict):
+            value = value.values()
+        elif not isinstance(value, (list, tuple, deque)):
+            return refs
+        for item in value:
+            refs |= collect_refs(item, depth - 1)
+    return refs
+
+def state_size(value, depth=4):
+    """Rough size in bytes of what a session state value holds itself (bytes, strings, containers)."""
+    if isinstance(value, ArtifactRef):
+        return len(value)
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if hasattr(value, "getbuffer"):             # UploadedFile, BytesIO
+        return value.getbuffer().nbytes
+    if depth > 0:
+        if isinstance(value, dict):
+            return sum(state_size(k, 0) + state_size(v, depth - 1) for k, v in value.items())
+        if isinstance(value, (list, tuple, set, deque)):
+            return sum(state_size(item, depth - 1) for item in value)
+    return 0
+
+class ArtifactStore:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, spill_dir=None, max_spill_bytes=DEFAULT_MAX_SPILL_BYTES,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.max_bytes = max_bytes
+        self.max_spill_bytes = max_spill_bytes
+        self.idle_timeout = idle_timeout
+        self._memory = OrderedDict()        # ref -> bytes, least recently used first
+        self._memory_bytes = 0
+        self._disk = OrderedDict()          # ref -> size of the spilled file
+        self._disk_bytes = 0
+        self._files = {}                    # ref -> (path, size) of large uploads kept as files
+        self._files_bytes = 0
+        self._holders = {}                  # ref -> ids of the sessions holding it
+        self._sessions = {}                 # session id -> {"refs": set, "seen": time}
+        self._evicted = OrderedDict()       # idle session ids evicted, until they come back
+        self._lock = threading.Lock()
+        self._stats = {"stores": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0,
+                       "spills": 0, "drops": 0, "released": 0, "idle_evictions": 0, "files": 0}
+
+        # One directory per process: nothing is shared on disk with other servers
+        self.spill_dir = None
+        if spill_dir:
+            self.spill_dir = os.path.join(spill_dir, str(os.getpid()))
+            os.makedirs(self.spill_dir, exist_ok=True)
+            atexit.register(shutil.rmtree, self.spill_dir, ignore_errors=True)
+        # Files are kept even without spilling: a video is never held in memory
+        self.files_dir = tempfile.mkdtemp(prefix="files-", dir=self.spill_dir)
+        atexit.register(shutil.rmtree, self.files_dir, ignore_errors=True)
+
+    def _path(self, ref):
+        return os.path.join(self.spill_dir, ref)
+
+    def put(self, data, session_id=None):
+        """
+        Stores the bytes (once per content) and returns their ArtifactRef.
+        With session_id the session holds it from now on, not from its next check_in.
+        """
+        ref = ArtifactRef(content_hash(data))
+        with self._lock:
+            self._stats["stores"] += 1
+            if ref in self._memory:
+                self._memory.move_to_end(ref)
+            elif ref not in self._disk:
+                self._remember(ref, bytes(data))
+            if session_id is not None:
+                self._hold(session_id, ref)
+        return ref
+
+    def put_file(self, fileobj, suffix="", session_id=None):
+        """
+        Copies a file object (a video upload) to a file of the store in chunks,
+        hashing on the way, and returns its ArtifactRef; path() says where it is.
+        Files are released like any other artifact.
+        """
+        digest, size = hashlib.sha256(), 0
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.files_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                fileobj.seek(0)
+                for chunk in iter(lambda: fileobj.read(FILE_CHUNK), b""):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        ref = ArtifactRef(digest.hexdigest())
+        with self._lock:
+            self._stats["stores"] += 1
+            if ref in self._files:
+                os.remove(tmp)
+            else:
+                path = os.path.join(self.files_dir, ref + suffix)
+                os.replace(tmp, path)
+                self._files[ref] = (path, size)
+                self._files_bytes += size
+                self._stats["files"] += 1
+            if session_id is not None:
+                self._hold(session_id, ref)
+        return ref
+
+    def path(self, ref):
+        """Path of a file stored with put_file, or None once it was released."""
+        with self._lock:
+            entry = self._files.get(ref)
+        return entry[0] if entry is not None else None
+
+    def _hold(self, session_id, ref):
+        """
+        Caller holds the lock. Until the session's next check_in the artifact
+        would have no holder, and another session letting go of the same
+        content would drop it under the uploader.
+        """
+        session = self._sessions.setdefault(session_id, {"refs": set(), "seen": time.time()})
+        session["refs"].add(ref)
+        self._holders.setdefault(ref, set()).add(session_id)
+
+    def get(self, ref):
+        """The bytes, or None once they were released or evicted."""
+        with self._lock:
+            data = self._memory.get(ref)
+            if data is not None:
+                self._memory.move_to_end(ref)
+                self._stats["memory_hits"] += 1
+                return data
+            if ref in self._disk:
+                try:
+                    with open(self._path(ref), "rb") as f:
+                        data = f.read()
+                except OSError as e:
+                    print(f"Spilled artifact {ref[:12]} unreadable: {e}")
+                else:
+                    # Back to memory: it is in use again
+                    self._stats["disk_hits"] += 1
+                    self._forget_disk(ref)
+                    self._remember(ref, data)
+                    return data
+                self._forget_disk(ref)
+            self._stats["misses"] += 1
+            return None
+
+    def _remember(self, ref, data):
+        """Adds to the memory tier and spills least recently used entries over max_bytes. Caller holds the lock."""
+        if len(data) > self.max_bytes:
+            self._spill(ref, data)
+            return
+        self._memory[ref] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_bytes:
+            victim, victim_data = self._memory.popitem(last=False)
+            self._memory_bytes -= len(victim_data)
+            self._spill(victim, victim_data)
+
+    def _spill(self, ref, data):
+        """Writes to disk, or drops the artifact without a spill directory. Caller holds the lock."""
+        if self.spill_dir is None or len(data) > self.max_spill_bytes:
+            self._stats["drops"] += 1
+            return
+        tmp = self._path(ref) + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(ref))
+        except OSError as e:
+            print(f"Could not spill artifact {ref[:12]}: {e}")
+            self._stats["drops"] += 1
+            return
+        self._disk[ref] = len(data)
+        self._disk_bytes += len(data)
+        self._stats["spills"] += 1
+        while self._disk_bytes > self.max_spill_bytes:
+            self._forget_disk(next(iter(self._disk)))
+            self._stats["drops"] += 1
+
+    def _forget_disk(self, ref):
+        size = self._disk.pop(ref, None)
+        if size is None:
+            return
+        self._disk_bytes -= size
+        try:
+            os.remove(self._path(ref))
+        except OSError:
+            pass
+
+    def _discard(self, ref):
+        """Drops an artifact from both tiers. Caller holds the lock."""
+        data = self._memory.pop(ref, None)
+        if data is not None:
+            self._memory_bytes -= len(data)
+        self._forget_disk(ref)
+        entry = self._files.pop(ref, None)
+        if entry is not None:
+            self._files_bytes -= entry[1]
+            try:
+                os.remove(entry[0])
+            except OSError:
+                pass
+        self._stats["released"] += 1
+
+    def _release(self, session_id, refs):
+        """Caller holds the lock."""
+        for ref in refs:
+            holders = self._holders.get(ref)
+            if holders is None:
+                continue
+            holders.discard(session_id)
+            if not holders:
+                del self._holders[ref]
+                self._discard(ref)
+
+    def check_in(self, session_id, refs):
+        """
+        Records the refs this session's state holds now and releases the ones it
+        dropped. Evicts sessions idle for longer than idle_timeout first (this one
+        included, if it comes back after that long). Returns
+        True if this session itself was evicted since its last run: its artifacts
+        are gone, so the caller should reset its state (refs are not registered then).
+        """
+        now = time.time()
+        with self._lock:
+            for other, session in list(self._sessions.items()):
+                if now - session["seen"] > self.idle_timeout:
+                    self._release(other, session["refs"])
+                    del self._sessions[other]
+                    self._evicted[other] = now
+                    self._stats["idle_evictions"] += 1
+            while len(self._evicted) > EVICTED_MEMORY:
+                self._evicted.popitem(last=False)
+
+            if self._evicted.pop(session_id, None) is not None:
+                return True
+            session = self._sessions.setdefault(session_id, {"refs": set(), "seen": now})
+            refs = set(refs)
+            for ref in refs - session["refs"]:
+                self._holders.setdefault(ref, set()).add(session_id)
+            self._release(session_id, session["refs"] - refs)
+            session["refs"], session["seen"] = refs, now
+            return False
+
+    def session_usage(self, session_id):
+        """(artifacts held, bytes in memory, bytes on disk) for one session."""
+        with self._lock:
+            refs = self._sessions.get(session_id, {}).get("refs", ())
+            in_memory = sum(len(self._memory[r]) for r in refs if r in self._memory)
+            on_disk = sum(self._disk[r] for r in refs if r in self._disk)
+            on_disk += sum(self._files[r][1] for r in refs if r in self._files)
+        return len(refs), in_memory, on_disk
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update(
+                memory_entries=len(self._memory), memory_bytes=self._memory_bytes,
+                disk_entries=len(self._disk), disk_bytes=self._disk_bytes,
+                file_entries=len(self._files), file_bytes=self._files_bytes,
+                sessions=len(self._sessions), held=len(self._holders),
+            )
+        return snapshot
+
+@st.cache_resource(show_spinner=False)
+def get_artifact_store(max_bytes=DEFAULT_MAX_BYTES, spill_dir=None, max_spill_bytes=DEFAULT_MAX_SPILL_BYTES,
+                       idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Process-wide store, shared by both pages and every session."""
+    return ArtifactStore(max_bytes, spill_dir, max_spill_bytes, idle_timeout)
+
+def get_configured_store():
+    """
+    Builds the store from optional st.secrets settings: ARTIFACT_STORE_MB (memory),
+    ARTIFACT_SPILL_DIR ("" = no spilling) and ARTIFACT_SPILL_MB, SESSION_IDLE_MINUTES.
+    """
+    return get_artifact_store(
+        max_bytes=int(float(st.secrets.get("ARTIFACT_STORE_MB", DEFAULT_MAX_BYTES / 1024 ** 2)) * 1024 * 1024),
+        spill_dir=st.secrets.get("ARTIFACT_SPILL_DIR", os.path.join(tempfile.gettempdir(), "streamlit_artifacts")) or None,
+        max_spill_bytes=int(float(st.secrets.get("ARTIFACT_SPILL_MB", DEFAULT_MAX_SPILL_BYTES / 1024 ** 2)) * 1024 * 1024),
+        idle_timeout=float(st.secrets.get("SESSION_IDLE_MINUTES", DEFAULT_IDLE_TIMEOUT / 60)) * 60,
+    )
+
+#######################################################
+# --- Session side ---
+
+def session_id():
+    """This script run's session (one per browser tab)."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "bare"
+
+def hold_upload(store, uploaded_file, owner=None):
+    """
+    What the pages keep of an st.file_uploader file: {name, size, ref}. The buffer
+    itself is let go. Held by `owner` (this session by default) right away.
+    """
+    ref = store.put(uploaded_file.getvalue(), owner or session_id())
+    return {"name": uploaded_file.name, "size": uploaded_file.size, "ref": ref}
+
+def hold_video(store, uploaded_file, owner=None):
+    """Like hold_upload, but the video goes to a file of the store (store.path(ref)), never into memory."""
+    suffix = os.path.splitext(uploaded_file.name)[1] or ".mp4"
+    ref = store.put_file(uploaded_file, suffix, owner or session_id())
+    return {"name": uploaded_file.name, "size": uploaded_file.size, "ref": ref}
+
+def _state_values():
+    # .get: widget keys can be listed before their value is readable
+    return [st.session_state.get(key) for key in list(st.session_state.keys())]
+
+def check_in_session(store):
+    """Registers the refs in st.session_state for this session. True if it was evicted as idle (see check_in)."""
+    refs = set()
+    for value in _state_values():
+        refs |= collect_refs(value)
+    return store.check_in(session_id(), refs)
+
+def process_rss():
+    """Current resident set size in bytes (Linux /proc), else the peak from getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def render_memory_stats(store):
+    """Sidebar panel: what this session holds and what the process holds."""
+    mb = lambda n: f"{n / 1024 ** 2:.1f} MB"
+    held, in_memory, on_disk = store.session_usage(session_id())
+    own = sum(state_size(value) for value in _state_values())
+    stats = store.stats()
+    with st.sidebar.expander("Memory"):
+        st.caption(f"This session: {mb(own)} in state | {held} artifacts, {mb(in_memory)} in memory, {mb(on_disk)} on disk")
+        st.caption(
+            f"Process: {mb(process_rss())} RSS | Store {mb(stats['memory_bytes'])}/{mb(store.max_bytes)} in memory, "
+            f"{mb(stats['disk_bytes'])} spilled, {mb(stats['file_bytes'])} in files | "
+            f"{stats['sessions']} sessions, {stats['idle_evictions']} evicted idle"
+        )
+        st.json(stats, expanded=False)
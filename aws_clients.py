@@ -0,0 +1,134 @@
+# Import package
+import threading
+import streamlit as st
+from warmup import LazyModule
+
+# boto3 takes a few hundred ms to import: only pay for it when the first client is built
+boto3 = LazyModule("boto3")
+
+#######################################################
+# --- Client Pool Defaults ---
+# These can be overridden per call (or from st.secrets in the pages).
+MAX_POOL_CONNECTIONS = 25   # botocore default is 10, too low for many concurrent sessions
+TCP_KEEPALIVE = True        # keep idle pooled sockets alive between reruns
+MAX_ATTEMPTS = 4            # total attempts, including the first call
+RETRY_MODE = "adaptive"     # "legacy", "standard" or "adaptive" (client side rate limiting)
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 60
+
+# --- Counters ---
+# Module globals survive Streamlit reruns because the module is only imported once per process.
+_stats_lock = threading.Lock()
+_stats = {"requested": 0, "created": 0, "by_service": {}}
+
+#######################################################
+# --- Helper Functions ---
+
+def as_bool(value):
+    """Boolean setting from st.secrets: True/False, or a string such as "true", "1", "yes" (anything else is False)."""
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+@st.cache_resource(show_spinner=False)
+def _build_client(service, region, access_key_id, secret_access_key,
+                  max_pool_connections, tcp_keepalive, max_attempts, retry_mode,
+                  connect_timeout, read_timeout, endpoint_url=None):
+    """
+    Builds one boto3 client per unique (service, region, credentials, config) key.
+    st.cache_resource keeps it for the whole process, so every session and every
+    rerun shares the same credential resolution, endpoint data and connection pool.
+    """
+    from botocore.config import Config
+    config = Config(
+        region_name=region,
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=tcp_keepalive,
+        retries={"total_max_attempts": max_attempts, "mode": retry_mode},
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+    )
+    # A dedicated session per client: boto3's default session is not thread safe
+    session = boto3.session.Session(
+        aws_access_key_id=access_key_id,
+        aws_secret_access_key=secret_access_key,
+        region_name=region,
+    )
+    # endpoint_url points the client at a local stand-in (moto server, stub HTTP server)
+    client = session.client(service, config=config, endpoint_url=endpoint_url)
+
+    with _stats_lock:
+        _stats["created"] += 1
+        service_stats = _stats["by_service"].setdefault(service, {"requested": 0, "created": 0})
+        service_stats["created"] += 1
+    print(f"Created new boto3 client: {service} ({region})")
+    return client
+
+def get_client(service, region, access_key_id=None, secret_access_key=None,
+               max_pool_connections=MAX_POOL_CONNECTIONS, tcp_keepalive=TCP_KEEPALIVE,
+               max_attempts=MAX_ATTEMPTS, retry_mode=RETRY_MODE,
+               connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, endpoint_url=None):
+    """
+    Returns a process-wide shared boto3 client.
+    Leave the keys as None to use the default credential chain.
+    """
+    with _stats_lock:
+        _stats["requested"] += 1
+        service_stats = _stats["by_service"].setdefault(service, {"requested": 0, "created": 0})
+        service_stats["requested"] += 1
+
+    return _build_client(
+        service, region, access_key_id, secret_access_key,
+        int(max_pool_connections), as_bool(tcp_keepalive), int(max_attempts), retry_mode,
+        connect_timeout, read_timeout, endpoint_url,
+    )
+
+def configured_options():
+    """Pool and retry settings from st.secrets, with the defaults above."""
+    return dict(
+        max_pool_connections=st.secrets.get("AWS_MAX_POOL_CONNECTIONS", MAX_POOL_CONNECTIONS),
+        tcp_keepalive=st.secrets.get("AWS_TCP_KEEPALIVE", TCP_KEEPALIVE),
+        max_attempts=st.secrets.get("AWS_MAX_ATTEMPTS", MAX_ATTEMPTS),
+        retry_mode=st.secrets.get("AWS_RETRY_MODE", RETRY_MODE),
+        endpoint_url=st.secrets.get("AWS_ENDPOINT_URL", None),
+    )
+
+def get_configured_client(service, use_keys=True, **overrides):
+    """
+    Shared client configured from st.secrets (AWS_REGION, the keys, AWS_* pool settings).
+    use_keys=False leaves the keys to the default credential chain; overrides replace
+    configured_options() values (e.g. max_attempts=1).
+    """
+    keys = (st.secrets["AWS_ACCESS_KEY_ID"], st.secrets["AWS_SECRET_ACCESS_KEY"]) if use_keys else (None, None)
+    return get_client(service, st.secrets["AWS_REGION"], *keys, **dict(configured_options(), **overrides))
+
+def configured_settings(service, use_keys=True, **overrides):
+    """
+    Hashable key of everything get_configured_client builds that client from.
+    Cached objects holding a client (uploaders, engines) are keyed by it, so they
+    are rebuilt with the new client when a setting changes.
+    """
+    keys = (st.secrets["AWS_ACCESS_KEY_ID"], st.secrets["AWS_SECRET_ACCESS_KEY"]) if use_keys else (None, None)
+    return (service, st.secrets["AWS_REGION"], *keys, *sorted(dict(configured_options(), **overrides).items()))
+
+def get_configured_clients():
+    """
+    The Rekognition page's clients: s3, rekognition (default credential chain) and lambda.
+    The Lambda client is the engine's: one attempt, lambda_engine retries throttling itself.
+    """
+    return {
+        "s3": get_configured_client("s3"),
+        "rekognition": get_configured_client("rekognition", use_keys=False),
+        "lambda": get_configured_client("lambda", max_attempts=1),
+    }
+
+def client_stats():
+    """Returns a snapshot of the pool counters. 'reused' > 0 confirms clients are shared."""
+    with _stats_lock:
+        snapshot = {
+            "requested": _stats["requested"],
+            "created": _stats["created"],
+            "reused": _stats["requested"] - _stats["created"],
+            "by_service": {k: dict(v) for k, v in _stats["by_service"].items()},
+        }
+    return snapshot
@@ -0,0 +1,89 @@
+# Import package
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+#######################################################
+# --- Bounded multi-stage pipeline ---
+# Every stage has its own thread pool, so while image N is in stage 2 (e.g. Lambda)
+# image N+1 can already be in stage 1 (e.g. S3 upload).
+# Stage functions run in worker threads: they must NOT call st.* (no script context there).
+
+class Stage:
+    """One pipeline step: fn(value) -> value, run on `workers` threads."""
+    def __init__(self, name, fn, workers=2):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers))
+
+class BatchItem:
+    """Tracks one input through the pipeline."""
+    def __init__(self, index, name, value):
+        self.index = index
+        self.name = name
+        self.value = value        # output of the last finished stage
+        self.error = None         # (stage name, exception) when a stage failed
+        self.timings = {}         # stage name -> seconds
+        self.stage_index = 0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+def _run_stage(stage, item):
+    start = time.perf_counter()
+    try:
+        return stage.fn(item.value), None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
+
+def run_pipeline(inputs, stages, max_in_flight=None):
+    """
+    Streams (name, value) pairs through the stages and yields each BatchItem
+    as soon as it finished the last stage (or failed), in completion order.
+
+    max_in_flight caps how many items are admitted at once, so a batch of
+    hundreds of frames never queues everything at the same time.
+    """
+    if max_in_flight is None:
+        max_in_flight = sum(s.workers for s in stages) * 2
+
+    pools = [ThreadPoolExecutor(max_workers=s.workers, thread_name_prefix=f"batch-{s.name}") for s in stages]
+    pending = {}  # future -> item
+    source = iter(enumerate(inputs))
+
+    def admit():
+        while len(pending) < max_in_flight:
+            try:
+                index, (name, value) = next(source)
+            except StopIteration:
+                return
+            item = BatchItem(index, name, value)
+            pending[pools[0].submit(_run_stage, stages[0], item)] = item
+
+    try:
+        admit()
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                stage = stages[item.stage_index]
+                value, error, elapsed = future.result()
+                item.timings[stage.name] = elapsed
+
+                if error is not None:
+                    item.error = (stage.name, error)
+                    yield item
+                    continue
+
+                item.value = value
+                item.stage_index += 1
+                if item.stage_index < len(stages):
+                    next_stage = stages[item.stage_index]
+                    pending[pools[item.stage_index].submit(_run_stage, next_stage, item)] = item
+                else:
+                    yield item
+            admit()
+    finally:
+        # If the caller stops iterating (e.g. Streamlit rerun) drop the queued work
+        for pool in pools:
+            pool.shutdown(wait=False, cancel_futures=True)
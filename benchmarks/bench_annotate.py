@@ -0,0 +1,96 @@
+"""
+Microbenchmark for the shared annotation renderer (annotate.py).
+
+Renders 1, 50 and 500 synthetic detections on a 12 MP (4000x3000) image in
+both the Rekognition and the Roboflow format.
+
+Usage:
+    python benchmarks/bench_annotate.py [--repeat 5] [--counts 1 50 500]
+"""
+# Import package
+import argparse
+import io
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import annotate  # noqa: E402
+
+IMAGE_SIZE = (4000, 3000)  # 12 MP
+
+def make_image_bytes(size=IMAGE_SIZE):
+    image = Image.new("RGB", size, (90, 110, 130))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def rekognition_detections(count, rng):
+    labels = ["Safe Driving", "Turning", "Texting Phone", "Talking Phone", "Other"]
+    detections = []
+    for _ in range(count):
+        w, h = rng.uniform(0.02, 0.3), rng.uniform(0.02, 0.3)
+        detections.append({
+            "Name": rng.choice(labels),
+            "Confidence": rng.uniform(50, 100),
+            "Geometry": {"BoundingBox": {"Left": rng.uniform(0, 1 - w), "Top": rng.uniform(0, 1 - h), "Width": w, "Height": h}},
+        })
+    return detections
+
+def roboflow_detections(count, rng, size=IMAGE_SIZE):
+    detections = []
+    for _ in range(count):
+        w, h = rng.uniform(50, 1200), rng.uniform(50, 900)
+        detections.append({
+            "x": rng.uniform(w / 2, size[0] - w / 2), "y": rng.uniform(h / 2, size[1] - h / 2),
+            "width": w, "height": h,
+            "class": rng.choice(["mild", "moderate", "severe"]), "confidence": rng.uniform(0.5, 1),
+        })
+    return detections
+
+def time_call(fn, repeat):
+    """Median and best wall time in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), min(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    image_bytes = make_image_bytes()
+    decoded = annotate.open_rgb(image_bytes)
+
+    print(f"Image: {IMAGE_SIZE[0]}x{IMAGE_SIZE[1]} JPEG, {len(image_bytes) / 1024:.0f} KB, repeat={args.repeat}")
+    print(f"{'format':<12}{'detections':>12}{'render ms':>12}{'best ms':>10}{'end-to-end ms':>16}")
+
+    for name, make, normalize, style, end_to_end in [
+        ("rekognition", rekognition_detections,
+         lambda d: annotate.normalize_rekognition(d, *IMAGE_SIZE), annotate.REKOGNITION_STYLE,
+         annotate.draw_rekognition_boxes),
+        ("roboflow", roboflow_detections,
+         annotate.normalize_roboflow, annotate.ROBOFLOW_STYLE,
+         annotate.draw_roboflow_boxes),
+    ]:
+        for count in args.counts:
+            detections = make(count, rng)
+            # render only: normalization + placement + drawing on an already decoded frame
+            render_med, render_best = time_call(
+                lambda: annotate.render(decoded.copy(), *normalize(detections), style), args.repeat
+            )
+            # what the page pays: decode + render
+            e2e_med, _ = time_call(lambda: end_to_end(image_bytes, detections), args.repeat)
+            print(f"{name:<12}{count:>12}{render_med:>12.1f}{render_best:>10.1f}{e2e_med:>16.1f}")
+
+if __name__ == "__main__":
+    main()
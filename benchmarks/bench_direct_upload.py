@@ -0,0 +1,172 @@
+"""
+Server path vs. pre-signed browser uploads (s3_direct_upload.py), on moto.
+
+For each image, both ways the AWS page can get it analyzed through Lambda:
+  server   browser -> Streamlit (the whole file) -> preprocess -> S3 -> Lambda
+  direct   server signs a POST policy -> "browser" downscales and POSTs to S3
+           (requests stands in for the component) -> server HEADs the key -> Lambda
+Reports the payload bytes that pass through the Streamlit server and latency:
+time spent on the server, and end to end including the browser's work. Every AWS call and the browser POST get
+--latency-ms of injected latency.
+
+Then checks what the server relies on, because moto does not enforce POST
+policy conditions: verify() rejects and deletes non-images, refuses keys
+outside the upload prefix and missing objects, and the ETag that keys the
+result cache is the same for the same bytes. Exits with status 1 when a check fails.
+
+Usage:
+    python benchmarks/bench_direct_upload.py [--images 10] [--size 4000x3000] [--max-side 1280] [--latency-ms 30]
+
+Needs moto (pip install "moto[s3,lambda]") and requests.
+"""
+# Import package
+import argparse
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import image_preprocess  # noqa: E402
+from bench_annotate import rekognition_detections  # noqa: E402
+from bench_pipeline import BUCKET, FUNCTION_NAME, AwsStandIn, make_photo, parse_size, unique_variants  # noqa: E402
+from lambda_engine import LambdaEngine  # noqa: E402
+from s3_direct_upload import DirectUploads, object_cache_key  # noqa: E402
+from s3_upload import S3Uploader  # noqa: E402
+
+MODEL_ID = "bench-model"
+
+#######################################################
+# --- The two paths ---
+
+def browser_post(presigned, data, content_type, latency):
+    """What the component does: policy fields, Content-Type, then the file."""
+    time.sleep(latency)
+    fields = dict(presigned["fields"], **{"Content-Type": content_type})
+    response = requests.post(presigned["url"], data=fields, files={"file": ("image", data, content_type)}, timeout=30)
+    # moto answers success_action_status with the status as a string
+    if not 200 <= int(response.status_code) < 300:
+        raise RuntimeError(f"S3 answered {response.status_code}: {response.text[:300]}")
+
+def via_server(image_bytes, args, uploader, engine, timings):
+    start = time.perf_counter()
+    prepared = image_preprocess.prepare_image(image_bytes, args.max_side)
+    key = uploader.upload(prepared.data, image_preprocess.sent_file_name("photo.jpg", prepared))[0].split("/", 3)[3]
+    engine.invoke(BUCKET, key)
+    timings["server_ms"] = timings["total_ms"] = (time.perf_counter() - start) * 1000
+    # The browser sends the original over the websocket, the server sends the prepared image to S3
+    return len(image_bytes) + len(prepared.data)
+
+def via_browser(image_bytes, args, uploads, engine, latency, timings):
+    start = time.perf_counter()
+    presigned = uploads.presign()
+    server_ms = (time.perf_counter() - start) * 1000
+
+    # Browser side: downscale and upload; none of it runs on the server
+    prepared = image_preprocess.prepare_image(image_bytes, args.max_side)
+    browser_post(presigned, prepared.data, "image/jpeg", latency)
+
+    start_key = time.perf_counter()
+    obj = uploads.verify(presigned["key"])
+    engine.invoke(BUCKET, obj["key"])
+    timings["server_ms"] = server_ms + (time.perf_counter() - start_key) * 1000
+    timings["total_ms"] = (time.perf_counter() - start) * 1000
+    # Only the policy goes out and the key comes back
+    return len(json.dumps(presigned)) + len(presigned["key"])
+
+def measure(name, run, images):
+    rows = []
+    for image_bytes in images:
+        timings = {}
+        server_bytes = run(image_bytes, timings)
+        rows.append({"server_bytes": server_bytes, **timings})
+    column = lambda key: np.array([r[key] for r in rows])
+    return {
+        "path": name,
+        "n": len(rows),
+        "server_kb": round(float(column("server_bytes").mean()) / 1024, 1),
+        "server_p50_ms": round(float(np.percentile(column("server_ms"), 50)), 1),
+        "total_p50_ms": round(float(np.percentile(column("total_ms"), 50)), 1),
+        "total_p95_ms": round(float(np.percentile(column("total_ms"), 95)), 1),
+    }
+
+#######################################################
+# --- Checks ---
+
+def expect_rejected(fn, *args):
+    try:
+        fn(*args)
+    except ValueError as e:
+        return str(e)
+    return None
+
+def run_checks(aws, uploads, image_bytes):
+    checks = []
+
+    presigned = uploads.presign()
+    browser_post(presigned, b"not an image", "text/plain", 0)
+    reason = expect_rejected(uploads.verify, presigned["key"])
+    objects = aws.s3.list_objects_v2(Bucket=BUCKET, Prefix=presigned["key"]).get("KeyCount", 0)
+    checks.append(("non-image rejected and deleted", reason is not None and objects == 0, reason))
+
+    reason = expect_rejected(uploads.verify, "img_input_test/someone-elses.jpg")
+    checks.append(("key outside the prefix refused", reason is not None, reason))
+
+    reason = expect_rejected(uploads.verify, uploads.presign()["key"])
+    checks.append(("missing upload reported", reason is not None, reason))
+
+    keys = []
+    for _ in range(2):
+        presigned = uploads.presign()
+        browser_post(presigned, image_bytes, "image/jpeg", 0)
+        keys.append(object_cache_key(MODEL_ID, uploads.verify(presigned["key"])["etag"]))
+    expected = object_cache_key(MODEL_ID, hashlib.md5(image_bytes).hexdigest())
+    checks.append(("same bytes, same cache key", keys[0] == keys[1] == expected, keys[0]))
+    return checks
+
+#######################################################
+# --- Main ---
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--size", type=parse_size, default=(4000, 3000))
+    parser.add_argument("--max-side", type=int, default=image_preprocess.DEFAULT_MAX_SIDE)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    aws = AwsStandIn(args.latency_ms)
+    try:
+        images = unique_variants(make_photo(args.size, args.seed), args.images)
+        aws.queue_lambda_results(rekognition_detections(3, np.random.default_rng(args.seed)), 2 * len(images))
+        engine = LambdaEngine(aws.lambda_client, FUNCTION_NAME)
+        uploader = S3Uploader(aws.s3, BUCKET)
+        uploads = DirectUploads(aws.s3, BUCKET)
+        latency = args.latency_ms / 1000
+
+        print(f"{args.images} images of {args.size[0]}x{args.size[1]} ({len(images[0]) / 1024:.0f} KB), max side {args.max_side}")
+        rows = [
+            measure("server", lambda data, t: via_server(data, args, uploader, engine, t), images),
+            measure("direct", lambda data, t: via_browser(data, args, uploads, engine, latency, t), images),
+        ]
+        columns = list(rows[0])
+        print(" | ".join(f"{c:>13}" for c in columns))
+        for row in rows:
+            print(" | ".join(f"{row[c]!s:>13}" for c in columns))
+
+        failed = 0
+        for name, ok, detail in run_checks(aws, uploads, images[0]):
+            failed += not ok
+            print(f"{'PASS' if ok else 'FAIL'}  {name}: {detail}")
+        print(f"Direct upload stats: {uploads.stats()}")
+    finally:
+        aws.stop()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
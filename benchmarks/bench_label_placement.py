@@ -0,0 +1,103 @@
+"""
+Label placement benchmark: grid index (annotate.place_labels) vs the old
+pairwise scan over every occupied region.
+
+Only placement is timed (no drawing), on a 12 MP canvas with label sizes
+taken from the real font metrics. --label-scales shrinks the labels: at 1.0
+the canvas is saturated (hardly any label fits, so the pairwise scan exits on
+its first comparison), at 0.25 most labels fit and the pairwise scan has to
+compare against every placed label.
+
+Usage:
+    python benchmarks/bench_label_placement.py [--counts 200 1000 3000] [--label-scales 1 0.25] [--repeat 3]
+"""
+# Import package
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import annotate  # noqa: E402
+
+IMAGE_SIZE = (4000, 3000)  # 12 MP
+
+def place_labels_pairwise(candidates, label_sizes):
+    """The previous approach: check each candidate against every placed label, O(n^2)."""
+    def overlaps(rect1, rect2):
+        return not (rect1[2] < rect2[0] or rect1[0] > rect2[2] or
+                    rect1[3] < rect2[1] or rect1[1] > rect2[3])
+
+    occupied_regions = []
+    placed = np.empty((len(candidates), 2))
+    for i, (options, (bw, bh)) in enumerate(zip(candidates.tolist(), label_sizes.tolist())):
+        final_pos = options[0]
+        for px, py in options:
+            current_rect = (px, py, px + bw, py + bh)
+            if not any(overlaps(current_rect, r) for r in occupied_regions):
+                final_pos = (px, py)
+                break
+        placed[i] = final_pos
+        occupied_regions.append((final_pos[0], final_pos[1], final_pos[0] + bw, final_pos[1] + bh))
+    return placed
+
+def make_inputs(count, rng, label_scale=1.0):
+    """Synthetic crowded scene: boxes, label sizes and candidates like render() builds them."""
+    detections = []
+    for _ in range(count):
+        w, h = rng.uniform(0.01, 0.1), rng.uniform(0.01, 0.1)
+        detections.append({
+            "Name": rng.choice(["Safe Driving", "Turning", "Texting Phone", "Other"]),
+            "Confidence": rng.uniform(50, 100),
+            "BoundingBox": {"Left": rng.uniform(0, 1 - w), "Top": rng.uniform(0, 1 - h), "Width": w, "Height": h},
+        })
+    boxes, texts, _ = annotate.normalize_rekognition(detections, *IMAGE_SIZE)
+    _, font_size, padding = annotate.REKOGNITION_STYLE.sizes(*IMAGE_SIZE)
+    label_sizes = (np.array([annotate.text_size(t, font_size) for t in texts], dtype=np.float64) + padding * 2) * label_scale
+    candidates = annotate.label_candidates(boxes, label_sizes, *IMAGE_SIZE)
+    return candidates, label_sizes
+
+def overlap_count(positions, label_sizes):
+    """How many label pairs still overlap (quality check, not timed)."""
+    rects = np.hstack([positions, positions + label_sizes])
+    count = 0
+    for i in range(len(rects)):
+        r = rects[i]
+        others = rects[i + 1:]
+        hit = ~((r[2] < others[:, 0]) | (r[0] > others[:, 2]) | (r[3] < others[:, 1]) | (r[1] > others[:, 3]))
+        count += int(hit.sum())
+    return count
+
+def time_call(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[200, 1000, 3000])
+    parser.add_argument("--label-scales", type=float, nargs="+", default=[1.0, 0.25])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'scale':>6}{'labels':>8}{'pairwise ms':>14}{'grid ms':>10}{'speedup':>10}{'overlaps (pairwise/grid)':>27}")
+    for label_scale in args.label_scales:
+        for count in args.counts:
+            candidates, label_sizes = make_inputs(count, rng, label_scale)
+            # The pairwise candidate set is the original five positions
+            pairwise_ms, pairwise_pos = time_call(lambda: place_labels_pairwise(candidates[:, :5], label_sizes), args.repeat)
+            grid_ms, grid_pos = time_call(lambda: annotate.place_labels(candidates, label_sizes, *IMAGE_SIZE), args.repeat)
+            overlaps = f"{overlap_count(pairwise_pos, label_sizes)}/{overlap_count(grid_pos, label_sizes)}"
+            print(f"{label_scale:>6}{count:>8}{pairwise_ms:>14.1f}{grid_ms:>10.1f}{pairwise_ms / grid_ms:>9.1f}x{overlaps:>27}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Offline benchmark for the analysis pipeline, with local stand-ins for every backend.
+
+Drives the modules the pages call (image_preprocess, s3_upload, lambda_engine,
+rekognition_backends, roboflow_client, annotate) without a browser or cloud account:
+  - S3, Lambda and Rekognition are moto, in process. Lambda runs moto's
+    docker-free backend and answers with a queued Rekognition-style payload.
+  - Roboflow is benchmarks/stub_roboflow_server.py on localhost.
+Every AWS call gets --aws-latency-ms of injected latency and every Roboflow
+call --roboflow-latency-ms, so network-bound scenarios look like production.
+
+Prints throughput and latency percentiles per (scenario, image size, detections).
+--save writes them to JSON; --compare diffs a run against a saved one and exits
+with status 1 when a scenario got slower than --threshold (for CI).
+
+Usage:
+    python benchmarks/bench_pipeline.py [--images 20] [--sizes 1280x960 4000x3000]
+        [--detections 1 50] [--concurrency 4] [--aws-latency-ms 40] [--roboflow-latency-ms 60]
+        [--scenarios preprocess lambda roboflow ...] [--save run.json] [--compare baseline.json]
+
+Needs moto (pip install "moto[s3,lambda]") for the AWS scenarios.
+"""
+# Import package
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import annotate  # noqa: E402
+import aws_clients  # noqa: E402
+import image_preprocess  # noqa: E402
+import stub_roboflow_server  # noqa: E402
+from annotation_cache import encode_jpeg  # noqa: E402
+from bench_annotate import rekognition_detections  # noqa: E402
+from lambda_engine import LambdaEngine  # noqa: E402
+from rekognition_backends import detect_from_bytes, detect_from_s3  # noqa: E402
+from roboflow_client import RoboflowClient, build_configuration  # noqa: E402
+from s3_upload import S3Uploader  # noqa: E402
+
+REGION = "us-east-1"
+BUCKET = "bench-bucket"
+FUNCTION_NAME = "bench-rekognition"
+MODEL_ARN = "arn:aws:rekognition:us-east-1:123456789012:project/bench/version/bench.1/1"
+ROBOFLOW_MODEL = "bench/1"
+STUB_PORT = 9070
+
+AWS_SCENARIOS = ("s3-upload", "lambda", "direct-s3", "direct-bytes")
+SCENARIOS = ("preprocess",) + AWS_SCENARIOS + ("roboflow", "roboflow-batch", "annotate-rekognition", "annotate-roboflow")
+# Scenarios whose cost does not depend on the number of detections run once per size
+DETECTION_INDEPENDENT = ("preprocess", "s3-upload", "direct-s3", "direct-bytes")
+
+#######################################################
+# --- Inputs ---
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+def make_photo(size, seed):
+    """Noisy gradient JPEG: compresses like a photo, unlike a flat color."""
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 200, size[0], dtype=np.float32)[np.newaxis, :, np.newaxis]
+    noise = rng.normal(0, 25, (size[1], size[0], 3)).astype(np.float32)
+    pixels = np.clip(gradient + noise + 30, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def unique_variants(image_bytes, count):
+    """Same JPEG with a different trailer: new content hash, identical decode."""
+    return [image_bytes + f"bench-{i}".encode() for i in range(count)]
+
+#######################################################
+# --- Stand-ins ---
+
+class AwsStandIn:
+    """moto-backed S3, Lambda and Rekognition clients with injected latency."""
+    def __init__(self, latency_ms):
+        try:
+            from moto import mock_aws
+        except ImportError as e:
+            raise SystemExit('The AWS scenarios need moto: pip install "moto[s3,lambda]"') from e
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+        self.mock = mock_aws(config={"lambda": {"use_docker": False}})
+        self.mock.start()
+        self.latency = latency_ms / 1000
+
+        # Same client factory and pool settings as the pages
+        self.s3 = self._client("s3")
+        self.lambda_client = self._client("lambda")
+        self.rekognition = self._client("rekognition")
+        self.s3.create_bucket(Bucket=BUCKET)
+        self._create_function()
+
+    def _client(self, service):
+        client = aws_clients.get_client(service, REGION, "testing", "testing")
+        if self.latency:
+            # before-call fires ahead of moto's response, and returning None lets the call go on
+            client.meta.events.register("before-call.*.*", lambda **kwargs: time.sleep(self.latency))
+        return client
+
+    def _create_function(self):
+        iam = aws_clients.get_client("iam", REGION, "testing", "testing")
+        role = iam.create_role(RoleName="bench-role", AssumeRolePolicyDocument="{}")["Role"]["Arn"]
+        package = io.BytesIO()
+        with zipfile.ZipFile(package, "w") as z:
+            z.writestr("lambda_function.py", "def lambda_handler(event, context):\n    return {}\n")
+        self.lambda_client.create_function(
+            FunctionName=FUNCTION_NAME, Runtime="python3.12", Role=role,
+            Handler="lambda_function.lambda_handler", Code={"ZipFile": package.getvalue()},
+        )
+
+    def queue_lambda_results(self, labels, count):
+        """The docker-free Lambda answers invocations from this queue, in order."""
+        from moto.awslambda_simple.models import lambda_simple_backends
+        payload = json.dumps({"statusCode": 200, "body": json.dumps(labels)})
+        backend = lambda_simple_backends["123456789012"][REGION]
+        backend.lambda_simple_results_queue.clear()
+        backend.lambda_simple_results_queue.extend([payload] * count)
+
+    def stop(self):
+        self.mock.stop()
+
+#######################################################
+# --- Measurement ---
+
+def run_ops(fn, inputs, concurrency):
+    """Runs fn over inputs on `concurrency` threads. Returns (per-op ms, wall seconds, errors)."""
+    def timed(value):
+        start = time.perf_counter()
+        try:
+            fn(value)
+            return (time.perf_counter() - start) * 1000, None
+        except Exception as e:
+            return (time.perf_counter() - start) * 1000, e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(timed, inputs))
+    wall = time.perf_counter() - start
+    errors = [e for _, e in outcomes if e is not None]
+    if errors:
+        print(f"  {len(errors)} errors, first: {errors[0]!r}")
+    return [ms for ms, _ in outcomes], wall, len(errors)
+
+def summarize(scenario, size, detections, latencies, wall, errors):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "scenario": scenario,
+        "size": f"{size[0]}x{size[1]}",
+        "detections": detections,
+        "n": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / wall, 2),
+        "p50_ms": round(float(p50), 1),
+        "p95_ms": round(float(p95), 1),
+        "p99_ms": round(float(p99), 1),
+    }
+
+def row_key(row):
+    return f"{row['scenario']}|{row['size']}|{row['detections']}"
+
+#######################################################
+# --- Scenarios ---
+
+def run_scenario(name, size, detections, images, args, aws, roboflow):
+    """Builds the inputs the page would have at this point, then times the stage."""
+    rng = random.Random(args.seed)
+    prepared = [image_preprocess.prepare_image(data, args.max_side) for data in images]
+    # Downscaling makes the variants identical again; keep every payload unique so S3 dedup doesn't kick in
+    sent = [p.data + f"sent-{i}".encode() for i, p in enumerate(prepared)]
+
+    if name == "preprocess":
+        return run_ops(lambda data: image_preprocess.prepare_image(data, args.max_side), images, args.concurrency)
+
+    if name in AWS_SCENARIOS:
+        uploader = S3Uploader(aws.s3, BUCKET)   # fresh index: every image is a real upload
+        names = [f"bench-{size[0]}-{i}.jpg" for i in range(len(sent))]
+        if name == "s3-upload":
+            return run_ops(lambda i: uploader.upload(sent[i], names[i]), range(len(sent)), args.concurrency)
+        if name == "direct-bytes":
+            return run_ops(lambda data: detect_from_bytes(aws.rekognition, MODEL_ARN, data), sent, args.concurrency)
+        if name == "direct-s3":
+            def direct_s3(i):
+                key = uploader.upload(sent[i], names[i])[0].split("/", 3)[3]
+                return detect_from_s3(aws.rekognition, MODEL_ARN, BUCKET, key)
+            return run_ops(direct_s3, range(len(sent)), args.concurrency)
+        if name == "lambda":
+            aws.queue_lambda_results(rekognition_detections(detections, rng), len(sent))
+            engine = LambdaEngine(aws.lambda_client, FUNCTION_NAME, max_in_flight=args.concurrency)
+            def via_lambda(i):
+                key = uploader.upload(sent[i], names[i])[0].split("/", 3)[3]
+                labels = engine.invoke(BUCKET, key)
+                assert len(labels) == detections
+            return run_ops(via_lambda, range(len(sent)), args.concurrency)
+
+    if name in ("roboflow", "roboflow-batch"):
+        stub_roboflow_server.StubHandler.detections = detections
+        if name == "roboflow":
+            def infer(i):
+                results = roboflow.infer(sent[i], ROBOFLOW_MODEL)
+                return image_preprocess.scale_pixel_predictions(results, prepared[i])
+            return run_ops(infer, range(len(sent)), args.concurrency)
+        # Batch: latency is time-to-result from the start of the batch
+        start = time.perf_counter()
+        latencies, errors = [], 0
+        for _, _, error in roboflow.infer_batch(sent, ROBOFLOW_MODEL):
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += error is not None
+        return latencies, time.perf_counter() - start, errors
+
+    if name == "annotate-rekognition":
+        labels = rekognition_detections(detections, rng)
+        # What the pages do after inference: draw on the decode that was already made, encode for st.image
+        return run_ops(lambda p: encode_jpeg(annotate.draw_rekognition_boxes(p.image, labels)), prepared, args.concurrency)
+    if name == "annotate-roboflow":
+        w, h = prepared[0].size
+        predictions = stub_roboflow_server.fake_predictions(w, h, 0.0, detections, detections)
+        return run_ops(lambda p: encode_jpeg(annotate.draw_roboflow_boxes(p.image, predictions)), prepared, args.concurrency)
+    raise ValueError(f"Unknown scenario: {name}")
+
+#######################################################
+# --- Output ---
+
+COLUMNS = ["scenario", "size", "detections", "n", "errors", "throughput", "p50_ms", "p95_ms", "p99_ms"]
+
+def print_table(rows, baseline=None, threshold=0.15):
+    """Prints the rows; with a baseline, adds p50/throughput deltas and returns the regressions."""
+    header = f"{'scenario':<22}{'size':>11}{'dets':>6}{'n':>5}{'err':>5}{'img/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}"
+    if baseline is not None:
+        header += f"{'Δp50':>9}{'Δimg/s':>9}"
+    print(header)
+    regressions = []
+    for row in rows:
+        line = (f"{row['scenario']:<22}{row['size']:>11}{row['detections']:>6}{row['n']:>5}{row['errors']:>5}"
+                f"{row['throughput']:>9.2f}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}")
+        old = (baseline or {}).get(row_key(row))
+        if old:
+            d_p50 = row["p50_ms"] / old["p50_ms"] - 1 if old["p50_ms"] else 0.0
+            d_tp = row["throughput"] / old["throughput"] - 1 if old["throughput"] else 0.0
+            line += f"{d_p50:>+9.0%}{d_tp:>+9.0%}"
+            if d_p50 > threshold or d_tp < -threshold:
+                regressions.append(row_key(row))
+                line += "  <-- slower"
+        elif baseline is not None:
+            line += f"{'new':>9}"
+        print(line)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=20, help="images per scenario")
+    parser.add_argument("--sizes", nargs="+", default=["1280x960", "4000x3000"])
+    parser.add_argument("--detections", type=int, nargs="+", default=[1, 50])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--aws-latency-ms", type=float, default=40)
+    parser.add_argument("--roboflow-latency-ms", type=float, default=60)
+    parser.add_argument("--max-side", type=int, default=image_preprocess.DEFAULT_MAX_SIDE, help="0 sends originals")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --save")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    # bare-mode Streamlit caches warn on every call
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    aws = AwsStandIn(args.aws_latency_ms) if set(args.scenarios) & set(AWS_SCENARIOS) else None
+    roboflow = stub = None
+    if set(args.scenarios) & {"roboflow", "roboflow-batch"}:
+        stub = stub_roboflow_server.serve(STUB_PORT, args.roboflow_latency_ms)
+        # Confidence 0: the stub's detection count reaches the client unfiltered
+        roboflow = RoboflowClient(f"http://127.0.0.1:{STUB_PORT}", "bench", build_configuration(0.0),
+                                  max_concurrent=args.concurrency)
+
+    print(f"Python {platform.python_version()} | {os.cpu_count()} CPUs | images={args.images} "
+          f"concurrency={args.concurrency} aws_latency={args.aws_latency_ms}ms roboflow_latency={args.roboflow_latency_ms}ms")
+
+    rows = []
+    try:
+        for size_text in args.sizes:
+            size = parse_size(size_text)
+            images = unique_variants(make_photo(size, args.seed), args.images)
+            for scenario in args.scenarios:
+                counts = [0] if scenario in DETECTION_INDEPENDENT else args.detections
+                for detections in counts:
+                    latencies, wall, errors = run_scenario(scenario, size, detections, images, args, aws, roboflow)
+                    rows.append(summarize(scenario, size, detections, latencies, wall, errors))
+    finally:
+        if aws is not None:
+            aws.stop()
+        if stub is not None:
+            stub.shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {row_key(r): r for r in json.load(f)["rows"]}
+    print()
+    regressions = print_table(rows, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "rows": rows}, f, indent=2)
+        print(f"\nSaved {len(rows)} rows to {args.save}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
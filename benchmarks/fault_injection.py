@@ -0,0 +1,269 @@
+"""
+Fault-injection checks for the retry / circuit-breaker / deadline layer (resilience.py).
+
+Runs the real clients against local stand-ins that fail on purpose:
+  - Roboflow: benchmarks/stub_roboflow_server.py with injected 503s, 429s
+    (with Retry-After) or a full outage.
+  - Rekognition: a boto3 client whose DetectCustomLabels is answered by a
+    botocore before-call hook, with ResourceNotReadyException while the
+    "model" is stopped (no AWS account or network needed).
+
+Every scenario checks what the layer promises and prints one row:
+  flaky-no-retry   503 on --fault-rate of calls, one attempt (the baseline)
+  flaky-retry      same faults, retries with backoff: almost every call succeeds
+  throttled        429 + Retry-After on --throttle-rate of calls: retried, none lost
+  retry-budget     every call throttled: the retry quota caps the extra load
+  outage           backend down: the circuit opens after a few calls and the rest
+                   fail fast; once it is back, a probe closes the circuit again
+  model-stopped    ResourceNotReady opens the circuit on the first call; the model
+                   status releases it when the model is RUNNING again
+  deadline         slow, flaky backend: no call outlives its --deadline-ms
+
+Exits with status 1 when a check fails (for CI).
+
+Usage:
+    python benchmarks/fault_injection.py [--calls 60] [--fault-rate 0.3] [--throttle-rate 0.5]
+        [--concurrency 4] [--deadline-ms 500] [--scenarios outage deadline ...]
+"""
+# Import package
+import argparse
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import MagicMock
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import boto3  # noqa: E402
+import resilience  # noqa: E402
+import stub_roboflow_server  # noqa: E402
+from rekognition_backends import detect_from_bytes  # noqa: E402
+from resilience import CircuitOpenError, DeadlineExceeded, Policy, RetryQuota  # noqa: E402
+from roboflow_client import RoboflowClient, build_configuration  # noqa: E402
+
+STUB_PORT = 9072
+ROBOFLOW_MODEL = "faults/1"
+MODEL_ARN = "arn:aws:rekognition:us-east-1:123456789012:project/faults/version/faults.1/1"
+SCENARIOS = ("flaky-no-retry", "flaky-retry", "throttled", "retry-budget", "outage", "model-stopped", "deadline")
+
+def small_jpeg():
+    buffer = io.BytesIO()
+    Image.new("RGB", (320, 240), (90, 120, 150)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+def run_calls(fn, count, concurrency):
+    """Runs fn() count times; returns (latencies ms, {outcome: count})."""
+    def timed(_):
+        start = time.perf_counter()
+        try:
+            fn()
+            outcome = "ok"
+        except CircuitOpenError:
+            outcome = "rejected"
+        except DeadlineExceeded:
+            outcome = "deadline"
+        except Exception:
+            outcome = "failed"
+        return (time.perf_counter() - start) * 1000, outcome
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(count)))
+    outcomes = {}
+    for _, outcome in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    return [ms for ms, _ in results], outcomes
+
+def row(scenario, latencies, outcomes, backend, checks, served=None):
+    stats = resilience.stats().get(backend, {})
+    failed = [name for name, ok in checks if not ok]
+    return {
+        "scenario": scenario,
+        "calls": len(latencies),
+        "ok": outcomes.get("ok", 0),
+        "failed": outcomes.get("failed", 0),
+        "rejected": outcomes.get("rejected", 0),
+        "deadline": outcomes.get("deadline", 0),
+        "retries": stats.get("retries", 0),
+        "served": served,
+        "p50_ms": float(np.percentile(latencies, 50)) if latencies else 0.0,
+        "max_ms": max(latencies) if latencies else 0.0,
+        "state": stats.get("state", "-"),
+        "result": "FAIL: " + ", ".join(failed) if failed else "pass",
+    }
+
+def backend_requests():
+    c = stub_roboflow_server.counts()
+    return c["requests"] + c["faults"] + c["throttled"]
+
+#######################################################
+# --- Scenarios ---
+
+def flaky(client, image, args, retries):
+    policy = Policy(max_attempts=3 if retries else 1, base_delay=0.01, failure_threshold=10 ** 6)
+    resilience.get_registry().configure("roboflow", policy)
+    stub_roboflow_server.set_faults(fault_rate=args.fault_rate, throttle_rate=0.0, down=False)
+    latencies, outcomes = run_calls(lambda: client.infer(image, ROBOFLOW_MODEL), args.calls, args.concurrency)
+    ok_share = outcomes.get("ok", 0) / args.calls
+    if retries:
+        # 3 attempts: a call only fails if all three hit a fault
+        expected = 1 - args.fault_rate ** 3 - 0.05
+        checks = [(f"ok share {ok_share:.0%} < {expected:.0%}", ok_share >= expected)]
+    else:
+        checks = [("faults were injected", outcomes.get("failed", 0) > 0)]
+    return row("flaky-retry" if retries else "flaky-no-retry", latencies, outcomes, "roboflow", checks)
+
+def throttled(client, image, args):
+    # Quota sized for the run: this checks that 429s are retried after Retry-After, retry-budget checks the cap
+    policy = Policy(max_attempts=6, failure_threshold=10 ** 6, retry_quota=args.calls * 6 * RetryQuota.RETRY_COST)
+    resilience.get_registry().configure("roboflow", policy)
+    stub_roboflow_server.set_faults(fault_rate=0.0, throttle_rate=args.throttle_rate, down=False, retry_after=0.02)
+    latencies, outcomes = run_calls(lambda: client.infer(image, ROBOFLOW_MODEL), args.calls, args.concurrency)
+    retries = resilience.stats()["roboflow"]["retries"]
+    checks = [
+        ("calls lost to throttling", outcomes.get("ok", 0) >= args.calls * 0.95),
+        ("no retries recorded", retries > 0),
+    ]
+    return row("throttled", latencies, outcomes, "roboflow", checks)
+
+def retry_budget(client, image, args):
+    policy = Policy(max_attempts=3, base_delay=0.01, failure_threshold=10 ** 6)
+    resilience.get_registry().configure("roboflow", policy)
+    stub_roboflow_server.set_faults(fault_rate=0.0, throttle_rate=1.0, down=False, retry_after=0.01)
+    latencies, outcomes = run_calls(lambda: client.infer(image, ROBOFLOW_MODEL), args.calls, args.concurrency)
+    stats = resilience.stats()["roboflow"]
+    allowed = policy.retry_quota // RetryQuota.RETRY_COST
+    checks = [
+        (f"{stats['retries']} retries > quota of {allowed}", stats["retries"] <= allowed),
+        ("quota never ran out", stats["quota_exhausted"] > 0),
+    ]
+    return row("retry-budget", latencies, outcomes, "roboflow", checks)
+
+def outage(client, image, args):
+    threshold, recovery = 5, 1.0
+    policy = Policy(max_attempts=3, base_delay=0.01, failure_threshold=threshold, recovery_timeout=recovery)
+    resilience.get_registry().configure("roboflow", policy)
+    stub_roboflow_server.set_faults(fault_rate=0.0, throttle_rate=0.0, down=True)
+    before = backend_requests()
+    latencies, outcomes = run_calls(lambda: client.infer(image, ROBOFLOW_MODEL), args.calls, args.concurrency)
+    served = backend_requests() - before
+    opened_state = resilience.stats()["roboflow"]["state"]
+
+    # Backend is back: after recovery_timeout one probe closes the circuit
+    stub_roboflow_server.set_faults(down=False)
+    time.sleep(recovery)
+    recovered, recovered_outcomes = run_calls(lambda: client.infer(image, ROBOFLOW_MODEL), 5, 1)
+    checks = [
+        ("circuit did not open", opened_state == "open"),
+        # Concurrent callers already past allow() may each finish their attempt
+        (f"{served} requests reached a dead backend", served <= threshold + args.concurrency * policy.max_attempts),
+        ("calls were not rejected", outcomes.get("rejected", 0) >= args.calls - threshold - args.concurrency),
+        ("did not recover", recovered_outcomes.get("ok", 0) == 5 and resilience.stats()["roboflow"]["state"] == "closed"),
+    ]
+    return row("outage", latencies, outcomes, "roboflow", checks, served)
+
+def model_stopped(args):
+    calls = {"count": 0}
+    model = {"running": False}
+
+    def answer(**kwargs):
+        """before-call hook: a stopped model answers like Rekognition does, a running one with one label."""
+        calls["count"] += 1
+        if not model["running"]:
+            error = {"Error": {"Code": "ResourceNotReadyException", "Message": "The model is not running"},
+                     "ResponseMetadata": {"HTTPStatusCode": 400}}
+            return MagicMock(status_code=400), error
+        return MagicMock(status_code=200), {"CustomLabels": [{"Name": "Safe Driving", "Confidence": 97.0}],
+                                            "ResponseMetadata": {"HTTPStatusCode": 200}}
+
+    client = boto3.client("rekognition", region_name="us-east-1", aws_access_key_id="testing", aws_secret_access_key="testing")
+    client.meta.events.register("before-call.rekognition.DetectCustomLabels", answer)
+    resilience.get_registry().configure("rekognition", Policy(max_attempts=1, recovery_timeout=60))
+    image = small_jpeg()
+
+    detect = lambda: resilience.call("rekognition", detect_from_bytes, client, MODEL_ARN, image)  # noqa: E731
+    latencies, outcomes = run_calls(detect, args.calls, 1)
+    reached_while_stopped = calls["count"]
+
+    # The status panel sees RUNNING: the page releases the circuit (rekognition_backends.sync_inference_circuits)
+    model["running"] = True
+    resilience.breaker("rekognition").release()
+    _, after = run_calls(detect, 3, 1)
+    checks = [
+        (f"{reached_while_stopped} calls reached a stopped model", reached_while_stopped == 1),
+        ("calls were not rejected", outcomes.get("rejected", 0) == args.calls - 1),
+        ("not released once RUNNING", after.get("ok", 0) == 3),
+    ]
+    return row("model-stopped", latencies, outcomes, "rekognition", checks, reached_while_stopped)
+
+def deadline(client, image, args):
+    resilience.get_registry().configure("roboflow", Policy(max_attempts=10, base_delay=0.2, failure_threshold=10 ** 6))
+    stub_roboflow_server.set_faults(fault_rate=0.5, throttle_rate=0.0, down=False)
+    stub_roboflow_server.StubHandler.delay = args.deadline_ms / 1000 * 0.6
+    seconds = args.deadline_ms / 1000
+
+    def call():
+        with resilience.deadline(seconds):
+            return client.infer(image, ROBOFLOW_MODEL)
+
+    try:
+        latencies, outcomes = run_calls(call, max(10, args.calls // 4), args.concurrency)
+    finally:
+        stub_roboflow_server.StubHandler.delay = 0.0
+    slack_ms = 150
+    checks = [
+        (f"a call took {max(latencies):.0f} ms", max(latencies) <= args.deadline_ms + slack_ms),
+        ("deadline never hit", outcomes.get("deadline", 0) + outcomes.get("failed", 0) > 0),
+    ]
+    return row("deadline", latencies, outcomes, "roboflow", checks)
+
+def print_table(rows):
+    print(f"\n{'scenario':15} {'calls':>6} {'ok':>5} {'failed':>7} {'rejected':>9} {'deadline':>9} "
+          f"{'retries':>8} {'served':>7} {'p50 ms':>8} {'max ms':>8} {'state':>10}  result")
+    for r in rows:
+        served = "-" if r["served"] is None else r["served"]
+        print(f"{r['scenario']:15} {r['calls']:>6} {r['ok']:>5} {r['failed']:>7} {r['rejected']:>9} {r['deadline']:>9} "
+              f"{r['retries']:>8} {served:>7} {r['p50_ms']:>8.1f} {r['max_ms']:>8.1f} {r['state']:>10}  {r['result']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=60, help="calls per scenario")
+    parser.add_argument("--fault-rate", type=float, default=0.3, help="share of 503s in the flaky scenarios")
+    parser.add_argument("--throttle-rate", type=float, default=0.5, help="share of 429s in the throttled scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--deadline-ms", type=float, default=500)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    server = stub_roboflow_server.serve(STUB_PORT)
+    client = RoboflowClient(f"http://127.0.0.1:{STUB_PORT}", "faults", build_configuration(), max_concurrent=args.concurrency, timeout=5)
+    image = small_jpeg()
+    rows = []
+    try:
+        for scenario in args.scenarios:
+            if scenario == "flaky-no-retry":
+                rows.append(flaky(client, image, args, retries=False))
+            elif scenario == "flaky-retry":
+                rows.append(flaky(client, image, args, retries=True))
+            elif scenario == "throttled":
+                rows.append(throttled(client, image, args))
+            elif scenario == "retry-budget":
+                rows.append(retry_budget(client, image, args))
+            elif scenario == "outage":
+                rows.append(outage(client, image, args))
+            elif scenario == "model-stopped":
+                rows.append(model_stopped(args))
+            elif scenario == "deadline":
+                rows.append(deadline(client, image, args))
+    finally:
+        server.shutdown()
+
+    print_table(rows)
+    if any(r["result"] != "pass" for r in rows):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
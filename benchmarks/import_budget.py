@@ -0,0 +1,150 @@
+"""
+Import-time budget for the pages: what a cold process pays before the first screen.
+
+Each page's top-level imports are run in a fresh interpreter with
+python -X importtime, so the numbers are the same ones CPython reports:
+the total, the heaviest top-level packages, and which of warmup.HEAVY_MODULES
+were imported eagerly (they should only load in the background pre-warm or
+when an analysis needs them). Every HEAVY_MODULES entry is also timed on its
+own, which is what the pre-warm hides from the first visitor.
+
+Each measurement is the fastest of --runs fresh processes. A page over
+--budget-ms, or one that imports a heavy module eagerly, makes the script exit
+with status 1; --save/--compare keep a baseline and flag pages that got slower
+than --threshold (for CI).
+
+Usage:
+    python benchmarks/import_budget.py [--runs 5] [--budget-ms 1500] [--top 8]
+        [--save imports.json] [--compare baseline.json]
+"""
+# Import package
+import argparse
+import ast
+import json
+import platform
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from warmup import HEAVY_MODULES, STARTUP_BUDGET_MS  # noqa: E402
+
+PAGES = ("1_📟_AWS_Rekognition.py", "2_👾_Roboflow_ML.py", "streamlit_app.py")
+
+def page_imports(path):
+    """The page's module-level import statements, as source."""
+    source = path.read_text(encoding="utf-8")
+    tree = ast.parse(source)
+    return "\n".join(
+        ast.get_source_segment(source, node)
+        for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))
+    )
+
+def parse_importtime(stderr):
+    """
+    -X importtime lines ('import time: self | cumulative | name') ->
+    {top-level package: cumulative ms} and the set of every module imported.
+    """
+    top_level, modules = {}, set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.add(name.strip())
+        # Nested imports are indented under the module that triggered them
+        if not name[1:].startswith(" "):
+            top_level[name.strip()] = int(cumulative) / 1000
+    return top_level, modules
+
+def measure(code, runs):
+    """Fastest of `runs` fresh interpreters running `code` (ms), with its breakdown."""
+    best = None
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=ROOT, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        top_level, modules = parse_importtime(result.stderr)
+        total = sum(top_level.values())
+        if best is None or total < best[0]:
+            best = (total, top_level, modules)
+    return best
+
+def page_row(page, runs, top):
+    total, top_level, modules = measure(page_imports(ROOT / page), runs)
+    heaviest = sorted(top_level.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return {
+        "target": page,
+        "total_ms": round(total, 1),
+        "eager_heavy": [m for m in HEAVY_MODULES if m in modules],
+        "heaviest": [[name, round(ms, 1)] for name, ms in heaviest],
+    }
+
+def module_row(name, runs):
+    total, _, _ = measure(f"import {name}", runs)
+    return {"target": name, "total_ms": round(total, 1)}
+
+def print_report(pages, modules, budget_ms, baseline=None, threshold=0.15):
+    """Prints the tables and returns the list of problems (empty when within budget)."""
+    problems = []
+    print(f"\n{'page':28} {'import ms':>10} {'budget':>8} {'vs base':>8}  eager heavy imports")
+    for row in pages:
+        flags = []
+        if row["total_ms"] > budget_ms:
+            flags.append("OVER BUDGET")
+            problems.append(f"{row['target']}: {row['total_ms']:.0f} ms > {budget_ms:.0f} ms")
+        if row["eager_heavy"]:
+            problems.append(f"{row['target']}: imports {', '.join(row['eager_heavy'])} eagerly")
+        change = ""
+        base = (baseline or {}).get(row["target"])
+        if base:
+            delta = row["total_ms"] / base["total_ms"] - 1
+            change = f"{delta:+.0%}"
+            if delta > threshold:
+                flags.append("REGRESSION")
+                problems.append(f"{row['target']}: {change} import time vs baseline")
+        print(f"{row['target']:28} {row['total_ms']:>10.0f} {budget_ms:>8.0f} {change:>8}  "
+              f"{', '.join(row['eager_heavy']) or '-'}  {' '.join(flags)}")
+
+    for row in pages:
+        print(f"\nHeaviest top-level imports of {row['target']}:")
+        for name, ms in row["heaviest"]:
+            print(f"  {ms:>8.1f} ms  {name}")
+
+    print("\nDeferred to the pre-warm (each measured on its own, shared dependencies counted every time):")
+    for row in modules:
+        print(f"  {row['total_ms']:>8.1f} ms  {row['target']}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement (the fastest counts)")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="import time allowed per page")
+    parser.add_argument("--top", type=int, default=8, help="heaviest top-level imports to list per page")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --save")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    print(f"Python {platform.python_version()} on {platform.machine()}, fastest of {args.runs} runs")
+    pages = [page_row(page, args.runs, args.top) for page in PAGES]
+    modules = [module_row(name, args.runs) for name in HEAVY_MODULES]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {r["target"]: r for r in json.load(f)["pages"]}
+    problems = print_report(pages, modules, args.budget_ms, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "pages": pages, "modules": modules}, f, indent=2)
+    if problems:
+        print("\n" + "\n".join(problems))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
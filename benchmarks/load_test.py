@@ -0,0 +1,339 @@
+"""
+Headless load test: N concurrent Streamlit sessions through upload -> analyze -> start over.
+
+Each session is a streamlit.testing AppTest running the real page script on its
+own script thread, like a browser session on a live server. All sessions share
+one runtime (so st.cache_data / st.cache_resource are shared as in production)
+and talk to local stand-ins:
+  - roboflow page: benchmarks/stub_roboflow_server.py with --latency-ms delay
+  - aws page: moto S3/Lambda/Rekognition (see bench_pipeline.py) with --latency-ms
+    on every botocore call; the model status call is answered with RUNNING.
+
+The file uploader can't be driven headlessly, so "upload" puts the file into
+the artifact store and its ref into session state exactly like the uploader
+branch of main() does, and reruns.
+
+Reports per step (latency p50/p95/max and script runs per interaction, which
+exposes rerun amplification), per session totals, process CPU, RSS and
+script-thread concurrency sampled while the test runs, and what the artifact
+store still holds at the end (every session started over, so nothing should be).
+
+Usage:
+    python benchmarks/load_test.py [--page roboflow|aws] [--sessions 8] [--iterations 2]
+        [--ramp-up 2] [--latency-ms 60] [--image-size 1280x960]
+
+Relies on AppTest internals of the pinned Streamlit version (requirements.txt).
+"""
+# Import package
+import argparse
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from unittest.mock import MagicMock
+import numpy as np
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.pages_manager import PagesManager
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.runtime.scriptrunner.script_runner import ScriptRunnerEvent
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+from streamlit.testing.v1.util import patch_config_options
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from artifact_store import get_configured_store, hold_upload  # noqa: E402
+import aws_clients  # noqa: E402
+import stub_roboflow_server  # noqa: E402
+from bench_pipeline import REGION, BUCKET, FUNCTION_NAME, MODEL_ARN, AwsStandIn, make_photo, parse_size  # noqa: E402
+from bench_annotate import rekognition_detections  # noqa: E402
+
+PAGES = {"roboflow": "2_👾_Roboflow_ML.py", "aws": "1_📟_AWS_Rekognition.py"}
+STUB_PORT = 9071
+SAMPLE_INTERVAL = 0.1   # seconds between resource samples
+
+#######################################################
+# --- Concurrent sessions ---
+
+class SessionAppTest(AppTest):
+    """
+    AppTest that can run next to other instances: AppTest._run swaps the global
+    runtime and secrets on every run, which breaks concurrent sessions. Here the
+    runtime and secrets are set up once for the process (see shared_runtime).
+    Also counts how many script runs each interaction caused, and gives every
+    instance its own session id (AppTest uses one for all, which the artifact
+    store would see as a single session).
+    """
+    script_runs = 0
+
+    @property
+    def session_id(self):
+        return f"load-test-{id(self)}"
+
+    def _run(self, widget_state=None, timeout=None):
+        runner = LocalScriptRunner(
+            self._script_path, self.session_state,
+            PagesManager(self._script_path, ScriptCache(), setup_watcher=False),
+            args=self.args, kwargs=self.kwargs,
+        )
+        runner._session_id = self.session_id
+        self._tree = runner.run(widget_state, self.query_params, timeout or self.default_timeout, self._page_hash)
+        self._tree._runner = self
+        self.script_runs = sum(e == ScriptRunnerEvent.SCRIPT_STARTED for e in runner.events)
+        return self
+
+class shared_runtime:
+    """One mock runtime, cache storage and secrets for every session in the process."""
+    def __init__(self, secrets):
+        self.secrets = secrets
+
+    def __enter__(self):
+        runtime = MagicMock(spec=Runtime)
+        runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+        runtime.cache_storage_manager = MemoryCacheStorageManager()
+        Runtime._instance = runtime
+        self.saved_secrets = st.secrets
+        st.secrets = Secrets()
+        st.secrets._secrets = dict(self.secrets)
+        self.config = patch_config_options({"global.appTest": True})
+        self.config.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.config.__exit__(*exc)
+        st.secrets = self.saved_secrets
+        Runtime._instance = None
+
+class FakeUpload:
+    """What st.file_uploader returns, as far as the pages use it."""
+    def __init__(self, name, data):
+        self.name = name
+        self.type = "image/jpeg"
+        self.size = len(data)
+        self._data = data
+
+    def getvalue(self):
+        return self._data
+
+def click(at, label):
+    buttons = [b for b in at.button if b.label == label]
+    if not buttons:
+        raise RuntimeError(f"No '{label}' button on screen (errors: {[e.value for e in at.error]})")
+    buttons[0].click()
+    return at.run()
+
+def run_session(index, args, image_bytes, results):
+    """One user: load the page, then upload -> analyze -> start over `iterations` times."""
+    page = PAGES[args.page]
+    state_key = "workflow_state_2" if args.page == "roboflow" else "workflow_state"
+    at = SessionAppTest(str(ROOT / page), default_timeout=args.timeout)
+
+    def step(name, action):
+        start = time.perf_counter()
+        try:
+            action()
+            error = at.exception[0].value if at.exception else None
+        except Exception as e:
+            error = repr(e)
+        results.append({
+            "session": index, "step": name, "ms": (time.perf_counter() - start) * 1000,
+            "script_runs": at.script_runs, "error": error,
+        })
+        return error is None
+
+    if not step("load", at.run):
+        return
+    if args.page == "aws" and not step("proceed", lambda: click(at, "Proceed to Image Analysis ➡️")):
+        return
+    for i in range(args.iterations):
+        def upload():
+            # Unique bytes per session and iteration: every analysis is a cache miss
+            upload = FakeUpload(f"s{index}-{i}.jpg", image_bytes + f"s{index}-{i}".encode())
+            at.session_state["uploaded_file"] = hold_upload(get_configured_store(), upload, owner=at.session_id)
+            at.session_state[state_key] = "preview"
+            at.run()
+        def analyze():
+            click(at, "Analyze Image")
+            if at.session_state[state_key] != "analysis":
+                raise RuntimeError(f"Analysis did not finish (errors: {[e.value for e in at.error]})")
+        if not (step("upload", upload)
+                and step("analyze", analyze)
+                and step("start_over", lambda: click(at, "Start Over"))):
+            return
+
+#######################################################
+# --- Resource sampling ---
+
+def rss_mb():
+    """Current resident set size (Linux /proc), else the peak from getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class ResourceMonitor(threading.Thread):
+    """Samples process CPU, RSS and how many script threads are running."""
+    def __init__(self):
+        super().__init__(daemon=True, name="load-test-monitor")
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        last_cpu, last_time = time.process_time(), time.perf_counter()
+        while not self._stop_event.wait(SAMPLE_INTERVAL):
+            cpu, now = time.process_time(), time.perf_counter()
+            self.samples.append({
+                "cpu_pct": (cpu - last_cpu) / (now - last_time) * 100,
+                "rss_mb": rss_mb(),
+                "script_threads": sum(t.name == "ScriptRunner.scriptThread" for t in threading.enumerate()),
+                "threads": threading.active_count(),
+            })
+            last_cpu, last_time = cpu, now
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+#######################################################
+# --- Stand-ins and secrets ---
+
+def roboflow_setup(args):
+    server = stub_roboflow_server.serve(STUB_PORT, args.latency_ms)
+    secrets = {
+        "ROBOFLOW_API": "load-test",
+        "ROBOFLOW_MODEL": "load/1",
+        "ROBOFLOW_API_URL": f"http://127.0.0.1:{STUB_PORT}",
+        "ROBOFLOW_MAX_CONCURRENT": args.sessions,
+    }
+    return secrets, server.shutdown
+
+def answer_running(**kwargs):
+    """before-call hook: moto has no DescribeProjectVersions, so report the model as RUNNING."""
+    http = MagicMock(status_code=200)
+    return http, {"ProjectVersionDescriptions": [{"Status": "RUNNING", "StatusMessage": "Load test stand-in"}]}
+
+def aws_setup(args):
+    aws = AwsStandIn(args.latency_ms)
+    aws.queue_lambda_results(rekognition_detections(5, random.Random(0)), 100000)
+    # The page builds its Rekognition client without explicit keys; this is the same cached client
+    aws_clients.get_client("rekognition", REGION).meta.events.register(
+        "before-call.rekognition.DescribeProjectVersions", answer_running
+    )
+    secrets = {
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_REGION": REGION,
+        "S3_BUCKET_NAME": BUCKET,
+        "LAMBDA_FUNCTION_NAME": FUNCTION_NAME,
+        "PROJECT_ARN": MODEL_ARN.split("/version/")[0],
+        "MODEL_ARN": MODEL_ARN,
+        "VERSION_NAME": "bench.1",
+        "MIN_INFERENCE_UNITS": 1,
+        "LAMBDA_MAX_IN_FLIGHT": args.sessions,
+    }
+    return secrets, aws.stop
+
+#######################################################
+# --- Report ---
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+def report(results, samples, wall, args):
+    print(f"\n{args.sessions} sessions x {args.iterations} iterations on the {args.page} page "
+          f"in {wall:.1f}s ({os.cpu_count()} CPUs, latency {args.latency_ms} ms)")
+
+    by_step = defaultdict(list)
+    for r in results:
+        by_step[r["step"]].append(r)
+    print(f"\n{'step':<12}{'n':>5}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'runs/click':>12}")
+    for step_name in ("load", "proceed", "upload", "analyze", "start_over"):
+        rows = by_step.get(step_name)
+        if not rows:
+            continue
+        ms = [r["ms"] for r in rows]
+        errors = sum(r["error"] is not None for r in rows)
+        runs = statistics.fmean(r["script_runs"] for r in rows)
+        print(f"{step_name:<12}{len(rows):>5}{errors:>5}{percentile(ms, 50):>10.0f}{percentile(ms, 95):>10.0f}"
+              f"{max(ms):>10.0f}{runs:>12.1f}")
+
+    per_session = defaultdict(float)
+    for r in results:
+        per_session[r["session"]] += r["ms"]
+    totals = list(per_session.values())
+    print(f"\nPer session total: p50 {percentile(totals, 50) / 1000:.2f}s | max {max(totals) / 1000:.2f}s")
+
+    first_errors = [r for r in results if r["error"]][:3]
+    for r in first_errors:
+        print(f"  session {r['session']} {r['step']}: {r['error']}")
+
+    if samples:
+        cpu = [s["cpu_pct"] for s in samples]
+        active = [s["script_threads"] for s in samples]
+        busy = [a for a in active if a]
+        print(f"\nCPU: mean {statistics.fmean(cpu):.0f}% | p95 {percentile(cpu, 95):.0f}% (100% = one core)")
+        print(f"RSS: start {samples[0]['rss_mb']:.0f} MB | peak {max(s['rss_mb'] for s in samples):.0f} MB")
+        print(f"Script threads: peak {max(active)} | mean while busy {statistics.fmean(busy) if busy else 0:.1f} "
+              f"| all threads peak {max(s['threads'] for s in samples)}")
+        # Script code holds the GIL: CPU pinned near one core while several
+        # script threads are queued means more sessions only add waiting time
+        saturated = sum(1 for s in samples if s["script_threads"] > 1 and s["cpu_pct"] > 90)
+        print(f"Saturated samples (>1 script thread and >90% CPU): {saturated / len(samples):.0%}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page", choices=sorted(PAGES), default="roboflow")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=2, help="upload -> analyze -> start over rounds per session")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="seconds over which sessions are started")
+    parser.add_argument("--latency-ms", type=float, default=60, help="injected backend latency per call")
+    parser.add_argument("--image-size", default="1280x960")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds per script run")
+    args = parser.parse_args()
+
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    secrets, teardown = (roboflow_setup if args.page == "roboflow" else aws_setup)(args)
+    image_bytes = make_photo(parse_size(args.image_size), 0)
+
+    results = []
+    monitor = ResourceMonitor()
+    try:
+        with shared_runtime(secrets):
+            monitor.start()
+            start = time.perf_counter()
+            sessions = []
+            for i in range(args.sessions):
+                t = threading.Thread(target=run_session, args=(i, args, image_bytes, results), name=f"session-{i}")
+                t.start()
+                sessions.append(t)
+                time.sleep(args.ramp_up / max(1, args.sessions))
+            for t in sessions:
+                t.join()
+            wall = time.perf_counter() - start
+            monitor.stop()
+            store_stats = get_configured_store().stats()
+    finally:
+        teardown()
+
+    report(results, monitor.samples, wall, args)
+    print(
+        f"Artifact store: {store_stats['memory_bytes'] / 1024 ** 2:.1f} MB in memory, "
+        f"{store_stats['disk_bytes'] / 1024 ** 2:.1f} MB spilled, {store_stats['held']} held by "
+        f"{store_stats['sessions']} sessions | {store_stats['released']} released"
+    )
+
+if __name__ == "__main__":
+    main()
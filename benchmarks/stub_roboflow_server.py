@@ -0,0 +1,155 @@
+"""
+Local stand-in for serverless.roboflow.com (v0 object detection endpoint).
+
+Answers POST /{project}/{version} with predictions laid out on the image that
+was sent (--detections of them), after an optional artificial delay. It speaks HTTP/1.1,
+so pooled clients keep their connections open; the log line on exit shows
+how many TCP connections served how many requests.
+
+Faults can be injected to exercise the retry and circuit-breaker layer
+(resilience.py): --fault-rate answers that share of requests with 503,
+--throttle-rate with 429 + Retry-After, and set_faults(down=True) fails
+everything until it is switched back.
+
+Usage:
+    python benchmarks/stub_roboflow_server.py [--port 9001] [--delay-ms 50] [--detections 3]
+        [--fault-rate 0.2] [--throttle-rate 0.1]
+
+Then set ROBOFLOW_API_URL = "http://localhost:9001" in .streamlit/secrets.toml.
+"""
+# Import package
+import argparse
+import base64
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from PIL import Image
+
+CLASSES = ["mild", "moderate", "severe"]
+
+_lock = threading.Lock()
+_counts = {"connections": 0, "requests": 0, "faults": 0, "throttled": 0}
+_random = random.Random(0)
+
+def fake_predictions(width, height, confidence, max_detections, count=len(CLASSES)):
+    """`count` boxes on a grid, with confidence going down from 0.95 (deterministic)."""
+    predictions = []
+    columns = max(1, int(count ** 0.5))
+    for i in range(count):
+        row, column = divmod(i, columns)
+        rows = (count + columns - 1) // columns
+        predictions.append({
+            "x": width * (column + 0.5) / columns, "y": height * (row + 0.5) / rows,
+            "width": width / columns * 0.8, "height": height / rows * 0.8,
+            "confidence": 0.95 - 0.6 * i / max(1, count - 1) if count > 1 else 0.95,
+            "class": CLASSES[i % len(CLASSES)], "class_id": i % len(CLASSES),
+        })
+    predictions = [p for p in predictions if p["confidence"] >= confidence]
+    return predictions[:max_detections]
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+    delay = 0.0
+    detections = len(CLASSES)
+    fault_rate = 0.0
+    throttle_rate = 0.0
+    retry_after = 0.05      # seconds, sent with every 429
+    down = False
+
+    def setup(self):
+        super().setup()
+        with _lock:
+            _counts["connections"] += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        params = parse_qs(urlparse(self.path).query)
+        try:
+            image = Image.open(io.BytesIO(base64.b64decode(body)))
+        except Exception:
+            return self._reply(400, {"message": "Could not decode image"})
+        if "api_key" not in params:
+            return self._reply(401, {"message": "Missing api_key"})
+
+        with _lock:
+            roll = _random.random()
+            fault = self.down or roll < self.fault_rate
+            throttled = not fault and roll < self.fault_rate + self.throttle_rate
+            _counts["faults"] += fault
+            _counts["throttled"] += throttled
+        if fault:
+            return self._reply(503, {"message": "Injected fault"})
+        if throttled:
+            return self._reply(429, {"message": "Injected throttle"}, {"Retry-After": str(self.retry_after)})
+
+        time.sleep(self.delay)
+        confidence = float(params.get("confidence", ["0.4"])[0])
+        max_detections = int(params.get("max_detections", ["300"])[0])
+        width, height = image.size
+        with _lock:
+            _counts["requests"] += 1
+        self._reply(200, {
+            "time": self.delay,
+            "image": {"width": width, "height": height},
+            "predictions": fake_predictions(width, height, confidence, max_detections, self.detections),
+        })
+
+    def _reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass    # the client gave up (a deadline or timeout)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port, delay_ms=0, detections=len(CLASSES)):
+    """Starts the stub on a daemon thread and returns the server (call .shutdown() to stop)."""
+    StubHandler.delay = delay_ms / 1000
+    StubHandler.detections = detections
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def set_faults(fault_rate=None, throttle_rate=None, down=None, retry_after=None):
+    """Changes the injected faults of a running stub; None leaves a setting as it is."""
+    for name, value in (("fault_rate", fault_rate), ("throttle_rate", throttle_rate), ("down", down), ("retry_after", retry_after)):
+        if value is not None:
+            setattr(StubHandler, name, value)
+
+def counts():
+    with _lock:
+        return dict(_counts)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--delay-ms", type=float, default=50, help="simulated inference time per request")
+    parser.add_argument("--detections", type=int, default=len(CLASSES), help="predictions per image (before filtering)")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with 429")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.delay_ms, args.detections)
+    set_faults(args.fault_rate, args.throttle_rate)
+    print(f"Stub Roboflow server on http://localhost:{args.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"Served {counts()['requests']} requests over {counts()['connections']} connections")
+
+if __name__ == "__main__":
+    main()
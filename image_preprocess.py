@@ -0,0 +1,143 @@
+# Import package
+import io
+import time
+from PIL import Image
+
+#######################################################
+# --- Client-side downscaling before upload / inference ---
+# The models work far below phone-camera resolution, so sending a 12 MP photo
+# only costs bandwidth. Detections are mapped back onto the original image.
+# When nothing needs resizing, JPEG/PNG uploads are sent as they are without
+# being decoded; otherwise the image is decoded once and that decode is kept
+# for annotation too.
+
+DEFAULT_MAX_SIDE = 1280
+DEFAULT_JPEG_QUALITY = 85
+PASSTHROUGH_FORMATS = ("JPEG", "PNG")   # accepted as-is by Rekognition and Roboflow
+
+def frame_bytes(image):
+    """Memory held by a decoded PIL image."""
+    return image.size[0] * image.size[1] * len(image.getbands())
+
+class PreparedImage:
+    """The payload we actually send, plus what is needed to map results back."""
+    def __init__(self, data, image, size, original_size, original_bytes, elapsed, cpu, decoded_bytes):
+        self.data = data                    # encoded bytes to send
+        self._image = image                 # decoded RGB PIL image of `data`, None until needed
+        self.size = size
+        self.original_size = original_size
+        self.original_bytes = original_bytes
+        self.elapsed = elapsed              # seconds spent preprocessing
+        self.cpu = cpu                      # CPU seconds spent preprocessing (this thread)
+        self.decoded_bytes = decoded_bytes  # largest decoded frame held while preprocessing
+
+    @property
+    def image(self):
+        """Decoded RGB image of the sent bytes. The zero-decode path only decodes on first use."""
+        if self._image is None:
+            self._image = Image.open(io.BytesIO(self.data)).convert("RGB")
+        return self._image
+
+    @property
+    def resized(self):
+        return self.size != self.original_size
+
+    @property
+    def scale(self):
+        """(sx, sy) factors from the sent image back to the original image."""
+        return (self.original_size[0] / self.size[0], self.original_size[1] / self.size[1])
+
+    def report(self):
+        return {
+            "original_size": f"{self.original_size[0]}x{self.original_size[1]}",
+            "sent_size": f"{self.size[0]}x{self.size[1]}",
+            "original_kb": round(self.original_bytes / 1024, 1),
+            "sent_kb": round(len(self.data) / 1024, 1),
+            "preprocess_ms": round(self.elapsed * 1000, 1),
+            "cpu_ms": round(self.cpu * 1000, 1),
+            "decoded_mb": round(self.decoded_bytes / 1024 ** 2, 1),
+        }
+
+def preprocess_tag(max_side, quality):
+    """Identifies the preprocessing settings, e.g. for cache keys."""
+    return f"max{max_side}q{quality}" if max_side else "raw"
+
+def sent_file_name(file_name, prepared):
+    """Re-encoded images are JPEGs, whatever the original extension was."""
+    return file_name if not prepared.resized else file_name.rsplit(".", 1)[0] + ".jpg"
+
+def prepare_image(image_bytes, max_side=DEFAULT_MAX_SIDE, quality=DEFAULT_JPEG_QUALITY):
+    """
+    Downscales so the longest side is at most max_side and re-encodes as JPEG.
+    JPEGs use draft() so libjpeg decodes straight at a reduced DCT scale, then
+    reduce() does cheap integer box downsampling before the final resize.
+    max_side=0 (or an image already small enough) sends the original bytes:
+    Image.open only parses the header, so JPEG/PNG files are never decoded here.
+    """
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    image = Image.open(io.BytesIO(image_bytes))
+    original_size = image.size
+
+    def done(data, decoded, size):
+        peak = frame_bytes(decoded) if decoded is not None else 0
+        return PreparedImage(data, decoded, size, original_size, len(image_bytes),
+                             time.perf_counter() - start, time.thread_time() - cpu_start, peak)
+
+    if not max_side or max(original_size) <= max_side:
+        if image.format in PASSTHROUGH_FORMATS:
+            return done(image_bytes, None, original_size)
+        # Other formats are decoded once and sent as JPEG
+        image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality)
+        return done(buffer.getvalue(), image, original_size)
+
+    ratio = max_side / max(original_size)
+    target = (max(1, round(original_size[0] * ratio)), max(1, round(original_size[1] * ratio)))
+
+    if image.format == "JPEG":
+        # Picks the largest DCT scale (1/2, 1/4, 1/8) that is still >= target
+        image.draft("RGB", target)
+    image = image.convert("RGB")
+    decoded_bytes = frame_bytes(image)
+
+    factor = min(image.size[0] // target[0], image.size[1] // target[1])
+    if factor >= 2:
+        image = image.reduce(factor)
+    if image.size != target:
+        image = image.resize(target, Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    prepared = done(buffer.getvalue(), image, image.size)
+    prepared.decoded_bytes = max(prepared.decoded_bytes, decoded_bytes)
+    return prepared
+
+def _scale_predictions(predictions, sx, sy):
+    return [
+        {**det, "x": det["x"] * sx, "y": det["y"] * sy, "width": det["width"] * sx, "height": det["height"] * sy}
+        if all(k in det for k in ("x", "y", "width", "height")) else det
+        for det in predictions
+    ]
+
+def to_sent_pixels(predictions, prepared):
+    """Inverse of scale_pixel_predictions: original-image pixels -> pixels of prepared.image."""
+    if not prepared.resized:
+        return predictions
+    sx, sy = prepared.scale
+    return _scale_predictions(predictions, 1 / sx, 1 / sy)
+
+def scale_pixel_predictions(results, prepared):
+    """
+    Maps Roboflow-style pixel detections (center x/y, width, height) from the
+    sent image back to original-image pixels. Relative boxes (Rekognition)
+    need no mapping.
+    """
+    if not prepared.resized or not results:
+        return results
+    sx, sy = prepared.scale
+    scaled = dict(results)
+    scaled["predictions"] = _scale_predictions(results.get("predictions", []), sx, sy)
+    if "image" in results:
+        scaled["image"] = {**results["image"], "width": prepared.original_size[0], "height": prepared.original_size[1]}
+    return scaled
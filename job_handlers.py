@@ -0,0 +1,112 @@
+# Import package
+import time
+import aws_clients
+import resilience
+from annotate import draw_rekognition_boxes, draw_roboflow_boxes
+from annotation_cache import encode_jpeg
+from image_preprocess import prepare_image, scale_pixel_predictions, sent_file_name
+from lambda_engine import get_configured_engine
+from onnx_backend import load_configured_model
+from rekognition_backends import detect_from_bytes, detect_from_s3, resolve_backend, sync_inference_circuits
+from roboflow_client import get_configured_client
+from s3_upload import get_configured_uploader
+
+#######################################################
+# --- Analysis jobs ---
+# What a page does for one image (preprocess -> upload -> inference ->
+# annotate), as job_queue handlers running in a worker process. Clients are
+# built from st.secrets by the same getters the pages use, once per worker.
+# Time spent waiting in the queue counts against the page's deadline.
+# Each handler returns (result, annotated JPEG or None, report): result is what
+# the page caches and shows, report holds the stage timings and the payload row.
+
+ANNOTATED_QUALITY = 90
+
+def _remaining_deadline(params):
+    if params.get("deadline_s") is None:
+        return None
+    left = params["deadline_s"] - (time.time() - params["submitted_at"])
+    if left <= 0:
+        raise resilience.DeadlineExceeded(f"Waited {time.time() - params['submitted_at']:.0f}s in the queue")
+    return left
+
+class _Stages:
+    """Wall time per stage, in seconds (the shape tracing.Recorder.record_timings takes)."""
+    def __init__(self):
+        self.timings = {}
+
+    def run(self, name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+def analyze_roboflow(image_bytes, params):
+    """params: model_id, backend (roboflow-api / local-onnx), max_side, quality, deadline_s."""
+    stages = _Stages()
+    with resilience.deadline(_remaining_deadline(params)):
+        prepared = stages.run("preprocess", prepare_image, image_bytes, params["max_side"], params["quality"])
+        client = load_configured_model() if params["backend"] == "local-onnx" else get_configured_client()
+        results = stages.run("inference", client.infer, prepared.data, model_id=params["model_id"])
+    sent_predictions = results.get("predictions", [])
+    annotated = stages.run(
+        "annotate", lambda: encode_jpeg(draw_roboflow_boxes(prepared.image, sent_predictions), ANNOTATED_QUALITY)
+    )
+    report = {
+        "mode": "downscaled" if prepared.resized else "original",
+        **prepared.report(),
+        "infer_ms": round(stages.timings["inference"] * 1000, 1),
+    }
+    # Predictions are in pixels of the sent image: map them back to the original
+    return scale_pixel_predictions(results, prepared), annotated, {"timings": stages.timings, "history": report}
+
+def analyze_rekognition(image_bytes, params):
+    """
+    params: file_name, backend (lambda / direct-s3 / direct-bytes), model_arn, min_confidence,
+    max_side, quality, deadline_s, model_status (as the page last saw it).
+    """
+    # This worker's breakers do not see the page's status reads: a model that is
+    # not RUNNING opens them here, so the inference call fails fast
+    sync_inference_circuits(params.get("model_status"))
+    stages = _Stages()
+    with resilience.deadline(_remaining_deadline(params)):
+        prepared = stages.run("preprocess", prepare_image, image_bytes, params["max_side"], params["quality"])
+        backend = resolve_backend(params["backend"], len(prepared.data))
+        rekog_client = aws_clients.get_configured_client("rekognition", use_keys=False)
+        if backend == "direct-bytes":
+            results = stages.run(
+                "inference", resilience.call, "rekognition", detect_from_bytes,
+                rekog_client, params["model_arn"], prepared.data, params.get("min_confidence"),
+            )
+        else:
+            uploader = get_configured_uploader()
+            s3_uri, _ = stages.run(
+                "upload", resilience.call, "s3", uploader.upload, prepared.data, sent_file_name(params["file_name"], prepared)
+            )
+            bucket, key = s3_uri.replace("s3://", "").split("/", 1)
+            if backend == "direct-s3":
+                results = stages.run(
+                    "inference", resilience.call, "rekognition", detect_from_s3,
+                    rekog_client, params["model_arn"], bucket, key, params.get("min_confidence"),
+                )
+            else:
+                engine = get_configured_engine()
+                results = stages.run(
+                    "inference", resilience.call, "lambda", engine.invoke, bucket, key,
+                    timeout=resilience.clamp_timeout(engine.timeout), deadline=resilience.deadline_at(),
+                )
+    annotated = None
+    if results:
+        # Boxes are relative (0-1): drawn on the image that was sent (downscaled when preprocessing applies)
+        annotated = stages.run(
+            "annotate", lambda: encode_jpeg(draw_rekognition_boxes(prepared.image, results), ANNOTATED_QUALITY)
+        )
+    report = {
+        "mode": "downscaled" if prepared.resized else "original",
+        "backend": backend,
+        **prepared.report(),
+        "upload_ms": round(stages.timings.get("upload", 0.0) * 1000, 1),
+        "inference_ms": round(stages.timings["inference"] * 1000, 1),
+    }
+    return results, annotated, {"timings": stages.timings, "history": report, "backend": backend, "sent_bytes": len(prepared.data)}
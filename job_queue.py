@@ -0,0 +1,416 @@
+# Import package
+import argparse
+import atexit
+import importlib
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import streamlit as st
+import resilience
+
+#######################################################
+# --- Out-of-process job queue ---
+# Without it an analysis (preprocess, S3 upload, inference, annotation) runs
+# in the session's script thread: a slow Lambda or Roboflow call holds that
+# thread for the whole rerun. With JOB_WORKERS > 0 the page puts the job in a
+# SQLite table instead and a pool of worker processes claims jobs one at a
+# time. The page polls with st.fragment, so only the status panel reruns.
+# SQLite (WAL) rather than a multiprocessing.Queue: the queue survives a
+# restart, and a job whose worker died (no heartbeat, process gone) goes back
+# to the queue, at most MAX_ATTEMPTS times.
+# Jobs are coalesced by key (model settings + image hash, see
+# result_cache.cache_key): submitting a key that is queued, running or was
+# finished less than RESULT_TTL ago returns the existing job.
+# Handlers are "module:function" names, imported in the worker process:
+# handler(image_bytes, params) -> (result, artifact bytes or None, report dict).
+# They must be JSON-in/JSON-out and build their own clients (see job_handlers.py).
+
+DEFAULT_DB = os.path.join(tempfile.gettempdir(), "streamlit_jobs.sqlite3")
+DEFAULT_WORKERS = 0         # 0 = no queue, analyses run in the script thread
+IDLE_POLL = 0.1             # seconds between claims while the queue is empty (worker side)
+PAGE_POLL = 1.0             # seconds between status checks in the page fragment
+HEARTBEAT = 5               # seconds between worker heartbeats
+HEARTBEAT_TIMEOUT = 30      # a running job whose worker was silent this long is requeued
+RESULT_TTL = 600            # seconds a finished job is kept and coalesced into
+MAX_ATTEMPTS = 3            # tries per job when workers die under it
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    handler TEXT NOT NULL,
+    params TEXT NOT NULL,
+    image BLOB,
+    status TEXT NOT NULL,               -- queued, running, done, failed
+    result TEXT,
+    artifact BLOB,
+    report TEXT,
+    error TEXT,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    waiters INTEGER NOT NULL DEFAULT 1,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    job_id INTEGER,
+    started_at REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    busy_seconds REAL NOT NULL DEFAULT 0,
+    jobs_done INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+def connect(db_path):
+    """Autocommit connection (transactions are explicit, see transaction()) in WAL mode."""
+    db = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+@contextmanager
+def transaction(db):
+    """BEGIN IMMEDIATE takes the write lock up front, so two processes never claim the same job."""
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield db
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    db.execute("COMMIT")
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobQueue:
+    """The page side: submit, look up, requeue orphans, and queue statistics."""
+    def __init__(self, db_path=DEFAULT_DB, result_ttl=RESULT_TTL):
+        self.db_path = db_path
+        self.result_ttl = result_ttl
+        self._db = connect(db_path)
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "coalesced": 0, "requeued": 0}
+
+    def submit(self, handler, key, params, image=None):
+        """Returns (job id, coalesced). Coalesced means an equal job already existed and nothing was added."""
+        now = time.time()
+        with self._lock, transaction(self._db):
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE key = ? AND handler = ?"
+                " AND (status IN ('queued', 'running') OR (status = 'done' AND finished_at > ?))"
+                " ORDER BY id DESC LIMIT 1",
+                (key, handler, now - self.result_ttl),
+            ).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE jobs SET waiters = waiters + 1 WHERE id = ?", (row[0],))
+                self._stats["coalesced"] += 1
+                return row[0], True
+            cursor = self._db.execute(
+                "INSERT INTO jobs (key, handler, params, image, status, submitted_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (key, handler, json.dumps(params), image, now),
+            )
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (now - self.result_ttl,)
+            )
+            self._stats["submitted"] += 1
+            return cursor.lastrowid, False
+
+    def get(self, job_id):
+        """The job as a dict (result and report decoded), or None once it was purged."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, result, artifact, report, error, attempts, waiters, submitted_at, started_at, finished_at,"
+                " (SELECT COUNT(*) FROM jobs AS q WHERE q.status = 'queued' AND q.id < jobs.id)"
+                " FROM jobs WHERE id = ?", (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, status, result, artifact, report, error, attempts, waiters, submitted_at, started_at, finished_at, ahead = row
+        return {
+            "id": job_id,
+            "status": status,
+            "result": json.loads(result) if result is not None else None,
+            "artifact": artifact,
+            "report": json.loads(report) if report else {},
+            "error": error,
+            "attempts": attempts,
+            "waiters": waiters,
+            "ahead": ahead if status == "queued" else 0,
+            "waited_s": (started_at or time.time()) - submitted_at,
+            "elapsed_s": (finished_at or time.time()) - (started_at or time.time()),
+        }
+
+    def requeue_orphans(self, heartbeat_timeout=HEARTBEAT_TIMEOUT):
+        """Running jobs whose worker is gone go back to the queue (or fail after MAX_ATTEMPTS)."""
+        now = time.time()
+        with self._lock, transaction(self._db):
+            workers = {name: (pid, last_seen) for name, pid, last_seen in
+                       self._db.execute("SELECT name, pid, last_seen FROM workers").fetchall()}
+            dead = {name for name, (pid, last_seen) in workers.items()
+                    if now - last_seen > heartbeat_timeout or not _pid_alive(pid)}
+            requeued = 0
+            for job_id, worker, attempts in self._db.execute(
+                    "SELECT id, worker, attempts FROM jobs WHERE status = 'running'").fetchall():
+                if worker in workers and worker not in dead:
+                    continue
+                if attempts >= MAX_ATTEMPTS:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, image = NULL WHERE id = ?",
+                        (f"Worker died {attempts} times while running this job", now, job_id),
+                    )
+                else:
+                    self._db.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE id = ?", (job_id,))
+                    requeued += 1
+            self._db.executemany("DELETE FROM workers WHERE name = ?", [(name,) for name in dead])
+            self._stats["requeued"] += requeued
+        return requeued
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            oldest = self._db.execute("SELECT MIN(submitted_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            workers = self._db.execute(
+                "SELECT name, pid, job_id, started_at, last_seen, busy_seconds, jobs_done FROM workers ORDER BY name"
+            ).fetchall()
+            snapshot = dict(self._stats)
+        snapshot.update({status: counts.get(status, 0) for status in ("queued", "running", "done", "failed")})
+        snapshot["oldest_queued_s"] = round(now - oldest, 1) if oldest else 0.0
+        snapshot["workers"] = [
+            {
+                "name": name,
+                "pid": pid,
+                "job": job_id,
+                "alive": now - last_seen <= HEARTBEAT_TIMEOUT,
+                "jobs_done": jobs_done,
+                # Share of the worker's lifetime spent running jobs
+                "utilization": round(busy_seconds / max(now - started_at, 1e-9), 3),
+            }
+            for name, pid, job_id, started_at, last_seen, busy_seconds, jobs_done in workers
+        ]
+        snapshot["busy"] = sum(1 for w in snapshot["workers"] if w["job"] is not None)
+        return snapshot
+
+#######################################################
+# --- Worker process ---
+
+def _claim(db, name):
+    """Takes the oldest queued job; None when the queue is empty."""
+    now = time.time()
+    with transaction(db):
+        row = db.execute(
+            "SELECT id, handler, params, image, submitted_at FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1"
+        ).fetchone()
+        if row is None:
+            db.execute("UPDATE workers SET last_seen = ? WHERE name = ?", (now, name))
+            return None
+        db.execute(
+            "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+            (name, now, row[0]),
+        )
+        db.execute("UPDATE workers SET job_id = ?, last_seen = ? WHERE name = ?", (row[0], now, name))
+    return row
+
+def _finish(db, name, job_id, busy, result=None, artifact=None, report=None, error=None):
+    now = time.time()
+    with transaction(db):
+        # The image is only needed to run the job: drop it so finished jobs stay small
+        db.execute(
+            "UPDATE jobs SET status = ?, result = ?, artifact = ?, report = ?, error = ?, finished_at = ?, image = NULL"
+            " WHERE id = ? AND worker = ?",
+            ("failed" if error else "done", None if error else json.dumps(result), artifact,
+             json.dumps(report or {}), error, now, job_id, name),
+        )
+        db.execute(
+            "UPDATE workers SET job_id = NULL, last_seen = ?, busy_seconds = busy_seconds + ?, jobs_done = jobs_done + 1"
+            " WHERE name = ?", (now, busy, name),
+        )
+
+def _heartbeat(db_path, name, stop):
+    """Keeps last_seen fresh while a long job runs, on its own connection."""
+    db = connect(db_path)
+    while not stop.wait(HEARTBEAT):
+        db.execute("UPDATE workers SET last_seen = ? WHERE name = ?", (time.time(), name))
+
+_handlers = {}
+
+def _resolve(handler):
+    """'module:function' -> the function, imported once per worker."""
+    if handler not in _handlers:
+        module, function = handler.split(":")
+        _handlers[handler] = getattr(importlib.import_module(module), function)
+    return _handlers[handler]
+
+def worker_main(db_path, name, parent_pid, idle_poll=IDLE_POLL):
+    """Entry point of a worker process: claim, run, store, until the Streamlit process is gone."""
+    db = connect(db_path)
+    now = time.time()
+    db.execute(
+        "INSERT OR REPLACE INTO workers (name, pid, started_at, last_seen) VALUES (?, ?, ?, ?)",
+        (name, os.getpid(), now, now),
+    )
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(db_path, name, stop), daemon=True).start()
+    print(f"Job worker {name} started (pid {os.getpid()})")
+    try:
+        # Orphaned when the server was killed without running its atexit handlers
+        while os.getppid() == parent_pid:
+            row = _claim(db, name)
+            if row is None:
+                time.sleep(idle_poll)
+                continue
+            job_id, handler, params, image, submitted_at = row
+            start = time.perf_counter()
+            try:
+                result, artifact, report = _resolve(handler)(image, dict(json.loads(params), submitted_at=submitted_at))
+                _finish(db, name, job_id, time.perf_counter() - start, result, artifact, report)
+            except Exception as e:
+                # The error is shown on the page: no raw client error text (URLs, keys)
+                error = resilience.describe(e)
+                print(f"Job {job_id} ({handler}) failed: {error}")
+                _finish(db, name, job_id, time.perf_counter() - start, error=error)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        db.execute("DELETE FROM workers WHERE name = ?", (name,))
+
+#######################################################
+# --- Worker pool ---
+
+class WorkerPool:
+    """
+    Runs `workers` worker processes and owns the page-side JobQueue.
+    Workers are plain `python job_queue.py` subprocesses, not multiprocessing
+    children: Streamlit registers the page script as __main__, which spawn would
+    re-run in every child. They share the server's working directory (so
+    st.secrets and relative paths resolve the same), are restarted when they
+    die and stop with the server.
+    """
+    def __init__(self, db_path=DEFAULT_DB, workers=2, result_ttl=RESULT_TTL):
+        self.db_path = db_path
+        self.queue = JobQueue(db_path, result_ttl)
+        # Jobs left running by a previous server go back to the queue
+        requeued = self.queue.requeue_orphans()
+        if requeued:
+            print(f"Requeued {requeued} jobs from a previous run")
+        self._checked_at = time.monotonic()
+        self.restarts = 0
+        self._started = 0
+        self.processes = [self._start(i) for i in range(max(1, int(workers)))]
+        atexit.register(self.shutdown)
+
+    def _start(self, index):
+        # A restarted worker gets a new name, so its predecessor's job is never mistaken for its own
+        self._started += 1
+        return subprocess.Popen([
+            sys.executable, os.path.abspath(__file__), "--db", self.db_path,
+            "--name", f"worker-{os.getpid()}-{index}.{self._started}", "--parent", str(os.getpid()),
+        ])
+
+    def _check(self):
+        """Restarts dead workers and requeues their jobs, at most once per heartbeat."""
+        if time.monotonic() - self._checked_at <= HEARTBEAT:
+            return
+        self._checked_at = time.monotonic()
+        # poll() reaps the dead ones first, so requeue_orphans sees their pids gone
+        dead = [index for index, process in enumerate(self.processes) if process.poll() is not None]
+        self.queue.requeue_orphans()
+        for index in dead:
+            print(f"Job worker {index} exited with {self.processes[index].returncode}, restarting it")
+            self.processes[index] = self._start(index)
+            self.restarts += 1
+
+    def submit(self, handler, key, params, image=None):
+        return self.queue.submit(handler, key, params, image)
+
+    def get(self, job_id):
+        return self.queue.get(job_id)
+
+    def stats(self):
+        self._check()
+        snapshot = self.queue.stats()
+        snapshot["processes"] = len(self.processes)
+        snapshot["processes_alive"] = sum(1 for p in self.processes if p.poll() is None)
+        snapshot["restarts"] = self.restarts
+        return snapshot
+
+    def shutdown(self):
+        for process in self.processes:
+            if process.poll() is None:
+                process.terminate()
+
+@st.cache_resource(show_spinner=False)
+def get_worker_pool(db_path=DEFAULT_DB, workers=2):
+    """One pool of worker processes per server process, shared by both pages."""
+    print(f"Starting {workers} job workers on {db_path}")
+    return WorkerPool(db_path, workers)
+
+def get_configured_pool():
+    """Pool configured from st.secrets (JOB_WORKERS, JOB_QUEUE_DB); None when JOB_WORKERS is 0."""
+    workers = int(st.secrets.get("JOB_WORKERS", DEFAULT_WORKERS))
+    if workers <= 0:
+        return None
+    return get_worker_pool(st.secrets.get("JOB_QUEUE_DB", DEFAULT_DB), workers)
+
+#######################################################
+# --- UI ---
+
+def render_queue_stats(pool):
+    """Sidebar panel: queue depth and worker utilization."""
+    stats = pool.stats()
+    with st.sidebar.expander("Job Queue"):
+        st.caption(
+            f"Queued: {stats['queued']} | Running: {stats['running']} | "
+            f"Workers busy: {stats['busy']}/{stats['processes_alive']} | "
+            f"Coalesced: {stats['coalesced']} | Failed: {stats['failed']}"
+            + (f" | Oldest waiting: {stats['oldest_queued_s']:.0f}s" if stats["queued"] else "")
+        )
+        for worker in stats["workers"]:
+            st.caption(
+                f"{'🟢' if worker['alive'] else '🔴'} {worker['name']}: {worker['utilization']:.0%} busy, "
+                f"{worker['jobs_done']} jobs" + (f", on job {worker['job']}" if worker["job"] is not None else "")
+            )
+
+def render_job_status(job):
+    """Progress line for a queued or running job (inside the page's polling fragment)."""
+    if job["status"] == "queued":
+        position = f"{job['ahead']} jobs ahead" if job["ahead"] else "next in line"
+        st.info(f"⏳ Waiting for a worker ({position}, {job['waited_s']:.0f}s)...")
+    else:
+        retry = f", attempt {job['attempts']}" if job["attempts"] > 1 else ""
+        st.info(f"⚙️ Analyzing on a worker ({job['elapsed_s']:.0f}s{retry})...")
+    if job["waiters"] > 1:
+        st.caption(f"Shared with {job['waiters'] - 1} identical request(s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Job worker process (started by WorkerPool).")
+    parser.add_argument("--db", default=DEFAULT_DB)
+    parser.add_argument("--name", default=f"worker-{os.getpid()}")
+    parser.add_argument("--parent", type=int, default=os.getppid(), help="exit once this process is gone")
+    args = parser.parse_args()
+    # terminate() from the pool: leave through the finally block (a job cut short is requeued)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    worker_main(args.db, args.name, args.parent)
+
+if __name__ == "__main__":
+    main()
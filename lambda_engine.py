@@ -0,0 +1,227 @@
+# Import package
+import asyncio
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from botocore.exceptions import ClientError
+import aws_clients
+from resilience import DeadlineExceeded
+
+#######################################################
+# --- Async Lambda invocation engine ---
+# One asyncio loop per process, on its own thread. Script threads and batch
+# workers submit invocations and get a concurrent.futures.Future back.
+# A global semaphore caps in-flight Lambda calls for the whole process,
+# each call has a timeout, and throttling is retried with jittered backoff.
+# The blocking boto3 call itself runs in a dedicated executor, one thread per
+# slot; a slot is only given back when its thread is free again, so a call that
+# timed out still counts against the cap until boto3 returns.
+# A caller's deadline (time.monotonic(), see resilience.deadline_at) bounds
+# everything: waiting for a slot, each attempt and the throttling backoff.
+# The engine owns throttling retries, so its boto3 client makes a single
+# attempt (CLIENT_OPTIONS); with botocore's own retries on top, one throttling
+# storm would turn into up to (MAX_RETRIES + 1) * AWS_MAX_ATTEMPTS invokes.
+
+MAX_IN_FLIGHT = 8
+CALL_TIMEOUT = 60           # seconds per attempt
+MAX_RETRIES = 4             # extra attempts after throttling
+BASE_DELAY = 0.2            # seconds, doubled every retry
+MAX_DELAY = 5.0
+THROTTLE_CODES = {"TooManyRequestsException", "ThrottlingException", "Throttling", "RequestLimitExceeded"}
+CLIENT_OPTIONS = {"max_attempts": 1}   # overrides aws_clients.configured_options() for the engine's client
+
+def build_payload(bucket, key):
+    return {
+        "S3Object": {
+            "Bucket": bucket,
+            "Name": key
+        }
+    }
+
+def parse_lambda_response(response):
+    """
+    Returns the list of labels from a Lambda invoke response (possibly empty).
+    Raises RuntimeError when Lambda reports an error.
+    """
+    # 1. Read the entire response from Lambda
+    response_payload = json.loads(response["Payload"].read().decode("utf-8"))
+
+    # 2. Check for a successful status code
+    if response_payload.get("statusCode") != 200:
+        # Handle cases where Lambda itself reports an error
+        raise RuntimeError(f"Lambda function returned an error: {response_payload.get('body')}")
+
+    # 3. Get the body, which is a STRING
+    body_content = response_payload.get("body", "[]")
+
+    # 4. Try to parse the string body into a Python list
+    if isinstance(body_content, str):
+        try:
+            # This correctly turns "[]" into []
+            return json.loads(body_content)
+        except json.JSONDecodeError:
+            # If parsing fails, it was an unexpected message. Return empty.
+            print(f"Lambda returned a non-JSON body: {body_content}")
+            return []
+
+    # If body_content is somehow already a list/dict, return it
+    return body_content
+
+def _left(deadline):
+    return None if deadline is None else deadline - time.monotonic()
+
+def is_throttle(error):
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in THROTTLE_CODES
+
+class LambdaEngine:
+    def __init__(self, client, function_name, max_in_flight=MAX_IN_FLIGHT, timeout=CALL_TIMEOUT,
+                 max_retries=MAX_RETRIES, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self.client = client
+        self.function_name = function_name
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="lambda-invoke")
+        self._stats_lock = threading.Lock()
+        self._stats = {"submitted": 0, "in_flight": 0, "completed": 0, "failed": 0, "throttle_retries": 0, "timeouts": 0,
+                       "deadline_exceeded": 0}
+
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        threading.Thread(target=self._loop.run_forever, name="lambda-engine-loop", daemon=True).start()
+
+    def _count(self, name, delta=1):
+        with self._stats_lock:
+            self._stats[name] += delta
+
+    def _invoke_sync(self, payload):
+        response = self.client.invoke(
+            FunctionName=self.function_name,
+            InvocationType="RequestResponse",
+            Payload=json.dumps(payload),
+        )
+        return parse_lambda_response(response)
+
+    def _release_slot(self, call):
+        """Done-callback of the executor call: the slot frees up when boto3 returns, not when the caller gave up."""
+        if not call.cancelled():
+            call.exception()        # retrieved, so an abandoned call's error is not logged as unhandled
+        self._count("in_flight", -1)
+        self._semaphore.release()
+
+    async def _attempt(self, payload, timeout, deadline=None):
+        """
+        One invoke. The timeout starts once a worker thread runs the call, not while
+        it waits for a slot; the deadline covers both.
+        """
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), _left(deadline))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("No free Lambda slot before the deadline") from None
+        self._count("in_flight")
+        started = asyncio.Event()
+
+        def run():
+            self._loop.call_soon_threadsafe(started.set)
+            return self._invoke_sync(payload)
+
+        call = self._loop.run_in_executor(self._executor, run)
+        call.add_done_callback(self._release_slot)
+        await started.wait()
+        left = _left(deadline)
+        try:
+            # shield: on timeout the thread is still blocked in client.invoke and keeps its slot until it returns
+            return await asyncio.wait_for(asyncio.shield(call), timeout if left is None else min(timeout, max(left, 0)))
+        except asyncio.TimeoutError:
+            if left is not None and left < timeout:
+                raise DeadlineExceeded("Lambda call still running at the deadline") from None
+            raise
+
+    async def invoke_async(self, bucket, key, timeout=None, on_retry=None, deadline=None):
+        """
+        Coroutine for code already running on the engine loop.
+        on_retry() is called before every throttling retry (e.g. to count it in a trace).
+        deadline (time.monotonic()) stops the call, retries and backoff included.
+        """
+        timeout = timeout or self.timeout
+        payload = build_payload(bucket, key)
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await self._attempt(payload, timeout, deadline)
+                self._count("completed")
+                return result
+            except DeadlineExceeded:
+                self._count("deadline_exceeded")
+                self._count("failed")
+                raise
+            except asyncio.TimeoutError:
+                self._count("timeouts")
+                self._count("failed")
+                raise TimeoutError(f"Lambda call timed out after {timeout}s")
+            except ClientError as e:
+                if not is_throttle(e) or attempt == self.max_retries:
+                    self._count("failed")
+                    raise
+                # Full jitter: spread retries so throttled callers don't retry in lockstep
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                left = _left(deadline)
+                if left is not None and delay >= left:
+                    self._count("deadline_exceeded")
+                    self._count("failed")
+                    raise DeadlineExceeded("No time left to retry the throttled Lambda call") from e
+                self._count("throttle_retries")
+                if on_retry is not None:
+                    on_retry()
+                await asyncio.sleep(delay)
+            except Exception:
+                self._count("failed")
+                raise
+
+    def submit(self, bucket, key, timeout=None, on_retry=None, deadline=None):
+        """Schedules an invocation from any thread; returns a concurrent.futures.Future."""
+        self._count("submitted")
+        return asyncio.run_coroutine_threadsafe(self.invoke_async(bucket, key, timeout, on_retry, deadline), self._loop)
+
+    def invoke(self, bucket, key, timeout=None, on_retry=None, deadline=None):
+        """Blocking convenience wrapper: submit and wait for the result, never past the deadline."""
+        future = self.submit(bucket, key, timeout, on_retry, deadline)
+        left = _left(deadline)
+        try:
+            # The coroutine stops at the deadline itself; this only bounds the wait for it
+            return future.result(None if left is None else max(left, 0) + 1)
+        except TimeoutError:
+            if future.done():
+                raise
+            future.cancel()
+            raise DeadlineExceeded("Lambda call still running at the deadline") from None
+
+    def stats(self):
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot["max_in_flight"] = self.max_in_flight
+        return snapshot
+
+@st.cache_resource(show_spinner=False)
+def get_lambda_engine(_client, function_name, max_in_flight=MAX_IN_FLIGHT, timeout=CALL_TIMEOUT, client_settings=None):
+    """
+    One engine (and one in-flight cap) per function per process.
+    client_settings (aws_clients.configured_settings) keys the cache: the client itself is not hashed.
+    """
+    return LambdaEngine(_client, function_name, max_in_flight=max_in_flight, timeout=timeout)
+
+def get_configured_engine():
+    """
+    Engine for LAMBDA_FUNCTION_NAME (LAMBDA_MAX_IN_FLIGHT, LAMBDA_CALL_TIMEOUT) with the
+    configured Lambda client, minus botocore's retries (CLIENT_OPTIONS).
+    """
+    return get_lambda_engine(
+        aws_clients.get_configured_client("lambda", **CLIENT_OPTIONS), st.secrets["LAMBDA_FUNCTION_NAME"],
+        max_in_flight=int(st.secrets.get("LAMBDA_MAX_IN_FLIGHT", MAX_IN_FLIGHT)),
+        timeout=float(st.secrets.get("LAMBDA_CALL_TIMEOUT", CALL_TIMEOUT)),
+        client_settings=aws_clients.configured_settings("lambda", **CLIENT_OPTIONS),
+    )
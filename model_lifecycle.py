@@ -0,0 +1,147 @@
+# Import package
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+
+#######################################################
+# --- Non-blocking model start/stop ---
+# Start/stop run in a small process-wide executor instead of the Streamlit
+# script thread. Progress is published to an in-process store that pages read
+# without blocking, and concurrent clicks share the one in-flight operation.
+
+POLL_INTERVAL = 15          # seconds between describe calls while waiting
+OPERATION_TIMEOUT = 30 * 60 # the waiters used to give up after 30 minutes
+TARGET_STATUS = {"start": "RUNNING", "stop": "STOPPED"}
+FAILED_STATUSES = {"FAILED", "TRAINING_FAILED", "DELETING", "EXPIRED", "DEPRECATED"}
+
+def describe_model(client, project_arn, version_name):
+    """Returns (status, message) for one model version. Raises on API errors."""
+    describe_response = client.describe_project_versions(
+        ProjectArn=project_arn,
+        VersionNames=[version_name]
+    )
+    if not describe_response['ProjectVersionDescriptions']:
+        return 'NOT_FOUND', 'Model version not found.'
+    model = describe_response['ProjectVersionDescriptions'][0]
+    return model['Status'], model.get('StatusMessage', 'No status message.')
+
+class Operation:
+    """One start or stop request and its progress."""
+    def __init__(self, action, model_arn, project_arn, version_name):
+        self.action = action
+        self.model_arn = model_arn
+        self.project_arn = project_arn
+        self.version_name = version_name
+        self.state = "running"      # running -> succeeded | failed
+        self.message = f"{action.capitalize()} requested."
+        self.started_at = time.time()
+        self.finished_at = None
+        self.future = None
+
+    @property
+    def done(self):
+        return self.state != "running"
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    def finish(self, success, message):
+        self.state = "succeeded" if success else "failed"
+        self.message = message
+        self.finished_at = time.time()
+
+class ModelLifecycle:
+    def __init__(self, max_workers=2, poll_interval=POLL_INTERVAL, timeout=OPERATION_TIMEOUT):
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-lifecycle")
+        self._lock = threading.Lock()
+        self._operations = {}   # model_arn -> latest Operation
+        self._status = {}       # model_arn -> (status, message, observed_at)
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """callback(operation, status, message) is called on every published status."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def publish_status(self, op, status, message):
+        with self._lock:
+            self._status[op.model_arn] = (status, message, time.time())
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback(op, status, message)
+
+    def latest_status(self, model_arn):
+        """Last status seen by the background poller: (status, message, observed_at) or None."""
+        with self._lock:
+            return self._status.get(model_arn)
+
+    def current(self, model_arn):
+        """The latest operation for this model (running or finished), or None."""
+        with self._lock:
+            return self._operations.get(model_arn)
+
+    def in_flight(self, model_arn):
+        op = self.current(model_arn)
+        return op if op is not None and not op.done else None
+
+    def request(self, action, client, project_arn, model_arn, version_name, min_inference_units=None):
+        """
+        Submits a start/stop in the background and returns (operation, is_new).
+        If an operation is already running for this model, that one is returned
+        instead of issuing a duplicate API call.
+        """
+        with self._lock:
+            op = self._operations.get(model_arn)
+            if op is not None and not op.done:
+                return op, False
+            op = Operation(action, model_arn, project_arn, version_name)
+            self._operations[model_arn] = op
+            op.future = self._executor.submit(self._run, op, client, min_inference_units)
+        return op, True
+
+    def _run(self, op, client, min_inference_units):
+        target = TARGET_STATUS[op.action]
+        try:
+            print(f"{op.action.capitalize()} model: {op.model_arn}")
+            if op.action == "start":
+                client.start_project_version(ProjectVersionArn=op.model_arn, MinInferenceUnits=min_inference_units)
+            else:
+                client.stop_project_version(ProjectVersionArn=op.model_arn)
+
+            # Poll instead of a waiter, so every intermediate status is published
+            deadline = op.started_at + self.timeout
+            while True:
+                status, message = describe_model(client, op.project_arn, op.version_name)
+                self.publish_status(op, status, message)
+                op.message = f"Model is {status}."
+                if status == target:
+                    op.finish(True, f"Model {'started' if op.action == 'start' else 'stopped'} successfully.")
+                    return
+                if status in FAILED_STATUSES:
+                    op.finish(False, f"Model ended in {status}: {message}")
+                    return
+                if time.time() > deadline:
+                    op.finish(False, f"Timed out after {self.timeout // 60} minutes waiting for {target}.")
+                    return
+                time.sleep(self.poll_interval)
+        except Exception as e:
+            print(e)
+            op.finish(False, str(e))
+
+@st.cache_resource(show_spinner=False)
+def get_lifecycle(_status_cache=None):
+    """
+    One lifecycle manager per process, shared by every session.
+    Statuses seen while polling are pushed into the shared status cache, so
+    pages pick them up without another describe call.
+    """
+    lifecycle = ModelLifecycle()
+    if _status_cache is not None:
+        lifecycle.add_listener(
+            lambda op, status, message: _status_cache.put((op.project_arn, op.version_name), (status, message))
+        )
+    return lifecycle
@@ -0,0 +1,218 @@
+# Import package
+import ast
+import io
+import os
+import threading
+import streamlit as st
+from PIL import Image
+from warmup import LazyModule
+
+np = LazyModule("numpy")
+
+#######################################################
+# --- Local ONNX inference backend ---
+# Runs an exported ONNX version of ROBOFLOW_MODEL on CPU with onnxruntime,
+# so an analysis doesn't need a round trip to the hosted API.
+# Expects a YOLOv8-style detection head (the usual Roboflow/Ultralytics export):
+# one output of shape (1, 4 + classes, anchors) with center x/y, width, height
+# in input pixels followed by one score per class ((1, anchors, 4 + classes) works too).
+# Results use the hosted API's {'predictions': [...]} shape, so the drawing
+# and DataFrame code don't care which backend answered.
+# onnxruntime is optional: it is only imported when this backend is used.
+
+DEFAULT_INPUT_SIZE = 640
+CONFIDENCE_THRESHOLD = 0.4      # same default as the hosted API
+IOU_THRESHOLD = 0.5
+MAX_DETECTIONS = 300
+INTRA_OP_THREADS = 0            # 0 = one thread per physical core
+PAD_VALUE = 114                 # YOLO letterbox grey
+
+def letterbox(image, size):
+    """
+    Resizes keeping the aspect ratio and pads to a size x size square.
+    Returns the (1, 3, size, size) float32 input, the scale and the (x, y) padding.
+    """
+    w, h = image.size
+    scale = min(size / w, size / h)
+    new_w, new_h = max(1, round(w * scale)), max(1, round(h * scale))
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+
+    canvas = np.full((size, size, 3), PAD_VALUE, dtype=np.uint8)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = np.asarray(image.resize((new_w, new_h), Image.Resampling.BILINEAR))
+    # HWC uint8 -> NCHW float32 in [0, 1]
+    tensor = canvas.transpose(2, 0, 1)[np.newaxis].astype(np.float32) / 255.0
+    return tensor, scale, (pad_x, pad_y)
+
+def nms(boxes, scores, class_ids, iou_threshold=IOU_THRESHOLD, max_detections=MAX_DETECTIONS):
+    """
+    Class-aware greedy non-maximum suppression on (x1, y1, x2, y2) boxes.
+    Offsetting each class by a large constant keeps boxes of different classes
+    from suppressing each other, so one pass handles every class.
+    Returns the kept indices, best score first.
+    """
+    offset = class_ids[:, np.newaxis] * (boxes.max() + 1)
+    shifted = boxes + offset
+    areas = (shifted[:, 2] - shifted[:, 0]) * (shifted[:, 3] - shifted[:, 1])
+    order = np.argsort(-scores)
+
+    keep = []
+    while order.size and len(keep) < max_detections:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        x1 = np.maximum(shifted[best, 0], shifted[rest, 0])
+        y1 = np.maximum(shifted[best, 1], shifted[rest, 1])
+        x2 = np.minimum(shifted[best, 2], shifted[rest, 2])
+        y2 = np.minimum(shifted[best, 3], shifted[rest, 3])
+        inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        iou = inter / (areas[best] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+def model_class_names(session):
+    """Class names from the export metadata (Ultralytics writes names={0: 'mild', ...})."""
+    names = session.get_modelmeta().custom_metadata_map.get("names")
+    if not names:
+        return None
+    parsed = ast.literal_eval(names)
+    return [parsed[i] for i in sorted(parsed)] if isinstance(parsed, dict) else list(parsed)
+
+class LocalOnnxModel:
+    def __init__(self, model_path, class_names=None, confidence_threshold=CONFIDENCE_THRESHOLD,
+                 iou_threshold=IOU_THRESHOLD, max_detections=MAX_DETECTIONS, intra_op_threads=INTRA_OP_THREADS):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError("The local ONNX backend needs onnxruntime (pip install onnxruntime).") from e
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = int(intra_op_threads)
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        size = model_input.shape[-1]
+        self.input_size = size if isinstance(size, int) else DEFAULT_INPUT_SIZE   # dynamic axes are named, not sized
+        self.class_names = list(class_names or model_class_names(self.session) or [])
+        self.confidence_threshold = confidence_threshold
+        self.iou_threshold = iou_threshold
+        self.max_detections = max_detections
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "failed": 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def class_name(self, class_id):
+        return self.class_names[class_id] if class_id < len(self.class_names) else str(class_id)
+
+    def _decode(self, output, scale, pad, image_size):
+        """Raw head output -> predictions in original-image pixels (center x/y, width, height)."""
+        output = np.squeeze(output, axis=0)
+        channels = 4 + len(self.class_names) if self.class_names else min(output.shape)
+        if output.shape[0] != channels:
+            output = output.T               # (anchors, 4 + classes) -> (4 + classes, anchors)
+        class_scores = output[4:]
+        class_ids = class_scores.argmax(axis=0)
+        scores = class_scores[class_ids, np.arange(class_scores.shape[1])]
+        mask = scores >= self.confidence_threshold
+        if not mask.any():
+            return []
+
+        cx, cy, w, h = output[:4, mask]
+        class_ids, scores = class_ids[mask], scores[mask]
+        # Undo the letterbox: remove padding, then scale back to the original size
+        x1 = (cx - w / 2 - pad[0]) / scale
+        y1 = (cy - h / 2 - pad[1]) / scale
+        x2 = (cx + w / 2 - pad[0]) / scale
+        y2 = (cy + h / 2 - pad[1]) / scale
+        boxes = np.stack([x1, y1, x2, y2], axis=1)
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, image_size[0])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, image_size[1])
+
+        keep = nms(boxes, scores, class_ids, self.iou_threshold, self.max_detections)
+        predictions = []
+        for (bx1, by1, bx2, by2), score, class_id in zip(boxes[keep].tolist(), scores[keep].tolist(), class_ids[keep].tolist()):
+            predictions.append({
+                "x": (bx1 + bx2) / 2, "y": (by1 + by2) / 2,
+                "width": bx2 - bx1, "height": by2 - by1,
+                "confidence": score,
+                "class": self.class_name(class_id),
+                "class_id": class_id,
+            })
+        return predictions
+
+    def infer(self, image, model_id=None):
+        """
+        Same call and result shape as the hosted client: encoded bytes, a PIL
+        image or an RGB array in, {'predictions': [...]} in pixels of that image out.
+        Thread safe (onnxruntime sessions can run concurrently), no st.* calls.
+        """
+        self._count("requests")
+        try:
+            if isinstance(image, (bytes, bytearray)):
+                image = Image.open(io.BytesIO(image))
+            elif isinstance(image, np.ndarray):
+                image = Image.fromarray(image)
+            image = image.convert("RGB")
+            tensor, scale, pad = letterbox(image, self.input_size)
+            output = self.session.run(None, {self.input_name: tensor})[0]
+            return {
+                "image": {"width": image.size[0], "height": image.size[1]},
+                "predictions": self._decode(output, scale, pad, image.size),
+            }
+        except Exception:
+            self._count("failed")
+            raise
+
+    def infer_batch(self, images, model_id=None):
+        """
+        Same interface as RoboflowClient.infer_batch. Images run one after another:
+        each run already uses every intra-op thread.
+        """
+        for index, image in enumerate(images):
+            try:
+                yield index, self.infer(image, model_id), None
+            except Exception as e:
+                yield index, None, e
+
+    def stats(self):
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot["input_size"] = self.input_size
+        snapshot["classes"] = len(self.class_names)
+        return snapshot
+
+@st.cache_resource(show_spinner=False)
+def get_onnx_model(model_path, class_names=None, confidence_threshold=CONFIDENCE_THRESHOLD,
+                   max_detections=MAX_DETECTIONS, intra_op_threads=INTRA_OP_THREADS, mtime=None):
+    """One onnxruntime session per model file per process (mtime reloads a re-exported file)."""
+    print(f"Loading ONNX model: {model_path}")
+    return LocalOnnxModel(
+        model_path, class_names=class_names, confidence_threshold=confidence_threshold,
+        max_detections=max_detections, intra_op_threads=intra_op_threads,
+    )
+
+def load_onnx_model(model_path, class_names=None, confidence_threshold=None, max_detections=None,
+                    intra_op_threads=INTRA_OP_THREADS):
+    """Cached model for the file as it is on disk now; None settings use the backend defaults."""
+    return get_onnx_model(
+        model_path,
+        tuple(class_names) if class_names else None,
+        CONFIDENCE_THRESHOLD if confidence_threshold is None else float(confidence_threshold),
+        MAX_DETECTIONS if max_detections is None else int(max_detections),
+        int(intra_op_threads),
+        os.path.getmtime(model_path),
+    )
+
+def load_configured_model():
+    """Model configured from st.secrets (ONNX_MODEL_PATH, ONNX_CLASS_NAMES, ONNX_INTRA_OP_THREADS, ROBOFLOW_CONFIDENCE, ...)."""
+    return load_onnx_model(
+        st.secrets["ONNX_MODEL_PATH"],
+        class_names=st.secrets.get("ONNX_CLASS_NAMES"),         # only if the export has no names metadata
+        confidence_threshold=st.secrets.get("ROBOFLOW_CONFIDENCE"),
+        max_detections=st.secrets.get("ROBOFLOW_MAX_DETECTIONS"),
+        intra_op_threads=int(st.secrets.get("ONNX_INTRA_OP_THREADS", INTRA_OP_THREADS)),
+    )
@@ -0,0 +1,100 @@
+# Import package
+import statistics
+import threading
+from collections import defaultdict, deque
+import streamlit as st
+import resilience
+import tracing
+
+#######################################################
+# --- Rekognition inference backends ---
+# "lambda":       upload to S3 -> Lambda -> Rekognition (three hops, the original path)
+# "direct-s3":    upload to S3 -> DetectCustomLabels on the S3 object (no Lambda hop)
+# "direct-bytes": DetectCustomLabels with the image bytes (no S3, no Lambda)
+# All of them return the same list of CustomLabels the Lambda returns.
+
+BACKENDS = ("lambda", "direct-bytes", "direct-s3")
+MAX_IMAGE_BYTES = 5 * 1024 * 1024   # Rekognition limit for Image={'Bytes': ...}
+
+# Size buckets for the latency comparison
+SIZE_BUCKETS = [(256 * 1024, "< 256 KB"), (1024 * 1024, "256 KB - 1 MB"), (MAX_IMAGE_BYTES, "1 - 5 MB"), (float("inf"), "> 5 MB")]
+
+def resolve_backend(backend, image_size):
+    """direct-bytes can't take images over the Bytes limit; those go through S3 instead."""
+    if backend == "direct-bytes" and image_size > MAX_IMAGE_BYTES:
+        return "direct-s3"
+    return backend
+
+def sync_inference_circuits(status):
+    """
+    Inference fails for everyone while the model is not RUNNING: open its
+    circuits so calls fail fast instead of one by one. ERROR means the status
+    itself is unknown, so the circuits are left as they are. Breakers are per
+    process: the page calls this with every status it reads, job workers with
+    the status the job was submitted with.
+    """
+    for backend in ("rekognition", "lambda"):
+        if status == 'RUNNING':
+            resilience.breaker(backend).release()
+        elif status not in (None, 'ERROR'):
+            resilience.breaker(backend).force_open(f"model is {status}")
+
+def _detect(client, model_arn, image, min_confidence):
+    kwargs = {"ProjectVersionArn": model_arn, "Image": image}
+    if min_confidence is not None:
+        kwargs["MinConfidence"] = float(min_confidence)
+    response = client.detect_custom_labels(**kwargs)
+    # botocore retries (throttling, 5xx) are invisible otherwise
+    tracing.add(retries=response.get("ResponseMetadata", {}).get("RetryAttempts", 0))
+    return response.get("CustomLabels", [])
+
+def detect_from_bytes(client, model_arn, image_bytes, min_confidence=None):
+    """DetectCustomLabels on raw image bytes (<= 5 MB)."""
+    tracing.add(bytes_sent=len(image_bytes))
+    return _detect(client, model_arn, {"Bytes": image_bytes}, min_confidence)
+
+def detect_from_s3(client, model_arn, bucket, key, min_confidence=None):
+    """DetectCustomLabels on an object that is already in S3."""
+    return _detect(client, model_arn, {"S3Object": {"Bucket": bucket, "Name": key}}, min_confidence)
+
+def size_bucket(size):
+    for limit, name in SIZE_BUCKETS:
+        if size < limit:
+            return name
+    return SIZE_BUCKETS[-1][1]
+
+class LatencyTracker:
+    """Recent end-to-end latencies per (backend, image size bucket), shared by every session."""
+    def __init__(self, window=200):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, backend, image_size, seconds):
+        with self._lock:
+            self._samples[(backend, size_bucket(image_size))].append(seconds * 1000)
+
+    def table(self):
+        """One row per (backend, size bucket) with count, p50 and mean in ms."""
+        with self._lock:
+            samples = {k: list(v) for k, v in self._samples.items()}
+        order = {name: i for i, (_, name) in enumerate(SIZE_BUCKETS)}
+        rows = []
+        for (backend, bucket), values in sorted(samples.items(), key=lambda kv: (order[kv[0][1]], kv[0][0])):
+            rows.append({
+                "size": bucket,
+                "backend": backend,
+                "count": len(values),
+                "p50_ms": round(statistics.median(values), 1),
+                "mean_ms": round(statistics.fmean(values), 1),
+            })
+        return rows
+
+    def fastest(self, image_size):
+        """Backend with the lowest median for this size bucket, or None without data."""
+        bucket = size_bucket(image_size)
+        best = [r for r in self.table() if r["size"] == bucket]
+        return min(best, key=lambda r: r["p50_ms"])["backend"] if best else None
+
+@st.cache_resource(show_spinner=False)
+def get_latency_tracker():
+    return LatencyTracker()
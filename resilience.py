@@ -0,0 +1,421 @@
+# Import package
+import contextvars
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+import streamlit as st
+import tracing
+
+#######################################################
+# --- Retries, circuit breakers and deadlines for remote calls ---
+# Remote calls go through call(backend, fn, ...):
+# - Errors are classified. Throttling and transient network/5xx errors are
+#   retried with full-jitter exponential backoff (or the server's
+#   Retry-After). Client errors are never retried.
+# - Retries draw from a per-backend quota that successful calls refill.
+#   When a backend fails for everyone, retries stop before they pile up
+#   (the same idea as botocore's retry quota).
+# - A per-backend circuit breaker opens after consecutive failures, or at
+#   once when the backend reports it is not ready (a STOPPED Rekognition
+#   model). While open, calls fail fast. After recovery_timeout a single
+#   probe call decides whether it closes again.
+# - deadline(seconds) covers every call and retry inside the block.
+#   Backoff never sleeps past the deadline, and timeouts are clamped to
+#   it with clamp_timeout().
+# boto3 clients already retry on their own (aws_clients.py, adaptive mode),
+# except Lambda's: lambda_engine retries throttling on its loop and gives
+# its client a single attempt. AWS backends therefore
+# get one attempt here: breaker, deadline and metrics only.
+
+THROTTLE_CODES = {"TooManyRequestsException", "ThrottlingException", "Throttling", "RequestLimitExceeded",
+                  "ProvisionedThroughputExceededException", "SlowDown"}
+TRANSIENT_CODES = {"InternalServerError", "InternalFailure", "ServiceUnavailable", "ServiceUnavailableException",
+                   "RequestTimeout", "RequestTimeoutException"}
+UNAVAILABLE_CODES = {"ResourceNotReadyException"}      # e.g. detect on a model that is not RUNNING
+# Connection-level errors of botocore and requests, matched by class name so neither is imported here
+NETWORK_ERRORS = {"EndpointConnectionError", "ConnectTimeoutError", "ReadTimeoutError", "ConnectionClosedError",
+                  "ConnectionError", "Timeout", "ChunkedEncodingError"}
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend whose circuit is open."""
+    def __init__(self, backend, reason, retry_in):
+        self.backend = backend
+        self.retry_in = retry_in
+        super().__init__(f"{backend} is unavailable ({reason}); not calling it for another {retry_in:.0f}s")
+
+class DeadlineExceeded(TimeoutError):
+    """The deadline of the surrounding deadline() block passed before the call could finish."""
+
+class Policy:
+    def __init__(self, max_attempts=3, base_delay=0.2, max_delay=5.0,
+                 failure_threshold=5, recovery_timeout=30.0, retry_quota=50):
+        self.max_attempts = max(1, int(max_attempts))   # including the first call
+        self.base_delay = base_delay                    # seconds, doubled every retry
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold      # consecutive failures that open the circuit
+        self.recovery_timeout = recovery_timeout        # seconds open before a probe call is let through
+        self.retry_quota = retry_quota                  # retry tokens, see RetryQuota
+
+DEFAULT_POLICY = Policy()
+POLICIES = {
+    # boto3 retries these itself: one attempt here
+    "s3": Policy(max_attempts=1),
+    "rekognition": Policy(max_attempts=1),
+    "lambda": Policy(max_attempts=1),
+    # Status must stay readable while inference is down, so it has its own breaker
+    "model-status": Policy(max_attempts=1, failure_threshold=3, recovery_timeout=10.0),
+    # Plain HTTP: nothing else retries it
+    "roboflow": Policy(max_attempts=3),
+}
+
+# What describe() shows instead of the text of a remote error
+KIND_MESSAGES = {
+    "throttle": "rate limited, try again shortly",
+    "transient": "temporarily unavailable",
+    "unavailable": "not ready",
+    "server": "the backend reported an error",
+    "fatal": "the request was rejected",
+}
+
+def _code_and_status(error):
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):              # botocore ClientError
+        code = response.get("Error", {}).get("Code", "")
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+    else:                                       # requests HTTPError (or no response at all)
+        code, status = "", getattr(response, "status_code", 0) or 0
+    return code, status
+
+def classify(error):
+    """
+    'throttle' and 'transient' are retried. 'transient', 'server' and
+    'unavailable' count against the circuit breaker ('unavailable' opens it
+    at once). 'fatal' (bad request, access denied...) is neither.
+    """
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+        return "fatal"
+    code, status = _code_and_status(error)
+    names = {cls.__name__ for cls in type(error).__mro__}
+
+    if code in THROTTLE_CODES or status == 429:
+        return "throttle"
+    if code in UNAVAILABLE_CODES or any(c in str(error) for c in UNAVAILABLE_CODES):
+        return "unavailable"
+    if code in TRANSIENT_CODES or status >= 500 or names & NETWORK_ERRORS or isinstance(error, TimeoutError):
+        return "transient"
+    if isinstance(error, RuntimeError) and not code:
+        return "server"                         # e.g. the Lambda function reported an error
+    return "fatal"
+
+def describe(error):
+    """
+    One line about an error that is safe to show every user: for errors of
+    remote clients, the class, error code, HTTP status and a generic message.
+    Their text is left out because it can quote the request URL, query string
+    (api_key) included. Errors raised by our own code keep their message.
+    """
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if not (hasattr(error, "response") or hasattr(error, "request") or names & NETWORK_ERRORS):
+        return f"{type(error).__name__}: {error}"
+    code, status = _code_and_status(error)
+    # botocore names some exception classes after their error code
+    detail = " ".join(part for part in (code if code != type(error).__name__ else "", f"({status})" if status else "") if part)
+    return f"{type(error).__name__}{' ' + detail if detail else ''}: {KIND_MESSAGES[classify(error)]}"
+
+def retry_after(error):
+    """Seconds from an HTTP Retry-After header, if the error carries one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+#######################################################
+# --- Deadlines ---
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+@contextmanager
+def deadline(seconds):
+    """Every call() in the block must finish within `seconds`; a nested deadline never extends an outer one."""
+    if seconds is None:
+        yield
+        return
+    end = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(min(end, outer) if outer is not None else end)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining():
+    """Seconds left before the current deadline, or None without one."""
+    end = _deadline.get()
+    return None if end is None else max(0.0, end - time.monotonic())
+
+def deadline_at():
+    """The current deadline as a time.monotonic() value, for code that runs the call on another thread; None without one."""
+    return _deadline.get()
+
+def clamp_timeout(timeout):
+    """A per-request timeout that does not outlive the current deadline."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("Deadline passed before the call was made")
+    return min(timeout, left) if timeout else left
+
+#######################################################
+# --- Breaker, quota, registry ---
+
+class CircuitBreaker:
+    """closed -> open (fail fast) -> half-open after recovery_timeout: one probe call closes or reopens it."""
+    def __init__(self, name, failure_threshold, recovery_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.reason = None
+        self.opened_at = None
+        self.open_for = recovery_timeout
+        self.times_opened = 0
+        self.forced = False             # open because the backend is known not to be ready: release() may close it
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raises CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            if self.state == "open":
+                wait = self.opened_at + self.open_for - time.monotonic()
+                if wait > 0:
+                    raise CircuitOpenError(self.name, self.reason, wait)
+                self.state = "half-open"
+                self._probing = False
+            if self.state == "half-open":
+                if self._probing:
+                    raise CircuitOpenError(self.name, f"{self.reason}, probe in progress", 0)
+                self._probing = True
+
+    def success(self):
+        with self._lock:
+            self._close()
+
+    def failure(self, reason, immediate=False):
+        with self._lock:
+            self.failures += 1
+            if immediate or self.state == "half-open" or self.failures >= self.failure_threshold:
+                self._open(reason, self.recovery_timeout)
+                self.forced = immediate
+
+    def force_open(self, reason, seconds=None):
+        """Opens the circuit from outside, e.g. when the model status says it is not running."""
+        with self._lock:
+            if self.state != "open" or self.reason != reason:
+                self._open(reason, self.recovery_timeout if seconds is None else seconds)
+            self.forced = True
+
+    def release(self):
+        """Closes a circuit opened because the backend was not ready; one opened by failing calls stays open."""
+        with self._lock:
+            if self.forced:
+                self._close()
+
+    def _close(self):
+        self.state = "closed"
+        self.failures = 0
+        self.reason = None
+        self.forced = False
+        self._probing = False
+
+    def _open(self, reason, seconds):
+        if self.state != "open":
+            self.times_opened += 1
+            print(f"Circuit '{self.name}' opened: {reason}")
+        self.state = "open"
+        self.reason = reason
+        self.opened_at = time.monotonic()
+        self.open_for = seconds
+        self._probing = False
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = max(0.0, self.opened_at + self.open_for - time.monotonic()) if self.state == "open" else 0.0
+            return {"state": self.state, "reason": self.reason, "failures": self.failures,
+                    "opened": self.times_opened, "retry_in_s": round(retry_in, 1)}
+
+class RetryQuota:
+    """
+    Token bucket shared by all callers of a backend: a retry costs 5 tokens
+    (10 after a timeout), a success gives one back. An empty bucket means no
+    retries until calls start succeeding again.
+    """
+    RETRY_COST = 5
+    TIMEOUT_COST = 10
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.tokens = capacity
+        self._lock = threading.Lock()
+
+    def acquire(self, error):
+        cost = self.TIMEOUT_COST if isinstance(error, TimeoutError) else self.RETRY_COST
+        with self._lock:
+            if self.tokens < cost:
+                return False
+            self.tokens -= cost
+            return True
+
+    def refill(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+class Resilience:
+    """Per-backend policies, breakers, retry quotas and counters for one process."""
+    COUNTERS = ("calls", "ok", "failed", "retries", "rejected", "deadline_exceeded", "quota_exhausted")
+
+    def __init__(self, policies=None, default_policy=DEFAULT_POLICY):
+        self.policies = dict(POLICIES if policies is None else policies)
+        self.default_policy = default_policy
+        self._lock = threading.Lock()
+        self._breakers = {}
+        self._quotas = {}
+        self._stats = defaultdict(lambda: dict.fromkeys(self.COUNTERS, 0))
+
+    def policy(self, backend):
+        return self.policies.get(backend, self.default_policy)
+
+    def configure(self, backend, policy):
+        """Replaces a backend's policy and starts it over with a closed breaker, a full quota and zeroed counters."""
+        with self._lock:
+            self.policies[backend] = policy
+            self._breakers.pop(backend, None)
+            self._quotas.pop(backend, None)
+            self._stats.pop(backend, None)
+
+    def breaker(self, backend):
+        with self._lock:
+            if backend not in self._breakers:
+                policy = self.policy(backend)
+                self._breakers[backend] = CircuitBreaker(backend, policy.failure_threshold, policy.recovery_timeout)
+            return self._breakers[backend]
+
+    def _quota(self, backend):
+        with self._lock:
+            if backend not in self._quotas:
+                self._quotas[backend] = RetryQuota(self.policy(backend).retry_quota)
+            return self._quotas[backend]
+
+    def _count(self, backend, name):
+        with self._lock:
+            self._stats[backend][name] += 1
+
+    def call(self, backend, fn, *args, **kwargs):
+        """
+        fn(*args, **kwargs) with retries, the backend's breaker and the
+        current deadline. Thread safe, no st.* calls.
+        """
+        policy, breaker, quota = self.policy(backend), self.breaker(backend), self._quota(backend)
+        self._count(backend, "calls")
+        attempt = 0
+        while True:
+            left = remaining()
+            if left is not None and left <= 0:
+                self._count(backend, "deadline_exceeded")
+                raise DeadlineExceeded(f"{backend}: deadline passed after {attempt} attempt(s)")
+            try:
+                breaker.allow()
+            except CircuitOpenError:
+                self._count(backend, "rejected")
+                raise
+
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                kind = classify(e)
+                if kind in ("transient", "server", "unavailable"):
+                    # The reason is shown to every session in the sidebar: never the raw error text
+                    breaker.failure(describe(e)[:200], immediate=kind == "unavailable")
+                else:
+                    # Throttled or rejected as a bad request: the backend itself is up
+                    breaker.success()
+
+                if kind not in ("throttle", "transient") or attempt + 1 >= policy.max_attempts:
+                    self._count(backend, "failed")
+                    raise
+                if not quota.acquire(e):
+                    self._count(backend, "quota_exhausted")
+                    self._count(backend, "failed")
+                    raise
+                # Full jitter, unless the server said how long to wait
+                delay = retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(policy.max_delay, policy.base_delay * 2 ** attempt))
+                left = remaining()
+                if left is not None and delay >= left:
+                    self._count(backend, "deadline_exceeded")
+                    self._count(backend, "failed")
+                    raise DeadlineExceeded(f"{backend}: no time left to retry after {type(e).__name__}") from e
+                self._count(backend, "retries")
+                tracing.add(retries=1)
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            breaker.success()
+            quota.refill()
+            self._count(backend, "ok")
+            return result
+
+    def stats(self):
+        """Counters and breaker state per backend that has been used."""
+        with self._lock:
+            names = sorted(set(self._stats) | set(self._breakers))
+            counters = {name: dict(self._stats[name]) for name in names}
+            quotas = {name: q.tokens for name, q in self._quotas.items()}
+        return {
+            name: {**counters[name], **self.breaker(name).snapshot(), "retry_tokens": quotas.get(name)}
+            for name in names
+        }
+
+# One registry per process: module globals survive reruns, and thread-safe
+# cores deep in other modules (roboflow_client) can use it without a handle.
+_registry = Resilience()
+
+def get_registry():
+    return _registry
+
+def call(backend, fn, *args, **kwargs):
+    """Resilience.call on the process-wide registry."""
+    return _registry.call(backend, fn, *args, **kwargs)
+
+def breaker(backend):
+    return _registry.breaker(backend)
+
+def stats():
+    return _registry.stats()
+
+#######################################################
+# --- UI ---
+
+STATE_ICONS = {"closed": "🟢", "half-open": "🟡", "open": "🔴"}
+
+def render_resilience_stats():
+    """Sidebar panel: breaker state and retry counters per backend."""
+    with st.sidebar.expander("Resilience"):
+        backends = stats()
+        if not backends:
+            st.caption("No remote calls yet.")
+        for name, s in backends.items():
+            st.caption(
+                f"{STATE_ICONS[s['state']]} **{name}**: {s['ok']}/{s['calls']} ok | Retries: {s['retries']} | "
+                f"Rejected: {s['rejected']} | Opened: {s['opened']}x"
+                + (f" | Deadline: {s['deadline_exceeded']}" if s["deadline_exceeded"] else "")
+            )
+            if s["state"] == "open":
+                st.caption(f"↳ {s['reason']} (retry in {s['retry_in_s']:.0f}s)")
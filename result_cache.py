@@ -0,0 +1,142 @@
+# Import package
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import streamlit as st
+
+#######################################################
+# --- Content-addressed inference result cache ---
+# Two tiers: an in-memory LRU shared by every session in the process, and an
+# optional SQLite file that survives restarts. Values must be JSON serializable.
+
+def content_hash(image_bytes):
+    """SHA-256 hex digest of the raw image bytes."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def cache_key(image_bytes, model_id):
+    """The same image analyzed by a different model must not share an entry."""
+    return f"{model_id}:{content_hash(image_bytes)}"
+
+class ResultCache:
+    def __init__(self, max_entries=256, ttl=None, db_path=None, max_db_bytes=50 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl                      # seconds, None = never expire
+        self.max_db_bytes = max_db_bytes
+        self._memory = OrderedDict()        # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def lookup(self, key):
+        """Returns (found, value). A cached empty result ([]) is still a hit."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return True, entry[1]
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, stored_at FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1], now):
+                    value = json.loads(row[0])
+                    self._db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    self._remember(key, row[1], value)
+                    self._stats["disk_hits"] += 1
+                    return True, value
+
+            self._stats["misses"] += 1
+            return False, None
+
+    def store(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                encoded = json.dumps(value)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, encoded, len(encoded), now, now),
+                )
+                self._evict_disk(now)
+                self._db.commit()
+
+    def _remember(self, key, stored_at, value):
+        """Adds to the LRU tier. Caller holds the lock."""
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _evict_disk(self, now):
+        """Drops expired rows, then least recently used rows until under max_db_bytes. Caller holds the lock."""
+        if self.ttl is not None:
+            cursor = self._db.execute("DELETE FROM results WHERE stored_at < ?", (now - self.ttl,))
+            self._stats["evictions"] += cursor.rowcount
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_db_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY accessed_at").fetchall():
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._stats["evictions"] += 1
+            total -= size
+            if total <= self.max_db_bytes:
+                break
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["memory_entries"] = len(self._memory)
+            if self._db is not None:
+                snapshot["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        lookups = snapshot["memory_hits"] + snapshot["disk_hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = (snapshot["memory_hits"] + snapshot["disk_hits"]) / lookups if lookups else 0.0
+        return snapshot
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache(max_entries=256, ttl=None, db_path=None, max_db_bytes=50 * 1024 * 1024):
+    """Process-wide cache instance, shared by both pages and every session."""
+    return ResultCache(max_entries=max_entries, ttl=ttl, db_path=db_path, max_db_bytes=max_db_bytes)
+
+def get_configured_cache():
+    """Builds the cache from optional st.secrets settings."""
+    ttl = st.secrets.get("RESULT_CACHE_TTL", None)
+    return get_result_cache(
+        max_entries=int(st.secrets.get("RESULT_CACHE_MAX_ENTRIES", 256)),
+        ttl=float(ttl) if ttl is not None else None,
+        db_path=st.secrets.get("RESULT_CACHE_DB", None),
+        max_db_bytes=int(float(st.secrets.get("RESULT_CACHE_MAX_DB_MB", 50)) * 1024 * 1024),
+    )
+
+def render_cache_stats(cache):
+    """Sidebar panel with hit/miss statistics."""
+    stats = cache.stats()
+    with st.sidebar.expander("Result Cache"):
+        st.caption(
+            f"Hit rate: {stats['hit_rate']:.0%} | "
+            f"Hits: {stats['memory_hits']} mem / {stats['disk_hits']} disk | Misses: {stats['misses']}"
+        )
+        st.json(stats, expanded=False)
@@ -0,0 +1,156 @@
+# Import package
+import base64
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+import streamlit as st
+import resilience
+import tracing
+from PIL import Image
+from requests.adapters import HTTPAdapter
+from warmup import LazyModule
+
+# Both are only needed once a client is built: inference_sdk alone takes about a second to import
+np = LazyModule("numpy")
+inference_sdk = LazyModule("inference_sdk")
+sdk_requests = LazyModule("inference_sdk.http.utils.requests")
+
+#######################################################
+# --- Pooled Roboflow client ---
+# InferenceHTTPClient posts with module-level requests.post, so every call
+# opens a new TCP + TLS connection. This client speaks the same v0 protocol
+# (POST {api_url}/{project}/{version}, base64 image in the body) over one
+# requests.Session per process, so connections are kept alive and reused
+# across reruns, sessions and batch workers.
+# Point ROBOFLOW_API_URL at a local stub (benchmarks/stub_roboflow_server.py)
+# to run without serverless.roboflow.com.
+
+DEFAULT_API_URL = "https://serverless.roboflow.com"
+MAX_CONCURRENT = 4          # parallel requests in batch mode (and pooled connections)
+REQUEST_TIMEOUT = 30        # seconds
+JPEG_QUALITY = 90           # only used when we get decoded pixels instead of file bytes
+HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+
+def encode_image(image, quality=JPEG_QUALITY):
+    """
+    Base64 body for the v0 endpoint. Encoded file bytes are sent as they are;
+    PIL images and numpy arrays (RGB) are encoded to JPEG first.
+    """
+    if isinstance(image, (bytes, bytearray)):
+        data = bytes(image)
+    else:
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", quality=quality)
+        data = buffer.getvalue()
+    return base64.b64encode(data)
+
+def build_configuration(confidence_threshold=None, max_detections=None):
+    """InferenceConfiguration with only the values that were set; the server uses its defaults for the rest."""
+    kwargs = {}
+    if confidence_threshold is not None:
+        kwargs["confidence_threshold"] = float(confidence_threshold)
+    if max_detections is not None:
+        kwargs["max_detections"] = int(max_detections)
+    return inference_sdk.InferenceConfiguration(**kwargs)
+
+class RoboflowClient:
+    def __init__(self, api_url, api_key, configuration=None, max_concurrent=MAX_CONCURRENT, timeout=REQUEST_TIMEOUT):
+        self.api_url = api_url.rstrip("/")
+        self.api_key = api_key
+        self.configuration = configuration or build_configuration()
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.timeout = timeout
+
+        # One pool per host, sized for the batch workers so none of them waits for a socket
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrent)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="roboflow-infer")
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "failed": 0, "sent_kb": 0.0}
+
+    def _count(self, name, delta=1):
+        with self._stats_lock:
+            self._stats[name] += delta
+
+    def _params(self):
+        params = {"api_key": self.api_key}
+        params.update({k: v for k, v in self.configuration.to_legacy_call_parameters().items() if v is not None})
+        return params
+
+    def _post(self, url, body):
+        """
+        api_key travels in the query string, so it is masked in every error: the
+        messages end up in logs, the resilience panel and the page.
+        """
+        try:
+            # The request timeout never outlives the caller's deadline (see resilience.py)
+            response = self.session.post(
+                url, params=self._params(), data=body, headers=HEADERS,
+                timeout=resilience.clamp_timeout(self.timeout),
+            )
+        except requests.RequestException as e:
+            # Connection errors quote the full URL; same class, so resilience.classify still sees it
+            raise type(e)(sdk_requests.deduct_api_key_from_string(str(e)), response=e.response) from None
+        # Same as the SDK: raise_for_status with the key masked in the URL
+        sdk_requests.api_key_safe_raise_for_status(response)
+        return response.json()
+
+    def infer(self, image, model_id):
+        """
+        Same call and result as InferenceHTTPClient.infer for a single image:
+        a dict with 'predictions' in pixels of the image that was sent.
+        Throttling (429) and transient errors are retried and failures feed the
+        'roboflow' circuit breaker, see resilience.py. Thread safe, no st.* calls.
+        """
+        project, version = model_id.split("/")[:2]
+        body = encode_image(image)
+        self._count("requests")
+        self._count("sent_kb", len(body) / 1024)
+        tracing.add(bytes_sent=len(body))
+        try:
+            return resilience.call("roboflow", self._post, f"{self.api_url}/{project}/{version}", body)
+        except Exception:
+            self._count("failed")
+            raise
+
+    def infer_batch(self, images, model_id):
+        """
+        Runs many images as concurrent requests, at most max_concurrent at a time
+        (the pool is shared by the whole process). Yields (index, result, error)
+        in completion order, so results can be shown as soon as they arrive.
+        """
+        self._count("batches")
+        futures = {self._executor.submit(self.infer, image, model_id): i for i, image in enumerate(images)}
+        for future in as_completed(futures):
+            error = future.exception()
+            yield futures[future], (None if error else future.result()), error
+
+    def stats(self):
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot["sent_kb"] = round(snapshot["sent_kb"], 1)
+        snapshot["max_concurrent"] = self.max_concurrent
+        return snapshot
+
+@st.cache_resource(show_spinner=False)
+def get_roboflow_client(api_url, api_key, confidence_threshold=None, max_detections=None,
+                        max_concurrent=MAX_CONCURRENT, timeout=REQUEST_TIMEOUT):
+    """One client (and one connection pool) per configuration per process."""
+    print(f"Created new Roboflow client: {api_url}")
+    configuration = build_configuration(confidence_threshold, max_detections)
+    return RoboflowClient(api_url, api_key, configuration, max_concurrent=max_concurrent, timeout=timeout)
+
+def get_configured_client():
+    """Client configured from st.secrets (ROBOFLOW_API, ROBOFLOW_API_URL, ROBOFLOW_CONFIDENCE, ...)."""
+    return get_roboflow_client(
+        st.secrets.get("ROBOFLOW_API_URL", DEFAULT_API_URL), st.secrets["ROBOFLOW_API"],
+        confidence_threshold=st.secrets.get("ROBOFLOW_CONFIDENCE"),
+        max_detections=st.secrets.get("ROBOFLOW_MAX_DETECTIONS"),
+        max_concurrent=int(st.secrets.get("ROBOFLOW_MAX_CONCURRENT", MAX_CONCURRENT)),
+    )
@@ -0,0 +1,150 @@
+# Import package
+import os
+import threading
+import time
+import uuid
+import streamlit as st
+import streamlit.components.v1 as components
+from botocore.exceptions import ClientError
+from s3_upload import INPUT_PREFIX
+import aws_clients
+
+#######################################################
+# --- Browser -> S3 uploads (pre-signed POST) ---
+# With st.file_uploader every image crosses the Streamlit server twice (browser
+# -> websocket -> S3) and sits in its memory while it does. Here the server only
+# signs a POST policy; the component in components/s3_direct_upload uploads the
+# file straight from the browser (downscaled there first) and hands back the key.
+# The server then HEADs the object and runs inference with the key alone.
+#
+# The bucket needs a CORS rule allowing POST (and GET, for the preview) from the
+# app's origin, e.g.:
+#   [{"AllowedOrigins": ["https://your-app.streamlit.app"], "AllowedMethods": ["POST", "GET"],
+#     "AllowedHeaders": ["*"], "ExposeHeaders": ["ETag"]}]
+#
+# The server never sees the bytes, so results are cached by the ETag S3
+# computed (the MD5 of the object for a single POST) instead of by content hash.
+
+DIRECT_PREFIX = f"{INPUT_PREFIX}/direct"
+UPLOAD_EXPIRES = 300        # seconds a signed policy stays valid
+VIEW_EXPIRES = 3600         # seconds the preview URL stays valid
+MAX_UPLOAD_BYTES = 15 * 1024 * 1024
+IMAGE_TYPES = ("image/jpeg", "image/png")
+COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "s3_direct_upload")
+
+_component = components.declare_component("s3_direct_upload", path=COMPONENT_DIR)
+
+class DirectUploads:
+    def __init__(self, client, bucket, prefix=DIRECT_PREFIX, max_bytes=MAX_UPLOAD_BYTES, expires=UPLOAD_EXPIRES):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.expires = expires
+        self._lock = threading.Lock()
+        self._stats = {"presigned": 0, "verified": 0, "rejected": 0, "missing": 0, "bytes_direct": 0}
+
+    def presign(self):
+        """
+        Signed POST for one new object: {url, fields, key, expires_at}. S3 itself
+        enforces the size limit and that the Content-Type is an image.
+        """
+        key = f"{self.prefix}/{uuid.uuid4().hex}"
+        post = self.client.generate_presigned_post(
+            Bucket=self.bucket, Key=key,
+            Fields={"success_action_status": "201"},
+            Conditions=[
+                {"success_action_status": "201"},
+                ["content-length-range", 1, self.max_bytes],
+                ["starts-with", "$Content-Type", "image/"],
+            ],
+            ExpiresIn=self.expires,
+        )
+        with self._lock:
+            self._stats["presigned"] += 1
+        return {"url": post["url"], "fields": post["fields"], "key": key, "expires_at": time.time() + self.expires}
+
+    def verify(self, key):
+        """
+        HEAD of an object the browser says it uploaded: {key, size, content_type, etag}.
+        Raises ValueError if it is missing, outside our prefix, too large or not an
+        image; objects that fail the checks are deleted.
+        """
+        if not key.startswith(f"{self.prefix}/"):
+            raise ValueError(f"Not a direct upload key: {key}")
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                with self._lock:
+                    self._stats["missing"] += 1
+                raise ValueError("The upload did not reach S3, please try again.") from e
+            raise
+
+        size, content_type = head["ContentLength"], head.get("ContentType", "")
+        problem = None
+        if size > self.max_bytes:
+            problem = f"File is {size / 1024 ** 2:.1f} MB, the limit is {self.max_bytes / 1024 ** 2:.0f} MB."
+        elif content_type not in IMAGE_TYPES:
+            problem = f"Unsupported file type: {content_type or 'unknown'}"
+        if problem:
+            # The policy should have stopped it; do not keep what we will not analyze
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise ValueError(problem)
+
+        with self._lock:
+            self._stats["verified"] += 1
+            self._stats["bytes_direct"] += size
+        return {"key": key, "size": size, "content_type": content_type, "etag": head["ETag"].strip('"')}
+
+    def view_url(self, key, expires=VIEW_EXPIRES):
+        """Signed GET, so the browser shows the image without the server fetching it."""
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=expires
+        )
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+@st.cache_resource(show_spinner=False)
+def get_direct_uploads(_client, bucket, max_bytes, client_settings=None):
+    """
+    Process-wide signer per bucket and client, so the counters cover every session.
+    client_settings (aws_clients.configured_settings) keys the cache: the client itself is not hashed.
+    """
+    return DirectUploads(_client, bucket, max_bytes=max_bytes)
+
+def get_configured_direct_uploads():
+    """Signer for S3_BUCKET_NAME with the configured S3 client; DIRECT_UPLOAD_MAX_MB caps the file size."""
+    max_mb = float(st.secrets.get("DIRECT_UPLOAD_MAX_MB", MAX_UPLOAD_BYTES / 1024 ** 2))
+    return get_direct_uploads(
+        aws_clients.get_configured_client("s3"), st.secrets["S3_BUCKET_NAME"], int(max_mb * 1024 * 1024),
+        aws_clients.configured_settings("s3"),
+    )
+
+def object_cache_key(model_id, etag):
+    """Result cache key for an object we only know by its ETag (see result_cache.cache_key)."""
+    return f"{model_id}:etag:{etag}"
+
+def direct_upload(presigned, max_side=0, quality=85, max_bytes=MAX_UPLOAD_BYTES, key=None):
+    """
+    Renders the upload component for one signed policy. Returns None until the
+    browser has uploaded a file, then {key, name, type, size, original_size,
+    width, height, resized}. max_side > 0 downscales to a JPEG in the browser first.
+    """
+    return _component(
+        url=presigned["url"], fields=presigned["fields"], max_side=max_side, quality=quality,
+        max_bytes=max_bytes, accept=",".join(IMAGE_TYPES), key=key, default=None,
+    )
+
+def render_direct_stats(uploads):
+    """Sidebar panel: how many browser uploads were checked and how many bytes never touched the server."""
+    with st.sidebar.expander("Direct Uploads"):
+        stats = uploads.stats()
+        st.caption(
+            f"Verified: {stats['verified']} | Rejected: {stats['rejected']} | "
+            f"Kept off the server: {stats['bytes_direct'] / 1024 ** 2:.1f} MB"
+        )
@@ -0,0 +1,119 @@
+# Import package
+import io
+import os
+import mimetypes
+import threading
+import time
+from collections import OrderedDict
+import streamlit as st
+from botocore.exceptions import ClientError
+from result_cache import content_hash
+import aws_clients
+
+#######################################################
+# --- Content-addressed S3 uploads ---
+# Objects are stored under their SHA-256, so the same image is uploaded once and
+# two different images that share a file name no longer overwrite each other.
+
+INPUT_PREFIX = "img_input_test"
+INDEX_TTL = 15 * 60         # seconds a known key is trusted before it is checked with HEAD again
+
+def default_transfer_config():
+    """
+    Multipart tuning: phone photos rarely exceed the threshold, but large frames
+    are split into parallel parts instead of one long single PUT.
+    Built on first use, so importing this module does not import boto3.
+    """
+    from boto3.s3.transfer import TransferConfig
+    return TransferConfig(
+        multipart_threshold=8 * 1024 * 1024,
+        multipart_chunksize=8 * 1024 * 1024,
+        max_concurrency=4,
+        use_threads=True,
+    )
+
+def content_key(image_bytes, file_name, prefix=INPUT_PREFIX):
+    """S3 key derived from the image content; the original extension is kept for the content type."""
+    ext = os.path.splitext(file_name)[1].lower() or ".jpg"
+    return f"{prefix}/{content_hash(image_bytes)}{ext}"
+
+class S3Uploader:
+    def __init__(self, client, bucket, transfer_config=None, index_size=10000, index_ttl=INDEX_TTL):
+        self.client = client
+        self.bucket = bucket
+        self.transfer_config = transfer_config or default_transfer_config()
+        self.index_size = index_size
+        # Objects can disappear behind our back (lifecycle rules, cleanups), so entries expire
+        self.index_ttl = index_ttl
+        self._known_keys = OrderedDict()   # key we know exists in the bucket -> when we last saw it (monotonic)
+        self._lock = threading.Lock()
+        self._stats = {"uploaded": 0, "skipped_index": 0, "skipped_head": 0, "bytes_uploaded": 0, "bytes_saved": 0}
+
+    def _remember(self, key):
+        with self._lock:
+            self._known_keys[key] = time.monotonic()
+            self._known_keys.move_to_end(key)
+            while len(self._known_keys) > self.index_size:
+                self._known_keys.popitem(last=False)
+
+    def exists(self, key):
+        """Checks the local index first (entries younger than index_ttl), then a cheap HEAD request."""
+        with self._lock:
+            seen = self._known_keys.get(key)
+            if seen is not None:
+                if time.monotonic() - seen < self.index_ttl:
+                    return "index"
+                del self._known_keys[key]
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+                # e.g. 403 without s3:ListBucket: we cannot tell, so just upload
+                print(f"HEAD {key} failed, uploading anyway: {e}")
+            return None
+        self._remember(key)
+        return "head"
+
+    def upload(self, image_bytes, file_name):
+        """Returns (s3_uri, uploaded). uploaded is False when the object was already there."""
+        key = content_key(image_bytes, file_name)
+        s3_uri = f"s3://{self.bucket}/{key}"
+
+        found_by = self.exists(key)
+        if found_by:
+            with self._lock:
+                self._stats[f"skipped_{found_by}"] += 1
+                self._stats["bytes_saved"] += len(image_bytes)
+            return s3_uri, False
+
+        content_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+        self.client.upload_fileobj(
+            io.BytesIO(image_bytes), self.bucket, key,
+            ExtraArgs={"ContentType": content_type},
+            Config=self.transfer_config,
+        )
+        self._remember(key)
+        with self._lock:
+            self._stats["uploaded"] += 1
+            self._stats["bytes_uploaded"] += len(image_bytes)
+        return s3_uri, True
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["indexed_keys"] = len(self._known_keys)
+        return snapshot
+
+@st.cache_resource(show_spinner=False)
+def get_uploader(_client, bucket, client_settings=None):
+    """
+    Process-wide uploader per bucket and client, so the known-key index is shared by every session.
+    client_settings (aws_clients.configured_settings) keys the cache: the client itself is not hashed.
+    """
+    return S3Uploader(_client, bucket)
+
+def get_configured_uploader():
+    """Uploader for S3_BUCKET_NAME with the configured S3 client (see aws_clients.py)."""
+    return get_uploader(
+        aws_clients.get_configured_client("s3"), st.secrets["S3_BUCKET_NAME"], aws_clients.configured_settings("s3")
+    )
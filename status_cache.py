@@ -0,0 +1,122 @@
+# Import package
+import threading
+import time
+import streamlit as st
+
+#######################################################
+# --- Shared model-status cache ---
+# One entry per model version, shared by every session:
+# - single flight: concurrent callers wait for the one describe call in progress
+# - targeted invalidation: "Refresh Status" only drops this entry, not every st.cache_data
+# - stale-while-revalidate: an expired entry is served while one background refresh runs
+# - adaptive TTL: poll fast while STARTING/STOPPING, slowly while RUNNING/STOPPED
+
+STATUS_TTL = {
+    "STARTING": 5,
+    "STOPPING": 5,
+    "RUNNING": 60,
+    "STOPPED": 60,
+    "ERROR": 5,
+}
+DEFAULT_TTL = 15
+MAX_STALE = 300   # older than this, callers wait for a fresh value instead
+
+class _Entry:
+    def __init__(self, value, ttl):
+        self.value = value
+        self.fetched_at = time.time()
+        self.ttl = ttl
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at
+
+class StatusCache:
+    def __init__(self, ttl_by_status=None, default_ttl=DEFAULT_TTL, max_stale=MAX_STALE):
+        self.ttl_by_status = ttl_by_status or STATUS_TTL
+        self.default_ttl = default_ttl
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._entries = {}    # key -> _Entry
+        self._inflight = {}   # key -> threading.Event
+        self._stats = {"hits": 0, "stale_served": 0, "fetches": 0, "coalesced": 0, "invalidations": 0}
+
+    def ttl_for(self, value):
+        """value is (status, message)."""
+        return self.ttl_by_status.get(value[0], self.default_ttl)
+
+    def put(self, key, value):
+        """Stores a status seen elsewhere (e.g. by the start/stop poller)."""
+        with self._lock:
+            self._entries[key] = _Entry(value, self.ttl_for(value))
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._stats["invalidations"] += 1
+
+    def _fetch(self, key, fetch, event):
+        """Runs the one in-flight fetch for `key` and wakes up everyone waiting on it."""
+        try:
+            try:
+                value = fetch()
+            except Exception as e:
+                print(f"Status fetch failed: {e}")
+                value = ('ERROR', str(e))
+            with self._lock:
+                self._entries[key] = _Entry(value, self.ttl_for(value))
+                self._stats["fetches"] += 1
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def get(self, key, fetch):
+        """
+        Returns the cached (status, message) for key, calling fetch() at most
+        once at a time per key across the whole process.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.age < entry.ttl:
+                self._stats["hits"] += 1
+                return entry.value
+
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._inflight[key] = event
+
+            if entry is not None and entry.age < self.max_stale:
+                # Serve stale, let one background thread revalidate
+                self._stats["stale_served"] += 1
+                if leader:
+                    threading.Thread(target=self._fetch, args=(key, fetch, event), daemon=True).start()
+                return entry.value
+
+            if not leader:
+                self._stats["coalesced"] += 1
+
+        if leader:
+            self._fetch(key, fetch, event)
+        else:
+            event.wait()
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry.value if entry is not None else ('ERROR', 'Status unavailable.')
+
+    def age(self, key):
+        """Seconds since the entry was fetched, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry.age if entry is not None else None
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+@st.cache_resource(show_spinner=False)
+def get_status_cache():
+    """One status cache per process, shared by every session."""
+    return StatusCache()
@@ -1,4 +1,9 @@
 import streamlit as st
+from warmup import STARTUP_BUDGET_MS, render_startup_stats, start_prewarm
+
+# First run of the process: import the heavy libraries and build the clients in the
+# background while the page renders (later runs get the same, finished pre-warm)
+prewarm = start_prewarm()
 
 pages = {
     "Select Classify Infrastructure": [
@@ -8,4 +13,5 @@ pages = {
 }
 
 pg = st.navigation(pages)
-pg.run()
\ No newline at end of file
+pg.run()
+render_startup_stats(prewarm, float(st.secrets.get("STARTUP_BUDGET_MS", STARTUP_BUDGET_MS)))
@@ -0,0 +1,105 @@
+# Import package
+import io
+import os
+import streamlit as st
+from PIL import Image
+from result_cache import content_hash
+
+#######################################################
+# --- Display-sized renditions ---
+# st.image(width=400) resizes on the server to at most 400 px (and the full
+# content width, 1460 px, without a width), re-encoding anything that is not
+# already the JPEG/PNG it picks: PNG for RGBA/LA/P images, JPEG otherwise.
+# So every rerun decoded, resized and encoded the full upload again. We hand
+# it a cached rendition that it passes through untouched: exactly the width
+# it keeps, JPEG unless the image has transparency. Images shown without a
+# width (sidebar logos) get DISPLAY_DPR times their css width. The zoom shows
+# the largest rendition Streamlit sends and offers the original as a download.
+
+DISPLAY_DPR = 2             # 2x covers most laptop/phone screens
+SIDEBAR_WIDTH = 300         # css px, default Streamlit sidebar
+MAX_CONTENT_WIDTH = 1460    # Streamlit's cap for images shown without a width
+RENDITION_QUALITY = 85
+
+def _has_transparency(image):
+    if image.mode == "P":
+        return "transparency" in image.info
+    if image.mode in ("RGBA", "LA", "PA"):
+        return image.getchannel("A").getextrema()[0] < 255
+    return False
+
+def _streamlit_format(image):
+    """The format st.image sends this image as (output_format="auto")."""
+    if image.format == "GIF":
+        return "GIF"
+    return "PNG" if image.mode in ("RGBA", "LA", "P") else "JPEG"
+
+def make_rendition(image_bytes, max_width, quality=RENDITION_QUALITY):
+    """
+    JPEG (PNG when the image has transparency) at most max_width pixels wide; never upscales.
+    Returns image_bytes as they are when st.image would send them unchanged anyway.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.size[0] <= max_width and image.format == _streamlit_format(image):
+        return image_bytes
+
+    fmt = "PNG" if _has_transparency(image) else "JPEG"
+    palette = image.mode == "P"
+    if image.size[0] > max_width:
+        target = (max_width, max(1, round(image.size[1] * max_width / image.size[0])))
+        if image.format == "JPEG":
+            image.draft("RGB", target)   # decode at a reduced DCT scale
+        if fmt == "PNG" and image.mode != "RGBA":
+            image = image.convert("RGBA")   # resize P/LA with their transparency
+        image = image.resize(target, Image.Resampling.LANCZOS) if image.size != target else image
+    image = image.convert("RGBA" if fmt == "PNG" else "RGB")
+    if fmt == "PNG" and palette:
+        image = image.quantize(256, method=Image.Quantize.FASTOCTREE)   # palette logos stay small
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, quality=quality, optimize=fmt == "PNG")
+    return buffer.getvalue()
+
+@st.cache_data(max_entries=256, ttl=60 * 60, show_spinner=False)
+def _cached_rendition(image_hash, max_width, _image_bytes):
+    """Keyed by content hash, so the same image is only resized once per process."""
+    return make_rendition(_image_bytes, max_width)
+
+def thumbnail(image_bytes, width, image_hash=None):
+    """Rendition of an uploaded or annotated image for st.image(..., width=width)."""
+    return _cached_rendition(image_hash or content_hash(image_bytes), width, image_bytes)
+
+@st.cache_resource(show_spinner=False)
+def _static_asset(path, max_width, mtime):
+    """Repeated assets (tutorials, logos) are resized once and kept in process memory."""
+    with open(path, "rb") as f:
+        return make_rendition(f.read(), max_width)
+
+def asset(path, width=None):
+    """
+    Rendition of a bundled image file for st.image(..., width=width), or, without
+    a width, for the sidebar. Raises FileNotFoundError like st.image(path) does.
+    """
+    max_width = width or min(SIDEBAR_WIDTH * DISPLAY_DPR, MAX_CONTENT_WIDTH)
+    return _static_asset(path, max_width, os.path.getmtime(path))
+
+def show_image(image_bytes, width, caption=None, zoom_key=None, image_hash=None, full_resolution=None, file_name=None):
+    """
+    st.image with a display-sized rendition. If zoom_key is given, a toggle
+    shows a larger view (up to MAX_CONTENT_WIDTH, Streamlit does not send more)
+    and a download of the original, only when the user asks for it.
+    full_resolution() returns the bytes to zoom into when image_bytes is itself
+    reduced (annotations drawn on the downscaled image that was sent).
+    """
+    st.image(thumbnail(image_bytes, width, image_hash), caption=caption, width=width)
+    if zoom_key and st.toggle("🔍 Larger view", key=zoom_key):
+        original = image_bytes
+        if full_resolution is not None:
+            original = full_resolution()
+            image_hash = image_hash and f"{image_hash}|full"
+        st.image(_cached_rendition(image_hash or content_hash(original), MAX_CONTENT_WIDTH, original), caption=caption)
+        fmt = Image.open(io.BytesIO(original)).format or "PNG"
+        st.download_button(
+            "Download original", original, key=f"{zoom_key}_download",
+            file_name=file_name or f"{zoom_key}.{fmt.lower()}", mime=f"image/{fmt.lower()}",
+        )
@@ -0,0 +1,288 @@
+# Import package
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import streamlit as st
+from warmup import LazyModule
+
+# Only the percentile table and the breakdown panel need them
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+#######################################################
+# --- Lightweight tracing ---
+# One Trace per analysis, one Span per stage (cache lookup, preprocess, upload,
+# inference, annotate, display). Spans carry attributes such as bytes sent,
+# cache hits and retries. The current trace lives in a context variable, so
+# helpers deep in the call stack can open spans or add attributes without the
+# trace being passed around; outside a trace every call is a no-op.
+# Context variables do not follow work handed to other threads: span() and
+# add() on batch pipeline stages, executor workers or the Lambda engine loop
+# see no trace and record nothing. Work done there is only covered by the span
+# the script thread keeps open around it (or by record_timings()), so batch and
+# video traces do not break down what their worker threads did.
+# Finished traces feed a process-wide recorder (p50/p95/p99 per stage) and can
+# be exported to a local JSONL file, either in our own format or shaped like
+# OpenTelemetry's JSON span export.
+
+WINDOW = 500                    # recent samples kept per stage
+EXPORT_FORMATS = ("jsonl", "otel")
+SUM_ATTRS = ("bytes_sent", "retries", "cache_hits")   # attributes that add up over a trace
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    def __init__(self, name, attrs):
+        self.span_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = dict(attrs)
+        self.start = time.time()
+        self.duration = None        # seconds, set when the span ends
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, **counts):
+        """Adds to numeric attributes (retries=1, bytes_sent=n, ...)."""
+        for key, value in counts.items():
+            self.attrs[key] = self.attrs.get(key, 0) + value
+
+class Trace:
+    def __init__(self, name, attrs):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = dict(attrs)
+        self.start = time.time()
+        self.duration = None
+        self.status = "ok"
+        self.spans = []
+
+    @contextmanager
+    def span(self, name, **attrs):
+        span = Span(name, attrs)
+        self.spans.append(span)
+        token = _current_span.set(span)
+        perf_start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.duration = time.perf_counter() - perf_start
+            _current_span.reset(token)
+
+    def totals(self):
+        totals = {key: 0 for key in SUM_ATTRS}
+        for span in self.spans:
+            for key in SUM_ATTRS:
+                value = span.attrs.get(key)
+                if isinstance(value, bool):
+                    value = int(value)
+                totals[key] += value or 0
+        return totals
+
+    def as_dict(self):
+        """Plain dict, small enough to keep in session state."""
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "attrs": self.attrs,
+            "status": self.status,
+            "total_ms": round((self.duration or 0) * 1000, 1),
+            **self.totals(),
+            "spans": [
+                {"stage": s.name, "ms": round((s.duration or 0) * 1000, 1), **s.attrs}
+                for s in self.spans
+            ],
+        }
+
+#######################################################
+# --- Public helpers ---
+
+@contextmanager
+def trace(name, recorder=None, session_key=None, **attrs):
+    """
+    Traces one analysis. On exit (also on st.rerun / st.stop, which are not
+    Exceptions) the trace is recorded, exported, and optionally kept in
+    st.session_state[session_key] for the breakdown panel.
+    """
+    current = Trace(name, attrs)
+    token = _current_trace.set(current)
+    perf_start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.status = f"error: {type(e).__name__}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - perf_start
+        _current_trace.reset(token)
+        if recorder is not None:
+            recorder.record(current)
+        if session_key:
+            st.session_state[session_key] = current.as_dict()
+
+@contextmanager
+def span(name, **attrs):
+    """Span in the current trace, or a detached span that nobody records."""
+    current = _current_trace.get()
+    if current is None:
+        yield Span(name, attrs)
+        return
+    with current.span(name, **attrs) as s:
+        yield s
+
+def current_span():
+    """The innermost open span, or None outside a trace."""
+    return _current_span.get()
+
+def add(**counts):
+    """Adds numeric attributes to the current span, if there is one."""
+    s = _current_span.get()
+    if s is not None:
+        s.add(**counts)
+
+def annotate(**attrs):
+    """Sets attributes on the current span, if there is one."""
+    s = _current_span.get()
+    if s is not None:
+        s.set(**attrs)
+
+#######################################################
+# --- Recording and export ---
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+def otel_records(t):
+    """Spans shaped like OpenTelemetry's JSON span export (root span first)."""
+    root_id = uuid.uuid4().hex[:16]
+    root = {
+        "name": t.name,
+        "context": {"trace_id": f"0x{t.trace_id}", "span_id": f"0x{root_id}"},
+        "kind": "SpanKind.INTERNAL",
+        "parent_id": None,
+        "start_time": _iso(t.start),
+        "end_time": _iso(t.start + (t.duration or 0)),
+        "status": {"status_code": "OK" if t.status == "ok" else "ERROR"},
+        "attributes": {**t.attrs, **t.totals()},
+    }
+    records = [root]
+    for s in t.spans:
+        records.append({
+            "name": s.name,
+            "context": {"trace_id": f"0x{t.trace_id}", "span_id": f"0x{s.span_id}"},
+            "kind": "SpanKind.INTERNAL",
+            "parent_id": f"0x{root_id}",
+            "start_time": _iso(s.start),
+            "end_time": _iso(s.start + (s.duration or 0)),
+            "status": {"status_code": "ERROR" if "error" in s.attrs else "OK"},
+            "attributes": s.attrs,
+        })
+    return records
+
+class TraceRecorder:
+    """Process-wide latency samples per stage, plus optional export to a JSONL file."""
+    def __init__(self, export_path=None, export_format="jsonl", window=WINDOW):
+        self.export_path = export_path
+        self.export_format = export_format if export_format in EXPORT_FORMATS else "jsonl"
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._counters = {"traces": 0, "errors": 0, "cache_hits": 0, "retries": 0, "bytes_sent": 0}
+
+    def record(self, t):
+        totals = t.totals()
+        with self._lock:
+            self._samples[(t.name, "total")].append((t.duration or 0) * 1000)
+            for s in t.spans:
+                self._samples[(t.name, s.name)].append((s.duration or 0) * 1000)
+            self._counters["traces"] += 1
+            self._counters["errors"] += t.status != "ok"
+            for key in SUM_ATTRS:
+                self._counters[key] += totals[key]
+        if self.export_path:
+            self._export(t)
+
+    def record_timings(self, name, timings):
+        """Stage timings measured elsewhere (batch pipeline), in seconds."""
+        with self._lock:
+            for stage, seconds in timings.items():
+                self._samples[(name, stage)].append(seconds * 1000)
+
+    def _export(self, t):
+        if self.export_format == "otel":
+            lines = [json.dumps(r, default=str) for r in otel_records(t)]
+        else:
+            lines = [json.dumps(t.as_dict(), default=str)]
+        try:
+            directory = os.path.dirname(self.export_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._lock, open(self.export_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            print(f"Could not export trace: {e}")
+
+    def table(self):
+        """One row per (trace, stage) with count and p50/p95/p99 in ms."""
+        with self._lock:
+            samples = {k: np.asarray(v) for k, v in self._samples.items()}
+        rows = []
+        for (name, stage), values in sorted(samples.items()):
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            rows.append({
+                "trace": name, "stage": stage, "count": len(values),
+                "p50_ms": round(p50, 1), "p95_ms": round(p95, 1), "p99_ms": round(p99, 1),
+            })
+        return rows
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+@st.cache_resource(show_spinner=False)
+def get_recorder(export_path=None, export_format="jsonl"):
+    return TraceRecorder(export_path, export_format)
+
+def get_configured_recorder():
+    """Recorder configured from st.secrets (TRACE_EXPORT_PATH, TRACE_EXPORT_FORMAT)."""
+    return get_recorder(st.secrets.get("TRACE_EXPORT_PATH"), st.secrets.get("TRACE_EXPORT_FORMAT", "jsonl"))
+
+#######################################################
+# --- UI ---
+
+def render_trace(trace_dict, title="⏱️ Timing Breakdown"):
+    """Collapsible per-stage breakdown of one analysis."""
+    if not trace_dict:
+        return
+    with st.expander(title):
+        st.caption(
+            f"Total: {trace_dict['total_ms']:.0f} ms | Sent: {trace_dict['bytes_sent'] / 1024:.0f} KB | "
+            f"Cache hits: {trace_dict['cache_hits']} | Retries: {trace_dict['retries']}"
+        )
+        spans = pd.DataFrame(trace_dict["spans"])
+        if not spans.empty:
+            st.bar_chart(spans.set_index("stage")["ms"], horizontal=True)
+            st.dataframe(spans, hide_index=True)
+
+def render_trace_stats(recorder):
+    """Sidebar panel with latency percentiles per stage, all sessions."""
+    rows = recorder.table()
+    with st.sidebar.expander("Latency (p50/p95/p99)"):
+        stats = recorder.stats()
+        st.caption(
+            f"Traces: {stats['traces']} | Errors: {stats['errors']} | "
+            f"Cache hits: {stats['cache_hits']} | Retries: {stats['retries']}"
+        )
+        if rows:
+            st.dataframe(pd.DataFrame(rows), hide_index=True)
+        if recorder.export_path:
+            st.caption(f"Exporting spans ({recorder.export_format}) to `{recorder.export_path}`")
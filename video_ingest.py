@@ -0,0 +1,253 @@
+# Import package
+import time
+import streamlit as st
+import resilience
+from batch_pipeline import Stage, run_pipeline
+from warmup import LazyModule
+
+# OpenCV (opencv-python in requirements.txt) is only needed by the video mode
+cv2 = LazyModule("cv2")
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+#######################################################
+# --- Video ingest ---
+# Dashcam clips are decoded as a stream. Frames between two samples are only
+# grab()bed: no colour conversion and no copy. Only the frames that are in
+# flight in the pipeline are held decoded, however long the clip is.
+# Near-duplicate frames (a parked car, a red light) are dropped with a 64-bit
+# difference hash before they cost an inference call. In the timeline they
+# get the labels of the frame they repeat.
+# The remaining frames go through batch_pipeline (encode -> analyze) with a
+# bounded number of calls in flight.
+
+VIDEO_TYPES = ["mp4", "mov", "avi", "mkv", "webm"]
+DEFAULT_SAMPLE_FPS = 1.0
+DEFAULT_MAX_FRAMES = 300
+DEDUP_DISTANCE = 6          # differing bits (out of 64) up to which two frames count as the same
+HASH_SIZE = 8               # 8x8 difference hash = 64 bits
+
+class VideoFrame:
+    """One sampled frame."""
+    def __init__(self, index, timestamp, pixels, phash):
+        self.index = index              # frame number in the video
+        self.timestamp = timestamp      # seconds from the start
+        self.pixels = pixels            # BGR array as decoded by OpenCV, dropped once encoded
+        self.phash = phash
+        self.duplicate_of = None        # index of the kept frame this one repeats
+
+def video_info(path):
+    """fps, frame count, duration and size from the container header (nothing is decoded)."""
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError("Could not open the video")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        return {
+            "fps": round(fps, 2),
+            "frames": frames,
+            "duration_s": round(frames / fps, 1),
+            "width": int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        }
+    finally:
+        capture.release()
+
+def dhash(pixels, size=HASH_SIZE):
+    """Difference hash: is each pixel of a tiny grey thumbnail brighter than its right neighbour?"""
+    gray = cv2.cvtColor(pixels, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+def sample_frames(path, sample_fps=DEFAULT_SAMPLE_FPS, max_frames=DEFAULT_MAX_FRAMES):
+    """Generator of VideoFrame at about sample_fps (0 = every frame), at most max_frames of them."""
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError("Could not open the video")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, round(fps / sample_fps)) if sample_fps else 1
+        index = sampled = 0
+        while sampled < max_frames:
+            if index % step:
+                # Skipped frame: advance the stream without converting it
+                if not capture.grab():
+                    break
+            else:
+                ok, pixels = capture.read()
+                if not ok:
+                    break
+                yield VideoFrame(index, index / fps, pixels, dhash(pixels))
+                sampled += 1
+            index += 1
+    finally:
+        capture.release()
+
+def drop_duplicates(frames, max_distance=DEDUP_DISTANCE, on_duplicate=None):
+    """
+    Yields the frames that differ from the last kept one. Comparing with the
+    kept frame, not the previous one, stops a slow pan from drifting through.
+    Duplicates are passed to on_duplicate(frame) instead.
+    """
+    kept = None
+    for frame in frames:
+        if kept is not None and hamming(frame.phash, kept.phash) <= max_distance:
+            frame.duplicate_of = kept.index
+            frame.pixels = None
+            if on_duplicate is not None:
+                on_duplicate(frame)
+            continue
+        kept = frame
+        yield frame
+
+def encode_frame(pixels, max_side=0, quality=85):
+    """BGR frame -> JPEG bytes, downscaled so the longest side is at most max_side (0 keeps the size)."""
+    height, width = pixels.shape[:2]
+    if max_side and max(width, height) > max_side:
+        scale = max_side / max(width, height)
+        pixels = cv2.resize(pixels, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    ok, data = cv2.imencode(".jpg", pixels, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("Could not encode frame")
+    return data.tobytes()
+
+class VideoAnalysis:
+    """
+    Streams one video through sample -> dedup -> encode -> analyze.
+    analyze(jpeg_bytes) -> [(label, confidence), ...] runs on worker threads,
+    at most `workers` at a time, so it must not call st.*.
+    """
+    def __init__(self, path, analyze, workers=4, sample_fps=DEFAULT_SAMPLE_FPS, max_frames=DEFAULT_MAX_FRAMES,
+                 max_distance=DEDUP_DISTANCE, max_side=0, quality=85):
+        self.path = path
+        self.analyze = analyze
+        self.workers = max(1, int(workers))
+        self.sample_fps = sample_fps
+        self.max_frames = int(max_frames)
+        self.max_distance = int(max_distance)
+        self.max_side = max_side
+        self.quality = quality
+        self.info = video_info(path)
+        self._analyzed = {}         # frame index -> (timestamp, labels or None, error or None)
+        self._duplicates = []
+        self._elapsed = 0.0
+
+    def expected_frames(self):
+        """Frames that will be sampled, from the header (for progress bars)."""
+        if not self.info["frames"]:
+            return self.max_frames
+        step = max(1, round(self.info["fps"] / self.sample_fps)) if self.sample_fps else 1
+        return max(1, min(self.max_frames, -(-self.info["frames"] // step)))
+
+    def run(self):
+        """Yields each analyzed frame's BatchItem in completion order (timings included)."""
+        def encode_stage(frame):
+            data = encode_frame(frame.pixels, self.max_side, self.quality)
+            frame.pixels = None
+            return frame, data
+
+        def analyze_stage(value):
+            frame, data = value
+            return frame, self.analyze(data)
+
+        frames = drop_duplicates(
+            sample_frames(self.path, self.sample_fps, self.max_frames),
+            self.max_distance, on_duplicate=self._duplicates.append,
+        )
+        stages = [Stage("encode", encode_stage, 2), Stage("analyze", analyze_stage, self.workers)]
+        start = time.perf_counter()
+        # run_pipeline admits frames as slots free up, so decoding never runs far ahead
+        for item in run_pipeline(((f"frame {f.index}", f) for f in frames), stages):
+            if item.ok:
+                frame, labels = item.value
+                self._analyzed[frame.index] = (frame.timestamp, labels, None)
+            else:
+                # value is the last stage's output: the frame, or (frame, data) if the analyze call failed
+                frame = item.value[0] if isinstance(item.value, tuple) else item.value
+                self._analyzed[frame.index] = (frame.timestamp, None, f"{item.error[0]}: {resilience.describe(item.error[1])}")
+            yield item
+        self._elapsed = time.perf_counter() - start
+
+    @property
+    def done_count(self):
+        return len(self._analyzed) + len(self._duplicates)
+
+    def timeline(self):
+        """One row per sampled frame, in video order; duplicates repeat their kept frame's labels, or its error."""
+        rows = []
+        for index, (timestamp, labels, error) in self._analyzed.items():
+            rows.append(_timeline_row(index, timestamp, labels, "analyzed" if error is None else f"error: {error}"))
+        for frame in self._duplicates:
+            _, labels, error = self._analyzed.get(frame.duplicate_of, (None, None, None))
+            source = f"same as frame {frame.duplicate_of}"
+            if error is not None:
+                source = f"error: {error} ({source})"
+            rows.append(_timeline_row(frame.index, frame.timestamp, labels, source))
+        return sorted(rows, key=lambda r: r["frame"])
+
+    def stats(self):
+        failed = sum(1 for _, _, error in self._analyzed.values() if error)
+        sampled = len(self._analyzed) + len(self._duplicates)
+        return {
+            **self.info,
+            "sampled": sampled,
+            "analyzed": len(self._analyzed),
+            "duplicates": len(self._duplicates),
+            "failed": failed,
+            "elapsed_s": round(self._elapsed, 2),
+        }
+
+def _timeline_row(index, timestamp, labels, source):
+    labels = sorted(labels or [], key=lambda l: l[1], reverse=True)
+    top_label, top_confidence = labels[0] if labels else ("", 0.0)
+    return {
+        "frame": index,
+        "time_s": round(timestamp, 2),
+        "label": top_label,
+        "confidence": round(float(top_confidence), 2),
+        "all_labels": ", ".join(f"{name} {confidence:.2f}" for name, confidence in labels),
+        "source": source,
+    }
+
+def label_segments(timeline):
+    """Consecutive frames with the same top label, merged into (label, start, end) segments."""
+    segments = []
+    for row in timeline:
+        if segments and segments[-1]["label"] == row["label"]:
+            segments[-1]["end_s"] = row["time_s"]
+            segments[-1]["frames"] += 1
+        else:
+            segments.append({"label": row["label"], "start_s": row["time_s"], "end_s": row["time_s"], "frames": 1})
+    return segments
+
+#######################################################
+# --- UI ---
+
+def render_timeline(results):
+    """Label timeline, segments and sampling stats of one analyzed video."""
+    stats = results["stats"]
+    saved = stats["duplicates"] / stats["sampled"] if stats["sampled"] else 0
+    st.caption(
+        f"{stats['duration_s']:.0f}s at {stats['fps']:.0f} fps, {stats['width']}x{stats['height']} | "
+        f"Sampled: {stats['sampled']} | Analyzed: {stats['analyzed']} | "
+        f"Skipped as duplicates: {stats['duplicates']} ({saved:.0%}) | Failed: {stats['failed']} | "
+        f"{stats['elapsed_s']:.1f}s"
+    )
+    timeline = pd.DataFrame(results["timeline"])
+    if timeline.empty:
+        st.warning("No frames could be read from this video.")
+        return
+    labelled = timeline[timeline["label"] != ""]
+    if labelled.empty:
+        st.info("No labels detected in any frame.")
+    else:
+        st.scatter_chart(labelled, x="time_s", y="confidence", color="label")
+    st.caption("Segments")
+    st.dataframe(pd.DataFrame(label_segments(results["timeline"])), hide_index=True)
+    with st.expander("Per-frame timeline"):
+        st.dataframe(timeline, hide_index=True)
@@ -0,0 +1,169 @@
+# Import package
+import importlib
+import sys
+import threading
+import time
+import streamlit as st
+
+#######################################################
+# --- Lazy imports and pre-warm ---
+# Heavy libraries (pandas, numpy, boto3, inference_sdk) are imported the first
+# time something uses them, not when a page module is loaded, so the welcome
+# screens render without them. On a fresh process a background thread,
+# started once from streamlit_app.py, imports them and builds the backend
+# clients while the first visitor is still reading, so the analysis step
+# finds everything ready.
+# Every first import is timed along with the thread that paid for it; imports
+# paid on a script thread are the cold-start cost users actually wait for,
+# and the sidebar compares them to STARTUP_BUDGET_MS.
+# benchmarks/import_budget.py measures the same thing with python -X importtime.
+
+HEAVY_MODULES = ("numpy", "pandas", "boto3", "inference_sdk")
+STARTUP_BUDGET_MS = 1500        # import time a script thread may spend on a cold process
+PREWARM_THREAD = "prewarm"
+
+_lock = threading.Lock()
+_imports = {}                   # module -> {"ms": first import time, "thread": who paid for it}
+
+def lazy_import(name):
+    """importlib.import_module that records how long the first import of `name` took."""
+    already_loaded = name in sys.modules
+    start = time.perf_counter()
+    # Also waits for an import another thread has in progress, so the module is always complete
+    module = importlib.import_module(name)
+    if not already_loaded:
+        with _lock:
+            _imports.setdefault(name, {
+                "ms": round((time.perf_counter() - start) * 1000, 1),
+                "thread": threading.current_thread().name,
+            })
+    return module
+
+class LazyModule:
+    """
+    Stands in for a module until one of its attributes is used:
+        pd = LazyModule("pandas")   # nothing imported yet
+        pd.DataFrame(rows)          # pandas is imported here, once
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        # Only called for names that are not set on the proxy itself
+        if self._module is None:
+            self._module = lazy_import(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+def import_stats():
+    """First imports seen in this process, slowest first."""
+    with _lock:
+        rows = [{"module": name, **info} for name, info in _imports.items()]
+    return sorted(rows, key=lambda r: r["ms"], reverse=True)
+
+#######################################################
+# --- Background pre-warm ---
+
+class Prewarm:
+    """Runs (name, callable) steps once, in order, on a daemon thread, and times each of them."""
+    def __init__(self, steps):
+        self.steps = list(steps)
+        self.started_at = time.time()
+        self.finished_at = None
+        self._results = []
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=PREWARM_THREAD, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for name, fn in self.steps:
+            start = time.perf_counter()
+            error = None
+            try:
+                fn()
+            except Exception as e:
+                # A step that fails here fails again, with a proper message, on the page
+                error = f"{type(e).__name__}: {e}"
+                print(f"Pre-warm step '{name}' failed: {error}")
+            with _lock:
+                self._results.append({"step": name, "ms": round((time.perf_counter() - start) * 1000, 1), "error": error})
+        self.finished_at = time.time()
+        self._done.set()
+        print(f"Pre-warm finished in {self.finished_at - self.started_at:.2f}s")
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Blocks until every step ran (or timeout seconds); returns whether it finished."""
+        return self._done.wait(timeout)
+
+    def stats(self):
+        with _lock:
+            results = [dict(r) for r in self._results]
+        return {
+            "done": self.done,
+            "steps": len(self.steps),
+            "finished": len(results),
+            "failed": sum(1 for r in results if r["error"]),
+            "elapsed_s": round((self.finished_at or time.time()) - self.started_at, 2),
+            "results": results,
+        }
+
+def configured_steps():
+    """
+    Pre-warm steps for what st.secrets configures: the heavy imports, then the
+    shared clients, built through the same helpers the pages call so that they
+    land in the same st.cache_resource entries.
+    """
+    steps = [(f"import {name}", lambda name=name: lazy_import(name)) for name in HEAVY_MODULES]
+    try:
+        secrets = {key: st.secrets.get(key) for key in ("AWS_REGION", "ROBOFLOW_API", "ONNX_MODEL_PATH", "ROBOFLOW_BACKEND")}
+    except Exception as e:
+        print(f"Pre-warm: no secrets ({e}), only importing")
+        return steps
+    if secrets["AWS_REGION"]:
+        steps.append(("aws clients", lambda: lazy_import("aws_clients").get_configured_clients()))
+    if secrets["ROBOFLOW_API"]:
+        steps.append(("roboflow client", lambda: lazy_import("roboflow_client").get_configured_client()))
+    if secrets["ONNX_MODEL_PATH"] and secrets["ROBOFLOW_BACKEND"] == "local-onnx":
+        steps.append(("onnx model", lambda: lazy_import("onnx_backend").load_configured_model()))
+    return steps
+
+@st.cache_resource(show_spinner=False)
+def start_prewarm():
+    """Starts the pre-warm on the first script run of the process; later calls return the same one."""
+    steps = configured_steps()
+    print(f"Pre-warming {len(steps)} steps in the background")
+    return Prewarm(steps)
+
+#######################################################
+# --- UI ---
+
+def render_startup_stats(prewarm, budget_ms=STARTUP_BUDGET_MS):
+    """
+    Sidebar panel: pre-warm progress and the first imports of this process.
+    Plain captions on purpose: a dataframe would import pandas on every page.
+    """
+    stats = prewarm.stats()
+    imports = import_stats()
+    on_request = sum(r["ms"] for r in imports if r["thread"] != PREWARM_THREAD)
+    with st.sidebar.expander("Startup"):
+        state = "done" if stats["done"] else "running"
+        st.caption(
+            f"Pre-warm: {state}, {stats['finished']}/{stats['steps']} steps in {stats['elapsed_s']:.1f}s"
+            + (f" | Failed: {stats['failed']}" if stats["failed"] else "")
+        )
+        for r in stats["results"]:
+            st.caption(f"{'❌' if r['error'] else '✅'} {r['step']}: {r['ms']:.0f} ms")
+        st.caption(f"Imports paid by requests: {on_request:.0f} ms (budget {budget_ms:.0f} ms)")
+        for r in imports:
+            who = "pre-warm" if r["thread"] == PREWARM_THREAD else "request"
+            st.caption(f"`{r['module']}` {r['ms']:.0f} ms ({who})")
+        if on_request > budget_ms:
+            st.warning("Cold start is over budget: a request imported more than the pre-warm could hide.")